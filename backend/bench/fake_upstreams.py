@@ -0,0 +1,198 @@
+"""
+Local stand-ins for every upstream the backend talks to, for load tests that must not spend quota:
+
+- Gemini generateContent / streamGenerateContent (summaries, chunk notes, search-term extraction)
+- Algolia multi-query, single-index query, save_object, batch, task status and browse
+- Supabase REST (insert/update/upsert/select/count on any table) and auth /user
+- AssemblyAI streaming token and v3 WebSocket (Turn messages, Terminate)
+
+Every HTTP response is delayed by --latency-ms (+/- --jitter-ms), and a --error-rate fraction of
+requests fails with 503.
+Run from backend/:  python bench/fake_upstreams.py --port 9100
+"""
+import json
+import uuid
+import random
+import asyncio
+import argparse
+import itertools
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+SETTINGS = {"latency_ms": 50.0, "jitter_ms": 10.0, "error_rate": 0.0}
+WORDS = ["work", "family", "running", "sleep", "coffee", "project", "friends", "travel", "music", "stress"]
+_task_ids = itertools.count(1)
+
+async def _delay():
+    latency = SETTINGS["latency_ms"] + random.uniform(-SETTINGS["jitter_ms"], SETTINGS["jitter_ms"])
+    if latency > 0:
+        await asyncio.sleep(latency / 1000)
+
+class FaultMiddleware:
+    """
+    Adds latency to every HTTP request and fails a fraction of them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            await _delay()
+            if random.random() < SETTINGS["error_rate"]:
+                await JSONResponse({"error": "injected failure"}, status_code=503)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+def _hit(i):
+    word = WORDS[i % len(WORDS)]
+    return {"objectID": f"entry-{i}", "title": f"A day about {word}", "summary": f"Wrote about {word}.",
+            "tags": [word], "timestamp": f"2024-01-{i % 28 + 1:02d}T08:00:00Z"}
+
+def _summary_json():
+    word = random.choice(WORDS)
+    return json.dumps({"title": f"Thoughts on {word}", "summary": f"Reflected on {word} and the week.",
+                       "tags": [word, "reflection"]})
+
+def _gemini_text(prompt):
+    if "search_terms" in prompt:
+        terms = random.sample(WORDS, 2)
+        return json.dumps({"is_search": "yes", "search_terms": terms, "gemini_response": "Here is what I found."})
+    if "Part:" in prompt:
+        return "Notes on this part: the writer described their day and how they felt."
+    return _summary_json()
+
+def _candidates(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}]}
+
+async def gemini(request: Request):
+    body = await request.json()
+    prompt = body["contents"][0]["parts"][0]["text"]
+    action = request.path_params["action"]
+    if action == "streamGenerateContent":
+        text = _gemini_text(prompt)
+
+        async def events():
+            step = max(1, len(text) // 6)
+            for i in range(0, len(text), step):
+                yield f"data: {json.dumps(_candidates(text[i:i + step]))}\r\n\r\n"
+                await asyncio.sleep(SETTINGS["latency_ms"] / 6000)
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+    return JSONResponse(_candidates(_gemini_text(prompt)))
+
+async def algolia_queries(request: Request):
+    body = await request.json()
+    results = []
+    for _ in body.get("requests", []):
+        start = random.randrange(100)
+        hits = [_hit(i) for i in range(start, start + 5)]
+        results.append({"hits": hits, "nbHits": len(hits), "page": 0, "hitsPerPage": len(hits)})
+    return JSONResponse({"results": results})
+
+async def algolia_query(request: Request):
+    start = random.randrange(100)
+    return JSONResponse({"hits": [_hit(i) for i in range(start, start + 5)], "nbHits": 5})
+
+async def algolia_save_object(request: Request):
+    body = await request.json()
+    return JSONResponse({"taskID": next(_task_ids), "objectID": body.get("objectID") or str(uuid.uuid4()),
+                         "createdAt": "2024-01-01T00:00:00.000Z"}, status_code=201)
+
+async def algolia_batch(request: Request):
+    body = await request.json()
+    object_ids = [r.get("body", {}).get("objectID", "") for r in body.get("requests", [])]
+    return JSONResponse({"taskID": next(_task_ids), "objectIDs": object_ids})
+
+async def algolia_task(request: Request):
+    return JSONResponse({"status": "published", "pendingTask": False})
+
+async def algolia_browse(request: Request):
+    return JSONResponse({"hits": [], "nbHits": 0, "page": 0, "nbPages": 0, "hitsPerPage": 1000,
+                         "processingTimeMS": 1, "query": "", "params": ""})
+
+async def supabase_rest(request: Request):
+    if request.method in ("HEAD", "GET"):
+        total = random.randrange(1, 200)
+        headers = {"Content-Range": f"0-0/{total}"}
+        if request.method == "HEAD":
+            return Response(status_code=200, headers=headers)
+        return JSONResponse([], headers=headers)
+    body = await request.body()
+    rows = json.loads(body) if body else []
+    if isinstance(rows, dict):
+        rows = [rows]
+    return JSONResponse(rows, status_code=201 if request.method == "POST" else 200)
+
+async def supabase_user(request: Request):
+    return JSONResponse({
+        "id": str(uuid.uuid5(uuid.NAMESPACE_URL, request.headers.get("authorization", ""))),
+        "aud": "authenticated", "role": "authenticated", "email": "bench@example.com",
+        "app_metadata": {}, "user_metadata": {}, "created_at": "2024-01-01T00:00:00Z"
+    })
+
+async def assemblyai_token(request: Request):
+    return JSONResponse({"token": uuid.uuid4().hex, "expires_in_seconds": 600})
+
+async def assemblyai_ws(websocket: WebSocket):
+    """
+    v3-style session: a partial Turn every 0.5 s of audio, a formatted final Turn every 2 s.
+    """
+    await websocket.accept()
+    received = 0
+    turn_start = 0
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                before = received
+                received += len(message["bytes"])
+                end_ms = received // 32
+                if received // 16000 > before // 16000:
+                    await websocket.send_json({"type": "Turn", "end_of_turn": False, "transcript": "partial words",
+                                               "words": [{"text": "words", "end": end_ms}]})
+                if received - turn_start >= 64000:
+                    turn_start = received
+                    await websocket.send_json({"type": "Turn", "end_of_turn": True, "turn_is_formatted": True,
+                                               "transcript": "A finished sentence.", "words": [{"text": "sentence", "end": end_ms}]})
+            elif message.get("text") and json.loads(message["text"]).get("type") == "Terminate":
+                if received > turn_start:
+                    await websocket.send_json({"type": "Turn", "end_of_turn": True, "turn_is_formatted": True,
+                                               "transcript": "The last words.", "words": [{"text": "words", "end": received // 32}]})
+                await websocket.send_json({"type": "Termination", "audio_duration_seconds": received / 32000})
+                await websocket.close()
+                return
+    except WebSocketDisconnect:
+        return
+
+routes = [
+    Route("/v1beta/models/{model}:{action}", gemini, methods=["POST"]),
+    Route("/1/indexes/*/queries", algolia_queries, methods=["POST"]),
+    Route("/1/indexes/{index}/query", algolia_query, methods=["POST"]),
+    Route("/1/indexes/{index}/batch", algolia_batch, methods=["POST"]),
+    Route("/1/indexes/{index}/browse", algolia_browse, methods=["POST", "GET"]),
+    Route("/1/indexes/{index}/task/{task_id}", algolia_task, methods=["GET"]),
+    Route("/1/indexes/{index}", algolia_save_object, methods=["POST"]),
+    Route("/rest/v1/{table}", supabase_rest, methods=["GET", "HEAD", "POST", "PATCH", "DELETE"]),
+    Route("/auth/v1/user", supabase_user, methods=["GET"]),
+    Route("/v3/token", assemblyai_token, methods=["GET"]),
+    WebSocketRoute("/v3/ws", assemblyai_ws),
+]
+
+app = FaultMiddleware(Starlette(routes=routes))
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Fake Gemini/Algolia/Supabase/AssemblyAI upstreams.")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=SETTINGS["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=SETTINGS["jitter_ms"])
+    parser.add_argument("--error-rate", type=float, default=SETTINGS["error_rate"])
+    args = parser.parse_args()
+    SETTINGS.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,267 @@
+"""
+Load-test benchmark: runs the real app under uvicorn against local stand-ins for Gemini, Algolia,
+Supabase and AssemblyAI (bench/fake_upstreams.py), drives each endpoint at fixed concurrency
+levels and reports p50/p95/p99 latency and throughput.
+
+Upstream latency, jitter and error rate are injected by the fakes, so runs are repeatable and
+never touch real quotas.
+Run from backend/:  python bench/load.py [--scenarios index,search] [--concurrency 1,8,32]
+                    [--duration 10] [--latency-ms 50] [--error-rate 0.01] [--json out.json]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import jwt
+import httpx
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JWT_SECRET = "bench-jwt-secret-0123456789abcdef"
+WORDS = ["work", "family", "running", "sleep", "coffee", "project", "friends", "travel", "music", "stress"]
+# 100 ms of 16 kHz mono 16-bit PCM per WebSocket frame
+AUDIO_FRAME = b"\x00" * 3200
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _text(words: int) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(words)) + f" {uuid.uuid4().hex}."
+
+def _token(user_id: str) -> str:
+    claims = {"sub": user_id, "aud": "authenticated", "role": "authenticated", "exp": int(time.time()) + 3600}
+    return jwt.encode(claims, JWT_SECRET, algorithm="HS256")
+
+def _ok(resp: httpx.Response) -> bool:
+    if resp.status_code != 200:
+        return False
+    body = resp.json()
+    return not (isinstance(body, dict) and "error" in body)
+
+class Scenarios:
+    """
+    One coroutine per endpoint; each performs a single request and returns whether it succeeded.
+    Inputs are randomized per request so the app's result caches don't serve everything.
+    """
+
+    def __init__(self, base_url: str, users: int, audio_seconds: float):
+        self.base_url = base_url
+        self.ws_url = base_url.replace("http://", "ws://", 1)
+        self.users = [str(uuid.uuid5(uuid.NAMESPACE_OID, f"bench-user-{i}")) for i in range(users)]
+        self.tokens = {user: _token(user) for user in self.users}
+        self.audio_frames = max(1, int(audio_seconds * 10))
+        self.http = httpx.AsyncClient(base_url=base_url, timeout=60,
+                                      limits=httpx.Limits(max_connections=None, max_keepalive_connections=256))
+
+    async def index(self) -> bool:
+        user = random.choice(self.users)
+        resp = await self.http.post("/index", json={
+            "user_id": user, "session_id": str(uuid.uuid4()), "date": "2024-01-01",
+            "timestamp": "2024-01-01T08:00:00Z", "title": "Bench entry", "summary": _text(12),
+            "tags": random.sample(WORDS, 2), "text": _text(200)
+        })
+        return _ok(resp)
+
+    async def search(self) -> bool:
+        query = f"what did I write about {random.choice(WORDS)} and {random.choice(WORDS)} {random.randrange(10**6)}"
+        resp = await self.http.post("/search", json={"query": query, "user_id": random.choice(self.users)})
+        return _ok(resp)
+
+    async def summarize(self) -> bool:
+        resp = await self.http.post("/summarize", json={"text": _text(300)})
+        return _ok(resp)
+
+    async def summarize_stream(self) -> bool:
+        done = False
+        async with self.http.stream("POST", "/summarize/stream", json={"text": _text(300)}) as resp:
+            if resp.status_code != 200:
+                return False
+            async for line in resp.aiter_lines():
+                if line.startswith("event: error"):
+                    return False
+                if line.startswith("event: done"):
+                    done = True
+        return done
+
+    async def usage(self) -> bool:
+        user = random.choice(self.users)
+        resp = await self.http.get("/auth/usage", headers={"Authorization": f"Bearer {self.tokens[user]}"})
+        return _ok(resp)
+
+    async def transcribe(self) -> bool:
+        async with websockets.connect(f"{self.ws_url}/ws/transcribe?vad=false") as ws:
+            for _ in range(self.audio_frames):
+                await ws.send(AUDIO_FRAME)
+            await ws.send(json.dumps({"type": "stop"}))
+            async for message in ws:
+                event = json.loads(message)
+                if event["type"] == "done":
+                    return True
+                if event["type"] == "error":
+                    return False
+        return False
+
+    async def close(self):
+        await self.http.aclose()
+
+SCENARIOS = ("index", "search", "summarize", "summarize_stream", "usage", "transcribe")
+
+def _percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+async def run_level(call, concurrency: int, duration: float) -> dict:
+    """
+    Closed loop: `concurrency` workers each issue requests back to back until the duration is up.
+    """
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = await call()
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+    }
+
+def _spawn(args, env, log):
+    return subprocess.Popen(args, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Process for {url} exited with code {proc.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+async def run(args, app_url: str) -> list:
+    scenarios = Scenarios(app_url, users=args.users, audio_seconds=args.audio_seconds)
+    results = []
+    try:
+        for name in args.scenarios:
+            call = getattr(scenarios, name)
+            # One untimed call so lazy client construction isn't billed to the first level
+            try:
+                await call()
+            except Exception:
+                pass
+            for concurrency in args.concurrency:
+                result = {"scenario": name, **await run_level(call, concurrency, args.duration)}
+                results.append(result)
+                print(f"{name:<18}{concurrency:>6}{result['requests']:>10}{result['errors']:>8}"
+                      f"{result['rps']:>10.1f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}",
+                      flush=True)
+    finally:
+        await scenarios.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario and level")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mean injected upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="uniform +/- jitter on upstream latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls that fail with 503")
+    parser.add_argument("--users", type=int, default=1000, help="distinct users requests are spread over")
+    parser.add_argument("--audio-seconds", type=float, default=2.0, help="audio sent per transcription session")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+    random.seed(args.seed)
+
+    fake_port, app_port = _free_port(), _free_port()
+    fake_url, app_url = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{app_port}"
+    workdir = tempfile.mkdtemp(prefix="whispers-load-")
+    env = {
+        **os.environ,
+        "SUPABASE_URL": fake_url,
+        "SUPABASE_KEY": "bench-key",
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+        "GEMINI_API_KEY": "bench-key",
+        "GEMINI_BASE_URL": fake_url,
+        "ALGOLIA_APP_ID": "BENCHAPP",
+        "ALGOLIA_API_KEY": "bench-key",
+        "ALGOLIA_SEARCH_KEY": "bench-key",
+        "ALGOLIA_HOST_URL": fake_url,
+        "ASSEMBLYAI_API_KEY": "bench-key",
+        "ASSEMBLYAI_API_URL": fake_url,
+        "ASSEMBLYAI_WS_URL": f"ws://127.0.0.1:{fake_port}/v3/ws",
+        "SEARCH_BACKEND": "algolia",
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite3"),
+        "BACKFILL_DIR": os.path.join(workdir, "backfill"),
+        # Everything the app persists stays in the workdir, away from the developer's real state
+        "OUTBOX_PATH": os.path.join(workdir, "outbox.ndjson"),
+        "INSIGHTS_PATH": os.path.join(workdir, "insights.sqlite3"),
+        "LOCAL_SEARCH_PATH": os.path.join(workdir, "local_search.pickle"),
+        "VECTOR_STORE_DIR": os.path.join(workdir, "vectors"),
+        "LOG_LEVEL": "WARNING",
+    }
+    with open(os.path.join(workdir, "fake_upstreams.log"), "w") as fake_log, \
+            open(os.path.join(workdir, "app.log"), "w") as app_log:
+        fake = _spawn([sys.executable, "bench/fake_upstreams.py", "--port", str(fake_port),
+                       "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+                       "--error-rate", str(args.error_rate)], env, fake_log)
+        app = _spawn([sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port),
+                      "--log-level", "warning", "--no-access-log"], env, app_log)
+        try:
+            _wait_ready(f"{fake_url}/v3/token", fake)
+            _wait_ready(f"{app_url}/search/cache", app)
+            print(f"upstream latency {args.latency_ms:g}+/-{args.jitter_ms:g} ms, error rate {args.error_rate:g}, "
+                  f"{args.duration:g}s per level; logs in {workdir}")
+            print(f"{'scenario':<18}{'conc':>6}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+            results = asyncio.run(run(args, app_url))
+        finally:
+            for proc in (app, fake):
+                proc.terminate()
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": {key: value for key, value in vars(args).items() if key != "json"},
+                       "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Startup benchmark: cold import time of main, lifespan startup, first and warm request latency,
+and the cost of building each shared client on first use.
+
+Every run happens in a fresh interpreter so module caches don't hide import costs.
+Run from backend/:  python bench/startup.py [--runs 5]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Keep the benchmark offline: no token prefetching, placeholder credentials for client construction
+CHILD_ENV = {
+    "ASSEMBLYAI_TOKEN_POOL_SIZE": "0",
+    "SUPABASE_URL": os.getenv("SUPABASE_URL") or "https://example.supabase.co",
+    "SUPABASE_KEY": os.getenv("SUPABASE_KEY") or "bench-key",
+    "ALGOLIA_APP_ID": os.getenv("ALGOLIA_APP_ID") or "BENCHAPP",
+    "ALGOLIA_API_KEY": os.getenv("ALGOLIA_API_KEY") or "bench-key",
+}
+
+def child():
+    sys.path.insert(0, BACKEND_DIR)
+    timings = {}
+    start = time.perf_counter()
+    import main
+    timings["import_main_ms"] = (time.perf_counter() - start) * 1000
+
+    from fastapi.testclient import TestClient
+    from services import clients
+    start = time.perf_counter()
+    with TestClient(main.app) as client:
+        timings["lifespan_startup_ms"] = (time.perf_counter() - start) * 1000
+        for name in ("first_request_ms", "warm_request_ms"):
+            start = time.perf_counter()
+            client.get("/search/cache")
+            timings[name] = (time.perf_counter() - start) * 1000
+        # Wait for the background SDK imports so the build timings below are construction only
+        start = time.perf_counter()
+        client.portal.call(_wait_preload)
+        timings["sdk_preload_wait_ms"] = (time.perf_counter() - start) * 1000
+        for name, getter in (("http", clients.get_http), ("algolia", clients.get_algolia),
+                             ("supabase", clients.get_supabase)):
+            start = time.perf_counter()
+            client.portal.call(_build, getter)
+            timings[f"build_{name}_client_ms"] = (time.perf_counter() - start) * 1000
+    print(json.dumps(timings))
+
+async def _build(getter):
+    getter()
+
+async def _wait_preload():
+    from services import clients
+    if clients._preload is not None:
+        await clients._preload
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    env = {**os.environ, **CHILD_ENV}
+    runs = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], cwd=BACKEND_DIR, env=env,
+                             capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    print(f"{'metric':<28}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for metric in runs[0]:
+        values = [run[metric] for run in runs]
+        print(f"{metric:<28}{statistics.median(values):>12.1f}{min(values):>10.1f}{max(values):>10.1f}")
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        child()
+    else:
+        main()
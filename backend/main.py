@@ -1,9 +1,49 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from utils.log import configure_logging
 from routes.stream import router as stream_router
 from routes.auth import router as auth_router
+from routes.transcribe import router as transcribe_router
+from routes.backfill import router as backfill_router
+from routes.metrics import router as metrics_router
+from routes.reconcile import router as reconcile_router
+from routes.entries import router as entries_router
+from routes.portability import router as portability_router
+from routes.insights import router as insights_router
+from services import clients
+from services.indexer import index_queue
+from services.search_backend import get_search_backend
+from services.assembly import token_pool
+from services.backfill import stop_jobs
+from services.outbox import outbox
+from services.reconcile import stop_reconcile
+from services.metrics import TimingMiddleware
+from services.resilience import DeadlineMiddleware
 
-app = FastAPI()
+configure_logging()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the shared async upstream clients once per worker
+    await clients.startup()
+    await get_search_backend().start()
+    await index_queue.start()
+    # Re-drives writes a previous run left unfinished, through the index queue
+    await outbox.start()
+    await token_pool.start()
+    yield
+    await token_pool.stop()
+    # Interrupted backfills resume from their checkpoints
+    await stop_jobs()
+    await stop_reconcile()
+    await outbox.stop()
+    # Flush pending index writes before closing the clients they use
+    await index_queue.stop()
+    await get_search_backend().stop()
+    await clients.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -13,6 +53,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Every upstream call made for a request shares one time budget, except for bulk transfers
+app.add_middleware(DeadlineMiddleware, exempt=("/export", "/import"))
+# Outermost, so request timings include CORS handling
+app.add_middleware(TimingMiddleware)
 
 app.include_router(stream_router)
 app.include_router(auth_router)
+app.include_router(transcribe_router)
+app.include_router(backfill_router)
+app.include_router(metrics_router)
+app.include_router(reconcile_router)
+app.include_router(entries_router)
+app.include_router(portability_router)
+app.include_router(insights_router)
@@ -0,0 +1,4 @@
+-- Write version of each journal entry, set by /index, backfill and import. The outbox and the
+-- Supabase-to-Algolia reconciler compare it to tell which copy of an entry is newer; /entries,
+-- /export and reconcile select it.
+ALTER TABLE journal_entries ADD COLUMN IF NOT EXISTS updated timestamptz;
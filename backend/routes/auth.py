@@ -2,9 +2,18 @@ from fastapi import APIRouter, Request, HTTPException, Depends, status
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-from services.supabase import supabase
+from services.clients import get_supabase
+from services.auth_tokens import require_user, bearer_token
+from services.cache import TTLCache
+from services.supabase import count_user_rows, usage_cache
+from services.resilience import guard
+from services.singleflight import SingleFlight
+import asyncio
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/auth")
 
 # Request/Response Models
@@ -28,19 +37,31 @@ class AuthResponse(BaseModel):
 class LogoutResponse(BaseModel):
     message: str
 
+# Concurrent profile lookups for the same email (e.g. a burst of /me calls) share one query
+profile_flights = SingleFlight("user_profile")
+
+async def _user_profile(email):
+    """Get a user's row from the users table, or None."""
+    async def fetch():
+        async with guard("supabase", "users.select"):
+            profile_response = await get_supabase().table("users").select("*").eq("email", email).execute()
+        return profile_response.data[0] if profile_response.data else None
+    return await profile_flights.do(email, fetch)
+
 @router.post("/magic-link", response_model=MagicLinkResponse)
 async def send_magic_link(request: MagicLinkRequest):
     """Send magic link to user's email"""
     try:
         # Use standard OTP sign-in method
-        auth_response = supabase.auth.sign_in_with_otp({
-            "email": request.email,
-            "options": {
-                "email_redirect_to": f"{os.getenv('FRONTEND_URL', 'http://localhost:8080')}/auth/verify"
-            }
-        })
+        async with guard("supabase", "auth.sign_in_with_otp"):
+            auth_response = await get_supabase().auth.sign_in_with_otp({
+                "email": request.email,
+                "options": {
+                    "email_redirect_to": f"{os.getenv('FRONTEND_URL', 'http://localhost:8080')}/auth/verify"
+                }
+            })
         
-        print(f"Magic link response: {auth_response}")
+        logger.debug("Magic link response: %s", auth_response)
         
         return MagicLinkResponse(
             message="Magic link sent to your email",
@@ -48,7 +69,7 @@ async def send_magic_link(request: MagicLinkRequest):
         )
         
     except Exception as e:
-        print(f"Error sending magic link: {e}")
+        logger.error("Error sending magic link: %s", e)
         # Return a more specific error message
         if "User not allowed" in str(e):
             raise HTTPException(status_code=400, detail="Email authentication not enabled for this user")
@@ -62,19 +83,19 @@ async def verify_magic_link(request: VerifyOTPRequest):
     """Verify magic link token and create session"""
     try:
         # Verify the OTP token
-        auth_response = supabase.auth.verify_otp({
-            "email": request.email,
-            "token": request.token,
-            "type": "magiclink"
-        })
+        async with guard("supabase", "auth.verify_otp"):
+            auth_response = await get_supabase().auth.verify_otp({
+                "email": request.email,
+                "token": request.token,
+                "type": "magiclink"
+            })
         
         if not auth_response.user:
             raise HTTPException(status_code=401, detail="Invalid or expired token")
         
         # Get user profile from users table
         try:
-            profile_response = supabase.table("users").select("*").eq("email", request.email).execute()
-            user_profile = profile_response.data[0] if profile_response.data else None
+            user_profile = await _user_profile(request.email)
         except Exception:
             user_profile = None
         
@@ -86,7 +107,7 @@ async def verify_magic_link(request: VerifyOTPRequest):
         )
         
     except Exception as e:
-        print(f"Error verifying magic link: {e}")
+        logger.error("Error verifying magic link: %s", e)
         if "Invalid token" in str(e) or "expired" in str(e).lower():
             raise HTTPException(status_code=401, detail="Invalid or expired token")
         else:
@@ -104,118 +125,123 @@ async def logout(request: Request):
         token = auth_header.split(" ")[1]
         
         # Sign out the user
-        supabase.auth.sign_out()
+        async with guard("supabase", "auth.sign_out"):
+            await get_supabase().auth.sign_out()
         
         return LogoutResponse(message="Successfully logged out")
         
     except Exception as e:
-        print(f"Error during logout: {e}")
+        logger.error("Error during logout: %s", e)
         raise HTTPException(status_code=500, detail="Failed to logout")
 
 @router.get("/me")
-async def get_current_user(request: Request):
+async def get_current_user(claims: dict = Depends(require_user)):
     """Get current user profile"""
     try:
-        # Get session token from request headers
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="No valid session")
-        
-        token = auth_header.split(" ")[1]
-        
-        # Get user from token
-        user_response = supabase.auth.get_user(token)
-        
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid session")
-        
+        email = claims.get("email")
         # Get user profile from users table
         try:
-            profile_response = supabase.table("users").select("*").eq("email", user_response.user.email).execute()
-            user_profile = profile_response.data[0] if profile_response.data else None
+            user_profile = await _user_profile(email)
         except Exception:
             user_profile = None
         
         return {
-            "user_id": user_response.user.id,
-            "email": user_response.user.email,
+            "user_id": claims["sub"],
+            "email": email,
             "name": user_profile.get("name") if user_profile else None
         }
         
     except Exception as e:
-        print(f"Error getting current user: {e}")
+        logger.error("Error getting current user: %s", e)
         raise HTTPException(status_code=401, detail="Invalid session") 
 
 @router.delete("/delete")
-async def delete_account(request: Request):
+async def delete_account(claims: dict = Depends(require_user)):
     """Delete the current user from Supabase Auth and users table."""
     try:
-        # Get session token from request headers
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="No valid session")
-        token = auth_header.split(" ")[1]
-        # Get user from token
-        user_response = supabase.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid session")
-        user_id = user_response.user.id
-        user_email = user_response.user.email
+        user_id = claims["sub"]
+        user_email = claims.get("email")
         # Delete from Supabase Auth
         try:
-            supabase.auth.admin.delete_user(user_id)
+            async with guard("supabase", "auth.delete_user"):
+                await get_supabase().auth.admin.delete_user(user_id)
         except Exception as e:
-            print(f"Error deleting user from Supabase Auth: {e}")
+            logger.error("Error deleting user from Supabase Auth: %s", e)
             raise HTTPException(status_code=500, detail="Failed to delete user from auth")
         # Delete from users table
         try:
-            supabase.table("users").delete().eq("email", user_email).execute()
+            async with guard("supabase", "users.delete"):
+                await get_supabase().table("users").delete().eq("email", user_email).execute()
         except Exception as e:
-            print(f"Error deleting user from users table: {e}")
+            logger.warning("Error deleting user from users table: %s", e)
             # Not fatal, continue
+        _created_at_cache.delete(user_id)
+        usage_cache.delete(user_id)
+        _last_usage.delete(user_id)
         return JSONResponse(status_code=status.HTTP_200_OK, content={"message": "Account deleted successfully"})
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error deleting account: {e}")
+        logger.error("Error deleting account: %s", e)
         raise HTTPException(status_code=500, detail="Failed to delete account") 
 
+# Account creation dates never change, so they are looked up once per user
+_created_at_cache = TTLCache(maxsize=10000, ttl=24 * 3600)
+
+async def _account_created_at(request: Request, user_id: str):
+    created_at = _created_at_cache.get(user_id)
+    if created_at is None:
+        async with guard("supabase", "auth.get_user"):
+            user_response = await get_supabase().auth.get_user(bearer_token(request))
+        created_at = user_response.user.created_at if user_response and hasattr(user_response.user, 'created_at') else None
+        if created_at is not None:
+            _created_at_cache.set(user_id, created_at)
+    return created_at
+
+# Last successful counts per user, served when a count fails
+_last_usage = TTLCache(maxsize=10000, ttl=24 * 3600)
+
 @router.get("/usage")
-async def get_usage_stats(request: Request):
+async def get_usage_stats(request: Request, claims: dict = Depends(require_user)):
     """Return total sessions, total journal entries, and account creation date for the current user."""
     try:
-        # Get session token from request headers
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="No valid session")
-        token = auth_header.split(" ")[1]
-        # Get user from token
-        user_response = supabase.auth.get_user(token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid session")
-        user_id = user_response.user.id
-        user_email = user_response.user.email
-        # Get account creation date
-        created_at = user_response.user.created_at if hasattr(user_response.user, 'created_at') else None
-        # Count sessions
-        try:
-            sessions_resp = supabase.table("sessions").select("*").eq("user_id", user_id).execute()
-            total_sessions = len(sessions_resp.data) if sessions_resp.data else 0
-        except Exception as e:
-            print(f"Error counting sessions: {e}")
-            total_sessions = 0
-        # Count journal entries
-        try:
-            entries_resp = supabase.table("journal_entries").select("*").eq("user_id", user_id).execute()
-            total_entries = len(entries_resp.data) if entries_resp.data else 0
-        except Exception as e:
-            print(f"Error counting journal entries: {e}")
-            total_entries = 0
-        return {
+        user_id = claims["sub"]
+        cached = usage_cache.get(user_id)
+        if cached is not None:
+            return cached
+        # Account creation date and both counts are fetched concurrently
+        created_at, total_sessions, total_entries = await asyncio.gather(
+            _account_created_at(request, user_id),
+            count_user_rows("sessions", user_id),
+            count_user_rows("journal_entries", user_id),
+            return_exceptions=True
+        )
+        # A failed lookup falls back to the user's last known value rather than showing zero
+        last = _last_usage.get(user_id) or {}
+        failed = False
+        if isinstance(created_at, Exception):
+            logger.warning("Error getting account creation date: %s", created_at)
+            created_at, failed = last.get("created_at"), True
+        if isinstance(total_sessions, Exception):
+            logger.warning("Error counting sessions: %s", total_sessions)
+            total_sessions, failed = last.get("total_sessions"), True
+        if isinstance(total_entries, Exception):
+            logger.warning("Error counting journal entries: %s", total_entries)
+            total_entries, failed = last.get("total_entries"), True
+        if total_sessions is None or total_entries is None:
+            raise HTTPException(status_code=503, detail="Failed to count sessions and entries")
+        usage = {
             "total_sessions": total_sessions,
             "total_entries": total_entries,
             "created_at": created_at
         }
+        # Only complete results are cached
+        if not failed:
+            usage_cache.set(user_id, usage)
+            _last_usage.set(user_id, usage)
+        return usage
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error getting usage stats: {e}")
+        logger.error("Error getting usage stats: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get usage stats") 
\ No newline at end of file
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, Request
+from services.auth_tokens import require_admin
+from services.backfill import jobs, start_job
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.post("/backfill/{job}")
+async def backfill_start(job: str, request: Request, resummarize: bool = False):
+    """
+    Start a bulk summarize-and-index job from an NDJSON request body (one entry per line).
+    A request with Content-Length: 0 resumes an earlier job of the same name from its checkpoint;
+    any other empty upload is rejected.
+    Poll GET /backfill/{job} for progress.
+    """
+    chunks = None
+    if request.headers.get("content-length") != "0":
+        chunks = request.stream()
+    try:
+        backfill = await start_job(job, chunks, resummarize=resummarize)
+    except Exception as e:
+        return {"error": str(e)}
+    return {"job": job, "state": backfill.state}
+
+@router.get("/backfill/{job}")
+async def backfill_status(job: str):
+    backfill = jobs.get(job)
+    if backfill is None:
+        return {"error": f"Unknown backfill job '{job}'"}
+    return {"job": job, **backfill.stats()}
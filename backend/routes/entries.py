@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from services.auth_tokens import require_user
+from services.supabase import list_user_entries, entries_cache
+import json
+import base64
+import hashlib
+import logging
+import binascii
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+MAX_PAGE_SIZE = 100
+# Clients may keep pages but must revalidate them with If-None-Match before use
+CACHE_CONTROL = "private, no-cache"
+
+def encode_cursor(entry):
+    raw = json.dumps([entry["timestamp"], entry["entry_id"]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        timestamp, entry_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return str(timestamp), str(entry_id)
+
+def weak_etag(body):
+    digest = hashlib.sha1(json.dumps(body, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison against an If-None-Match header, which may list several tags or be '*'."""
+    if not if_none_match:
+        return False
+    opaque = etag[2:]
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == opaque:
+            return True
+    return False
+
+@router.get("/entries")
+async def list_entries(request: Request, limit: int = 20, cursor: str = None, include_text: bool = False,
+                       claims: dict = Depends(require_user)):
+    """
+    The current user's journal entries, newest first. Pass `next_cursor` from a response as
+    `cursor` to get the following page. Full entry text is left out unless `include_text` is set.
+    Responses carry a weak ETag; sending it back in If-None-Match returns 304 if the page is unchanged.
+    """
+    user_id = claims["sub"]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    before = decode_cursor(cursor) if cursor else None
+    cache_key = (user_id, before, limit, include_text)
+    cached = entries_cache.get(cache_key)
+    if cached is None:
+        # One extra row tells whether there is a next page
+        try:
+            rows = await list_user_entries(user_id, limit + 1, before=before, include_text=include_text)
+        except Exception as e:
+            logger.error("Error listing entries: %s", e)
+            raise HTTPException(status_code=503, detail="Failed to list entries")
+        page = rows[:limit]
+        body = {"entries": page, "next_cursor": encode_cursor(page[-1]) if len(rows) > limit else None}
+        cached = (weak_etag(body), body)
+        entries_cache.set(cache_key, cached, group=user_id)
+    etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, headers=headers)
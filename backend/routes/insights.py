@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, HTTPException
+from services.auth_tokens import require_user
+from services.insights import insights, bucket_range, PERIODS, WEEK
+from datetime import date, datetime, timedelta, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+MAX_TOP = 50
+# Longest range served in one response, and the default one, in buckets of each period
+MAX_BUCKETS = {"day": 366, "week": 104}
+DEFAULT_BUCKETS = {"day": 30, "week": 12}
+
+def parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}, expected YYYY-MM-DD")
+
+@router.get("/insights")
+async def get_insights(period: str = "day", date_from: str = None, date_to: str = None, top: int = 10,
+                       claims: dict = Depends(require_user)):
+    """
+    Tag analytics for the current user: entries and tag counts per day or ISO week (keyed by its
+    Monday), plus the most used tags and tag pairs over the range. Defaults to the last 30 days
+    or 12 weeks up to `date_to` (today if not given).
+    """
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of: {', '.join(PERIODS)}")
+    top = max(1, min(top, MAX_TOP))
+    step = timedelta(weeks=1) if period == WEEK else timedelta(days=1)
+    end = parse_date(date_to, "date_to") if date_to else datetime.now(timezone.utc).date()
+    start = parse_date(date_from, "date_from") if date_from else end - step * (DEFAULT_BUCKETS[period] - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="date_from is after date_to")
+    if (end - start) // step >= MAX_BUCKETS[period]:
+        raise HTTPException(status_code=400, detail=f"Range is longer than {MAX_BUCKETS[period]} {period}s")
+    first, last = bucket_range(period, start, end)
+    try:
+        result = await insights.query(claims["sub"], period, first, last, top)
+    except Exception as e:
+        logger.error("Error reading insights: %s", e)
+        raise HTTPException(status_code=503, detail="Failed to read insights")
+    return {"period": period, "date_from": start.isoformat(), "date_to": end.isoformat(), **result}
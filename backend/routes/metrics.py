@@ -0,0 +1,34 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services.metrics import gauge, render_metrics
+from services.assembly import token_pool
+from services.indexer import index_queue
+from services.gemini import search_cache
+from services.llm_cache import llm_cache
+from services.resilience import breakers
+from services.outbox import outbox
+from services.insights import insights
+
+router = APIRouter()
+
+# Existing in-process stats, read at scrape time
+gauge("whispers_assemblyai_token_pool_depth", "Prefetched AssemblyAI tokens ready to hand out.", lambda: token_pool.stats()["depth"])
+gauge("whispers_index_queue_depth", "Entries waiting to be written to the search index.", lambda: index_queue.stats()["queued"])
+gauge("whispers_index_failed_total", "Entries that could not be indexed.", lambda: index_queue.failed, kind="counter")
+gauge("whispers_search_cache_entries", "Cached /search results.", lambda: search_cache.stats()["size"])
+gauge("whispers_search_cache_hits_total", "/search cache hits.", lambda: search_cache.hits, kind="counter")
+gauge("whispers_search_cache_misses_total", "/search cache misses.", lambda: search_cache.misses, kind="counter")
+gauge("whispers_llm_cache_hits_total", "Memoized Gemini results served from disk.", lambda: llm_cache.hits, kind="counter")
+gauge("whispers_llm_cache_misses_total", "Gemini calls not found in the memo cache.", lambda: llm_cache.misses, kind="counter")
+gauge("whispers_outbox_pending", "Journal writes not yet acknowledged by both Supabase and the search index.",
+      lambda: outbox.stats()["pending"])
+gauge("whispers_insights_errors_total", "Entry writes whose tag insights could not be updated.",
+      lambda: insights.errors, kind="counter")
+for name, breaker in breakers.items():
+    gauge(f"whispers_circuit_{name}_open", f"1 while the {name} circuit breaker is failing calls fast.",
+          lambda breaker=breaker: float(breaker.is_open()))
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timezone
+from services.auth_tokens import require_user
+from services.portability import export_user, Importer
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.get("/export")
+async def export_history(claims: dict = Depends(require_user)):
+    """
+    Download the current user's sessions and journal entries as gzip-compressed NDJSON.
+    """
+    filename = f"whispers-export-{datetime.now(timezone.utc).strftime('%Y%m%d')}.ndjson.gz"
+    return StreamingResponse(export_user(claims["sub"]), media_type="application/gzip",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@router.post("/import")
+async def import_history(request: Request, claims: dict = Depends(require_user)):
+    """
+    Import an /export file (gzip-compressed or plain NDJSON) into the current user's account.
+    The user's existing sessions and entries with the same ids are overwritten; ids used by
+    another account, and lines that can't be parsed, are skipped and reported.
+    """
+    importer = Importer(claims["sub"])
+    try:
+        return await importer.run(request.stream())
+    except Exception as e:
+        logger.error("Import failed: %s", e)
+        return {"error": str(e), **importer.stats()}
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends
+from services import reconcile
+from services.auth_tokens import require_admin
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.post("/reconcile")
+async def reconcile_start(dry_run: bool = True, delete_orphans: bool = False):
+    """
+    Start a Supabase-to-Algolia reconcile run in the background. Poll GET /reconcile for progress.
+    By default drift is only counted; pass dry_run=false to repair it. Index records without a
+    Supabase row are only deleted when delete_orphans is also set.
+    """
+    try:
+        job = reconcile.start_reconcile(dry_run=dry_run, delete_orphans=delete_orphans)
+    except Exception as e:
+        return {"error": str(e)}
+    return job.stats()
+
+@router.get("/reconcile")
+async def reconcile_status():
+    if reconcile.current is None:
+        return {"error": "No reconcile run has been started"}
+    return reconcile.current.stats()
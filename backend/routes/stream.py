@@ -1,26 +1,23 @@
 from fastapi import APIRouter, Request
-from services.gemini import summarize, mcp_search
-from services.assembly import get_assemblyai_token_universal_streaming
-from services.supabase import insert_session
+from fastapi.responses import StreamingResponse
+from services.gemini import summarize, summarize_stream, mcp_search, search_cache, search_flights, normalize_query, invalidate_user_searches
+from services.assembly import token_pool
+from services.supabase import insert_session, invalidate_usage, invalidate_entries
+from services.indexer import index_queue, PENDING, INDEXED
+from services.search_backend import get_search_backend
+from services.clients import get_supabase
+from services.resilience import guard
+from services.outbox import outbox, SUPABASE
+from services.insights import insights
 import uuid
+import json
+import asyncio
+import logging
 from datetime import datetime, timezone
-import os
-from supabase import create_client
-from algoliasearch.search.client import SearchClientSync
 
-router = APIRouter()
-
-# Algolia setup (single index for all users)
-ALGOLIA_APP_ID = os.environ.get("ALGOLIA_APP_ID")
-ALGOLIA_API_KEY = os.environ.get("ALGOLIA_API_KEY")
-ALGOLIA_INDEX_NAME = os.environ.get("ALGOLIA_INDEX_NAME", "journal_entries")
+logger = logging.getLogger(__name__)
 
-algolia_client = SearchClientSync(ALGOLIA_APP_ID, ALGOLIA_API_KEY)
-
-# Supabase setup for journal_entries backup (optional)
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+router = APIRouter()
 
 @router.post("/start_session")
 async def start_session():
@@ -30,7 +27,7 @@ async def start_session():
     created_at = now.isoformat()
     error = None
     try:
-        insert_session(session_id, date, created_at)
+        await insert_session(session_id, date, created_at)
     except Exception as e:
         error = str(e)
     resp = {"session_id": session_id, "date": date, "created_at": created_at}
@@ -61,33 +58,63 @@ async def index_entry(request: Request):
     if "entry_id" in data:
         entry_id = data["entry_id"]
         entry["objectID"] = entry_id
-        try:
-            res = algolia_client.save_object(index_name=ALGOLIA_INDEX_NAME, body=entry)
-            algolia_client.wait_for_task(index_name=ALGOLIA_INDEX_NAME, task_id=res.task_id)
-            # Optionally update in Supabase
-            try:
-                supabase.table("journal_entries").update(entry).eq("entry_id", entry_id).execute()
-            except Exception:
-                pass
-            return {"result": "updated", "entry_id": entry_id, "algolia": res.to_dict()}
-        except Exception as e:
-            return {"error": str(e)}
+        result = "updated"
     # If creating, add new entry
     else:
         entry_id = str(uuid.uuid4())
         entry["entry_id"] = entry_id
         entry["objectID"] = entry_id
-        try:
-            res = algolia_client.save_object(index_name=ALGOLIA_INDEX_NAME, body=entry)
-            algolia_client.wait_for_task(index_name=ALGOLIA_INDEX_NAME, task_id=res.task_id)
-            # Optionally insert in Supabase
-            try:
-                supabase.table("journal_entries").insert(entry).execute()
-            except Exception:
-                pass
-            return {"result": "created", "entry_id": entry_id, "algolia": res.to_dict()}
-        except Exception as e:
-            return {"error": str(e)}
+        result = "created"
+    # Write version, compared by the outbox and the Supabase-to-Algolia reconciler
+    entry["updated"] = datetime.now(timezone.utc).isoformat()
+    # Record the write in the outbox first; anything not acknowledged by both stores is re-driven later
+    try:
+        await outbox.record(entry)
+    except Exception as e:
+        return {"error": str(e)}
+
+    async def write_supabase():
+        if result == "updated":
+            async with guard("supabase", "journal_entries.update"):
+                await get_supabase().table("journal_entries").update(entry).eq("entry_id", entry_id).execute()
+        else:
+            async with guard("supabase", "journal_entries.insert"):
+                await get_supabase().table("journal_entries").insert(entry).execute()
+        outbox.ack(SUPABASE, entry_id, entry["updated"])
+        # Tag counters only count stored entries; a write that fails here is counted when the outbox re-drives it
+        await insights.apply([entry])
+
+    # Persist to Supabase while handing the search index write to the background index queue
+    supabase_result, queue_result = await asyncio.gather(write_supabase(), index_queue.enqueue(entry),
+                                                         return_exceptions=True)
+    if isinstance(queue_result, Exception):
+        return {"error": str(queue_result)}
+    invalidate_user_searches(entry["user_id"])
+    invalidate_usage(entry["user_id"])
+    invalidate_entries(entry["user_id"])
+    resp = {"result": result, "entry_id": entry_id, "status": PENDING}
+    if isinstance(supabase_result, Exception):
+        resp["supabase_error"] = str(supabase_result)
+    return resp
+
+@router.get("/index/status/{entry_id}")
+async def index_status(entry_id: str):
+    """Report whether an entry written through /index is searchable yet."""
+    record = index_queue.status(entry_id)
+    if record is None:
+        return {"entry_id": entry_id, "status": "unknown", "searchable": None}
+    resp = {"entry_id": entry_id, "status": record["status"], "searchable": record["status"] == INDEXED}
+    if "error" in record:
+        resp["error"] = record["error"]
+    return resp
+
+async def _search_and_cache(cache_key, query, user_id, tags, date_from, date_to):
+    # Use Gemini + MCP logic
+    result = await mcp_search(query, user_id=user_id, tags=tags, date_from=date_from, date_to=date_to)
+    # Degraded (keyword-only) results are not cached, so the next request tries Gemini again
+    if not result["degraded"]:
+        search_cache.set(cache_key, result, group=user_id)
+    return result
 
 @router.post("/search")
 async def search(request: Request):
@@ -96,20 +123,63 @@ async def search(request: Request):
     user_id = data.get("user_id")
     if not user_id:
         return {"error": "Missing required field: user_id"}
+    # Optional filters
+    tags = data.get("tags") or None
+    date_from = data.get("date_from")
+    date_to = data.get("date_to")
     try:
-        # Use Gemini + MCP logic
-        result = mcp_search(query, user_id=user_id)
+        # Repeated questions are served from the per-user cache
+        cache_key = (user_id, normalize_query(query), tuple(tags or ()), date_from, date_to)
+        result = search_cache.get(cache_key)
+        if result is None:
+            # Identical searches already in flight are joined rather than repeated
+            result = await search_flights.do(cache_key, lambda: _search_and_cache(cache_key, query, user_id, tags, date_from, date_to))
         return result
     except Exception as e:
         return {"error": str(e)}
 
+@router.get("/search/cache")
+async def search_cache_stats():
+    return search_cache.stats()
+
+@router.get("/search/backend")
+async def search_backend_stats():
+    return get_search_backend().stats()
+
 @router.post("/summarize")
 async def summarize_text(request: Request):
     data = await request.json()
-    title, summary, tags = summarize(data["text"])
+    try:
+        title, summary, tags = await summarize(data["text"])
+    except Exception as e:
+        return {"error": str(e)}
     return {"title": title, "summary": summary, "tags": tags}
 
+@router.post("/summarize/stream")
+async def summarize_text_stream(request: Request):
+    """
+    Server-sent events version of /summarize: `delta` events carry raw model output, then
+    `title`, `summary` and `tags` events arrive as each field completes, and `done` carries the
+    full result.
+    """
+    data = await request.json()
+    text = data["text"]
+
+    async def events():
+        try:
+            async for event, value in summarize_stream(text):
+                yield f"event: {event}\ndata: {json.dumps(value)}\n\n"
+        except Exception as e:
+            logger.error("Streaming summarize failed: %s", e)
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @router.get("/token")
 async def get_token():
-    token = get_assemblyai_token_universal_streaming()
-    return {"token": token} 
\ No newline at end of file
+    token = await token_pool.get()
+    return {"token": token}
+
+@router.get("/token/pool")
+async def token_pool_stats():
+    return token_pool.stats() 
\ No newline at end of file
@@ -0,0 +1,110 @@
+import os
+import logging
+import json
+import asyncio
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
+from services.assembly import stream_transcripts, StreamStats
+from utils.audio import rechunk, preprocess, SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Client audio messages buffered before we stop reading from the socket (backpressure)
+AUDIO_QUEUE_SIZE = int(os.getenv("AUDIO_QUEUE_SIZE", "64"))
+SUPPORTED_RATES = (8000, 16000, 22050, 24000, 32000, 44100, 48000)
+
+@router.websocket("/ws/transcribe")
+async def transcribe(websocket: WebSocket):
+    """
+    Proxy a browser's audio to AssemblyAI and stream transcripts back.
+
+    The client sends binary messages of 16-bit PCM (any size) and may send {"type": "stop"} to end
+    the session. Query parameters describe the input: `sample_rate` (default 16000), `channels`
+    (1 or 2), `vad` (default true, drops long silences) and `partials` (default false, also send
+    in-progress text). Audio is resampled to 16 kHz mono before it goes upstream. The server
+    replies with {"type": "partial" | "final", "text": ...} messages, then {"type": "done"} with
+    the session's streaming stats. A dropped upstream connection is resumed transparently.
+    """
+    await websocket.accept()
+    try:
+        input_rate = int(websocket.query_params.get("sample_rate", SAMPLE_RATE))
+        channels = int(websocket.query_params.get("channels", 1))
+    except ValueError:
+        input_rate, channels = 0, 0
+    vad = websocket.query_params.get("vad", "true").lower() not in ("0", "false", "no")
+    partials = websocket.query_params.get("partials", "false").lower() in ("1", "true", "yes")
+    if input_rate not in SUPPORTED_RATES or channels not in (1, 2):
+        await websocket.send_json({"type": "error", "error": "Unsupported sample_rate or channels"})
+        await websocket.close(code=1003)
+        return
+    audio_queue: asyncio.Queue = asyncio.Queue(maxsize=AUDIO_QUEUE_SIZE)
+    # Set once the client stops sending audio
+    ended = asyncio.Event()
+
+    async def receive_audio():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    # Blocks while the queue is full, which stops reading from the client socket
+                    await audio_queue.put(message["bytes"])
+                elif message.get("text"):
+                    try:
+                        control = json.loads(message["text"])
+                    except ValueError:
+                        continue
+                    if control.get("type") == "stop":
+                        break
+        finally:
+            ended.set()
+            # Wake a reader waiting on an empty queue; a full queue is drained before `ended` is checked
+            try:
+                audio_queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+
+    async def audio_chunks():
+        while True:
+            if ended.is_set() and audio_queue.empty():
+                return
+            chunk = await audio_queue.get()
+            if chunk is not None:
+                yield chunk
+
+    stats = StreamStats()
+    receiver = asyncio.create_task(receive_audio())
+    try:
+        if input_rate == SAMPLE_RATE and channels == 1 and not vad:
+            # Already in upstream format: zero-copy re-chunking only
+            frames = rechunk(audio_chunks())
+        else:
+            frames = preprocess(audio_chunks(), input_rate=input_rate, channels=channels, vad=vad)
+        async for event in stream_transcripts(frames, partials=partials, stats=stats):
+            await websocket.send_json(event)
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.send_json({"type": "done", "stats": stats.to_dict()})
+        logger.info("Transcription session finished", extra=stats.to_dict())
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error("Transcription session failed: %s", e)
+        if websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await websocket.send_json({"type": "error", "error": str(e)})
+            except Exception:
+                pass
+    finally:
+        receiver.cancel()
+        try:
+            await receiver
+        except (asyncio.CancelledError, Exception):
+            pass
+        if websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await websocket.close()
+            except Exception:
+                pass
@@ -1,28 +1,30 @@
 import os
+import logging
 from dotenv import load_dotenv
-from algoliasearch.search.client import SearchClientSync
-from typing import List, Dict, Any, Optional
+from services.clients import get_algolia, get_http
+from services.resilience import Hedge, guard
+from typing import TYPE_CHECKING, List, Dict, Any
+
+if TYPE_CHECKING:
+    from algoliasearch.search.client import SearchClient
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 ALGOLIA_APP_ID = os.getenv("ALGOLIA_APP_ID")
 ALGOLIA_API_KEY = os.getenv("ALGOLIA_API_KEY")
+ALGOLIA_SEARCH_KEY = os.getenv("ALGOLIA_SEARCH_KEY")
 ALGOLIA_INDEX_NAME = os.getenv("ALGOLIA_INDEX_NAME", "whispers_logs")
+ALGOLIA_SEARCH_URL = os.getenv("ALGOLIA_HOST_URL") or f"https://{ALGOLIA_APP_ID}-dsn.algolia.net"
 
-_client: Optional[SearchClientSync] = None
-
-def get_client() -> SearchClientSync:
+def get_client() -> "SearchClient":
     """
-    Get a singleton Algolia SearchClientSync instance.
+    Get the shared async Algolia SearchClient (built on first use).
     """
-    global _client
-    if _client is None:
-        if not ALGOLIA_APP_ID or not ALGOLIA_API_KEY:
-            raise RuntimeError("Algolia credentials not set in environment variables.")
-        _client = SearchClientSync(ALGOLIA_APP_ID, ALGOLIA_API_KEY)
-    return _client
-
-def index_journal(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return get_algolia()
+
+async def index_journal(entry: Dict[str, Any]) -> Dict[str, Any]:
     """
     Index a single journal entry in Algolia. Waits for task completion.
 
@@ -35,40 +37,164 @@ def index_journal(entry: Dict[str, Any]) -> Dict[str, Any]:
 
     Example:
         entry = {"objectID": "abc123", "title": "My Day", "summary": "...", "tags": ["mood"], ...}
-        resp = index_journal(entry)
+        resp = await index_journal(entry)
     """
     client = get_client()
     try:
-        resp = client.save_object(index_name=ALGOLIA_INDEX_NAME, body=entry)
-        client.wait_for_task(index_name=ALGOLIA_INDEX_NAME, task_id=resp.task_id)
+        async with guard("algolia", "save"):
+            resp = await client.save_object(index_name=ALGOLIA_INDEX_NAME, body=entry)
+        async with guard("algolia", "wait_for_task"):
+            await client.wait_for_task(index_name=ALGOLIA_INDEX_NAME, task_id=resp.task_id)
         return resp.to_dict()
     except Exception as e:
         raise RuntimeError(f"Algolia indexing failed: {e}")
 
-def index_journals(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+async def index_journals(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Index multiple journal entries in Algolia. Waits for task completion.
 
     Args:
         entries: list of dicts, each with 'objectID', 'title', etc.
     Returns:
-        Algolia response dict.
+        List of Algolia batch response dicts (one per save_objects chunk).
     Raises:
         Exception on failure.
 
     Example:
         entries = [{"objectID": "1", ...}, {"objectID": "2", ...}]
-        resp = index_journals(entries)
+        resp = await index_journals(entries)
     """
     client = get_client()
     try:
-        resp = client.save_objects(index_name=ALGOLIA_INDEX_NAME, body=entries)
-        client.wait_for_task(index_name=ALGOLIA_INDEX_NAME, task_id=resp.task_id)
-        return resp.to_dict()
+        # Saved and awaited separately so save and indexing latency are measured apart
+        async with guard("algolia", "save"):
+            resp = await client.save_objects(index_name=ALGOLIA_INDEX_NAME, objects=entries)
+        async with guard("algolia", "wait_for_task"):
+            for r in resp:
+                await client.wait_for_task(index_name=ALGOLIA_INDEX_NAME, task_id=r.task_id)
+        return [r.to_dict() for r in resp]
     except Exception as e:
         raise RuntimeError(f"Algolia batch indexing failed: {e}")
 
-def _test_index_journal():
+async def delete_journals(object_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Delete journal entries from Algolia by objectID in chunked batches. Waits for task completion.
+    """
+    client = get_client()
+    try:
+        async with guard("algolia", "delete"):
+            resp = await client.delete_objects(index_name=ALGOLIA_INDEX_NAME, object_ids=object_ids)
+        async with guard("algolia", "wait_for_task"):
+            for r in resp:
+                await client.wait_for_task(index_name=ALGOLIA_INDEX_NAME, task_id=r.task_id)
+        return [r.to_dict() for r in resp]
+    except Exception as e:
+        raise RuntimeError(f"Algolia batch delete failed: {e}")
+
+# Search reads are hedged: a second identical query goes out if the first is slower than the recent p95
+algolia_reads = Hedge("algolia")
+
+# Only the fields returned by the search API are fetched from Algolia
+SEARCH_RESULT_ATTRIBUTES = ["title", "summary", "tags", "timestamp"]
+
+async def algolia_multi_search(terms, user_id=None, hits_per_page=10, page=0):
+    """
+    Query Algolia for every term in a single /1/indexes/*/queries request.
+    Hits are deduplicated by objectID and ranked stably: entries matched by more terms come first,
+    then by their best per-term rank, then by the order they were first seen.
+    `page` selects the same page of every term's results.
+    """
+    headers_algolia = {
+        "X-Algolia-API-Key": ALGOLIA_SEARCH_KEY or ALGOLIA_API_KEY,
+        "X-Algolia-Application-Id": ALGOLIA_APP_ID,
+        "Content-Type": "application/json"
+    }
+    # Add user_id filter if provided
+    filter_str = f"user_id:{user_id}" if user_id else ""
+    payload_algolia = {
+        "requests": [
+            {
+                "indexName": ALGOLIA_INDEX_NAME,
+                "query": term,
+                "hitsPerPage": hits_per_page,
+                "page": page,
+                "filters": filter_str,
+                "attributesToRetrieve": SEARCH_RESULT_ATTRIBUTES,
+                "attributesToHighlight": [],
+                "attributesToSnippet": []
+            }
+            for term in terms
+        ]
+    }
+
+    async def query():
+        async with guard("algolia", "query") as t:
+            resp_algolia = await get_http().post(
+                f"{ALGOLIA_SEARCH_URL}/1/indexes/*/queries",
+                headers=headers_algolia,
+                json=payload_algolia,
+                timeout=10
+            )
+            t.status = resp_algolia.status_code
+            resp_algolia.raise_for_status()
+        return resp_algolia.json()
+
+    results = (await algolia_reads.run(query)).get("results", [])
+    merged = {}
+    for term, result in zip(terms, results):
+        hits = result.get("hits", [])
+        logger.debug("Algolia term results", extra={"term": term, "hits": len(hits)})
+        for rank, hit in enumerate(hits):
+            obj_id = hit.get("objectID")
+            if not obj_id:
+                continue
+            if obj_id in merged:
+                ranked = merged[obj_id]
+                ranked["matches"] += 1
+                ranked["best_rank"] = min(ranked["best_rank"], rank)
+                continue
+            # Only keep relevant fields for the API response
+            merged[obj_id] = {
+                "matches": 1,
+                "best_rank": rank,
+                "order": len(merged),
+                "hit": {
+                    "objectID": obj_id,
+                    "title": hit.get("title", ""),
+                    "summary": hit.get("summary", ""),
+                    "tags": hit.get("tags", []),
+                    "timestamp": hit.get("timestamp", "")
+                }
+            }
+    ranked = sorted(merged.values(), key=lambda r: (-r["matches"], r["best_rank"], r["order"]))
+    return [r["hit"] for r in ranked]
+
+async def browse_records(attributes: List[str], hits_per_page: int = 1000):
+    """
+    Yield every record in the index (objectID plus `attributes`), page by page through the
+    browse API cursor. Needs an API key with the browse ACL.
+    """
+    headers = {
+        "X-Algolia-API-Key": ALGOLIA_API_KEY,
+        "X-Algolia-Application-Id": ALGOLIA_APP_ID,
+        "Content-Type": "application/json"
+    }
+    body = {"attributesToRetrieve": attributes, "hitsPerPage": hits_per_page}
+    while True:
+        async with guard("algolia", "browse") as t:
+            resp = await get_http().post(f"{ALGOLIA_SEARCH_URL}/1/indexes/{ALGOLIA_INDEX_NAME}/browse",
+                                         headers=headers, json=body, timeout=30)
+            t.status = resp.status_code
+            resp.raise_for_status()
+        data = resp.json()
+        for hit in data.get("hits", []):
+            yield hit
+        cursor = data.get("cursor")
+        if not cursor:
+            return
+        body = {"cursor": cursor}
+
+async def _test_index_journal():
     print("Running MCP connection test for index_journal...")
     # Subtest: Ensure Algolia SDK is NOT imported
     import sys
@@ -81,21 +207,30 @@ def _test_index_journal():
         "timestamp": "2025-07-24T10:22:00Z"
     }
     try:
-        response = index_journal(entry)
+        response = await index_journal(entry)
         print("Index response:", response)
         assert 'objectID' in response, "Response should contain objectID."
         print("MCP indexing test passed.")
     except Exception as e:
         print("MCP indexing test failed:", e)
 
-def _test_search_journals():
+async def _test_search_journals():
     print("\n=== Running MCP search test for natural language query ===")
     from services.gemini import mcp_search
     query = "when did I feel burnt out"
-    response = mcp_search(query)
+    response = await mcp_search(query)
     print("MCP search response:", response)
     print("=== End of MCP search test ===\n")
 
+async def _run_tests():
+    from services import clients
+    await clients.startup()
+    try:
+        await _test_index_journal()
+        await _test_search_journals()
+    finally:
+        await clients.shutdown()
+
 if __name__ == "__main__":
-    _test_index_journal()
-    _test_search_journals()
\ No newline at end of file
+    import asyncio
+    asyncio.run(_run_tests())
\ No newline at end of file
@@ -1,44 +1,404 @@
 import os
+import logging
+import time
 import asyncio
 import websockets
 import json
-import requests
+from collections import deque
 from dotenv import load_dotenv
+from services.clients import get_http
+from services.resilience import guard
+from utils.audio import SAMPLE_RATE, SAMPLE_WIDTH
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
-ASSEMBLYAI_TOKEN_URL = "https://streaming.assemblyai.com/v3/token?expires_in_seconds=600"
-ASSEMBLYAI_WS_BASE = "wss://streaming.assemblyai.com/v3/ws?sample_rate=16000&formatted_finals=true&token="
+ASSEMBLYAI_TOKEN_TTL = 600
+ASSEMBLYAI_API_URL = os.getenv("ASSEMBLYAI_API_URL", "https://streaming.assemblyai.com")
+ASSEMBLYAI_TOKEN_URL = f"{ASSEMBLYAI_API_URL}/v3/token?expires_in_seconds={ASSEMBLYAI_TOKEN_TTL}"
+ASSEMBLYAI_TOKEN_POOL_SIZE = int(os.getenv("ASSEMBLYAI_TOKEN_POOL_SIZE", "3"))
+# Pooled tokens with less than this many seconds left are discarded and replaced
+ASSEMBLYAI_TOKEN_MIN_REMAINING = float(os.getenv("ASSEMBLYAI_TOKEN_MIN_REMAINING", "120"))
+ASSEMBLYAI_WS_URL = os.getenv("ASSEMBLYAI_WS_URL", "wss://streaming.assemblyai.com/v3/ws")
+# Audio kept after sending until a final transcript covers it; replayed after a reconnect
+ASSEMBLYAI_REPLAY_SECONDS = float(os.getenv("ASSEMBLYAI_REPLAY_SECONDS", "20"))
+ASSEMBLYAI_MAX_RECONNECTS = int(os.getenv("ASSEMBLYAI_MAX_RECONNECTS", "3"))
+# Frames waiting between the audio pipeline and the upstream socket
+ASSEMBLYAI_SEND_QUEUE = int(os.getenv("ASSEMBLYAI_SEND_QUEUE", "32"))
+# Bytes websockets may buffer before ws.send() waits for the network
+ASSEMBLYAI_WRITE_LIMIT = int(os.getenv("ASSEMBLYAI_WRITE_LIMIT", "65536"))
+
+def assemblyai_ws_url(token, sample_rate=SAMPLE_RATE):
+    return f"{ASSEMBLYAI_WS_URL}?sample_rate={sample_rate}&formatted_finals=true&token={token}"
 
 # Get a Universal Streaming API token for AssemblyAI (10 min expiration)
-def get_assemblyai_token_universal_streaming():
+async def get_assemblyai_token_universal_streaming():
     headers = {"authorization": ASSEMBLYAI_API_KEY}
-    resp = requests.get(ASSEMBLYAI_TOKEN_URL, headers=headers, timeout=10)
-    resp.raise_for_status()
+    async with guard("assemblyai", "token") as t:
+        resp = await get_http().get(ASSEMBLYAI_TOKEN_URL, headers=headers, timeout=10)
+        t.status = resp.status_code
+        resp.raise_for_status()
     return resp.json()["token"]
 
-async def stream_to_assemblyai(audio_generator):
+class TokenPool:
     """
-    Streams PCM audio chunks to AssemblyAI Universal-Streaming API and yields transcript text results.
-    :param audio_generator: async generator yielding raw PCM audio bytes
-    :yield: transcript text (str)
+    Keeps a few fresh AssemblyAI streaming tokens ready so /token and new transcription sessions
+    don't wait on a token round trip.
+
+    Each token is handed out once. A background task tops the pool back up after every hand-out
+    and replaces tokens before they get within `min_remaining` seconds of expiry. If the pool is
+    empty, `get` falls back to fetching inline.
     """
-    token = get_assemblyai_token_universal_streaming()
-    ws_url = ASSEMBLYAI_WS_BASE + token
-    async with websockets.connect(ws_url) as ws:
-        async def send_audio():
+
+    def __init__(self, size=ASSEMBLYAI_TOKEN_POOL_SIZE, ttl=ASSEMBLYAI_TOKEN_TTL, min_remaining=ASSEMBLYAI_TOKEN_MIN_REMAINING):
+        self.size = size
+        self.ttl = ttl
+        self.min_remaining = min_remaining
+        self._tokens = deque()
+        self._wakeup = None
+        self._task = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.expired = 0
+        self.last_refresh_ms = None
+        self.total_refresh_ms = 0.0
+
+    async def start(self):
+        if self._task is None and self.size > 0:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._tokens.clear()
+
+    async def get(self):
+        self._drop_stale()
+        if self._tokens:
+            token, _ = self._tokens.popleft()
+            self.hits += 1
+        else:
+            self.misses += 1
+            token, _ = await self._fetch()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return token
+
+    def _drop_stale(self):
+        cutoff = time.monotonic() + self.min_remaining
+        while self._tokens and self._tokens[0][1] <= cutoff:
+            self._tokens.popleft()
+            self.expired += 1
+
+    async def _fetch(self):
+        started = time.perf_counter()
+        token = await get_assemblyai_token_universal_streaming()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.refreshes += 1
+        self.last_refresh_ms = elapsed_ms
+        self.total_refresh_ms += elapsed_ms
+        # Expiry is counted from when the request was sent, to stay on the safe side
+        return token, time.monotonic() - elapsed_ms / 1000 + self.ttl
+
+    async def _refill_loop(self):
+        backoff = 1.0
+        while True:
+            self._drop_stale()
+            try:
+                while len(self._tokens) < self.size:
+                    self._tokens.append(await self._fetch())
+                backoff = 1.0
+                # Sleep until a hand-out, or until the oldest token is about to go stale
+                timeout = self._tokens[0][1] - self.min_remaining - time.monotonic() if self._tokens else backoff
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.warning("AssemblyAI token refresh failed: %s", e)
+                timeout = backoff
+                backoff = min(backoff * 2, 60.0)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0.1))
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        return {
+            "depth": len(self._tokens),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "expired": self.expired,
+            "last_refresh_ms": self.last_refresh_ms,
+            "avg_refresh_ms": (self.total_refresh_ms / self.refreshes) if self.refreshes else None
+        }
+
+token_pool = TokenPool()
+
+class AudioRing:
+    """
+    Bounded buffer of audio already sent upstream but not yet covered by a final transcript.
+
+    Positions are byte offsets into the session's audio. `ack` drops everything up to a
+    position; when the buffer is over `max_bytes` the oldest chunks are dropped (and counted)
+    so a long unfinished turn can't grow it without limit.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._chunks = deque()
+        self.start = 0
+        self.end = 0
+        self.dropped_bytes = 0
+
+    def append(self, data, sent_at):
+        self._chunks.append((self.end, data, sent_at))
+        self.end += len(data)
+        while self.end - self.start > self.max_bytes and len(self._chunks) > 1:
+            self.dropped_bytes += self._pop()
+
+    def _pop(self):
+        offset, data, _ = self._chunks.popleft()
+        self.start = offset + len(data)
+        return len(data)
+
+    def ack(self, position):
+        while self._chunks and self._chunks[0][0] + len(self._chunks[0][1]) <= position:
+            self._pop()
+
+    def sent_at(self, position):
+        """
+        Wall-clock time the chunk containing `position` was first sent, if it is still buffered.
+        """
+        for offset, data, sent_at in self._chunks:
+            if offset <= position < offset + len(data):
+                return sent_at
+        return None
+
+    def chunks(self):
+        return [data for _, data, _ in self._chunks]
+
+    def __len__(self):
+        return self.end - self.start
+
+class StreamStats:
+    """
+    Per-session counters for one transcription stream.
+
+    send lag is the time ws.send() waits on the network. receive lag is the time from sending a
+    piece of audio to receiving the final transcript that covers it.
+    """
+
+    def __init__(self):
+        self.connections = 0
+        self.reconnects = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.replayed_bytes = 0
+        self.partials = 0
+        self.finals = 0
+        self.send_lag_total_ms = 0.0
+        self.send_lag_max_ms = 0.0
+        self.receive_lag_count = 0
+        self.receive_lag_total_ms = 0.0
+        self.receive_lag_max_ms = 0.0
+        self.receive_lag_last_ms = None
+        self.dropped_bytes = 0
+
+    def record_send(self, nbytes, lag_ms):
+        self.frames_sent += 1
+        self.bytes_sent += nbytes
+        self.send_lag_total_ms += lag_ms
+        self.send_lag_max_ms = max(self.send_lag_max_ms, lag_ms)
+
+    def record_receive_lag(self, lag_ms):
+        self.receive_lag_count += 1
+        self.receive_lag_total_ms += lag_ms
+        self.receive_lag_max_ms = max(self.receive_lag_max_ms, lag_ms)
+        self.receive_lag_last_ms = lag_ms
+
+    def to_dict(self):
+        return {
+            "connections": self.connections,
+            "reconnects": self.reconnects,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "replayed_bytes": self.replayed_bytes,
+            "dropped_bytes": self.dropped_bytes,
+            "partials": self.partials,
+            "finals": self.finals,
+            "send_lag_avg_ms": (self.send_lag_total_ms / self.frames_sent) if self.frames_sent else None,
+            "send_lag_max_ms": self.send_lag_max_ms,
+            "receive_lag_avg_ms": (self.receive_lag_total_ms / self.receive_lag_count) if self.receive_lag_count else None,
+            "receive_lag_max_ms": self.receive_lag_max_ms,
+            "receive_lag_last_ms": self.receive_lag_last_ms
+        }
+
+def parse_message(data):
+    """
+    Normalize an upstream message to (kind, text, audio_end_ms), where kind is "partial", "final",
+    "terminated" or None. Handles both the v3 ("type": "Turn") and v2 ("message_type") formats.
+    """
+    kind = data.get("type") or data.get("message_type")
+    if kind == "Turn":
+        words = data.get("words") or []
+        audio_end = words[-1].get("end") if words else None
+        text = data.get("transcript", "")
+        if not data.get("end_of_turn"):
+            return "partial", text, audio_end
+        # With formatted_finals the unformatted end-of-turn message is followed by a formatted one
+        if data.get("turn_is_formatted"):
+            return "final", text, audio_end
+        return None, text, audio_end
+    if kind == "FinalTranscript":
+        return "final", data.get("text", ""), data.get("audio_end")
+    if kind == "PartialTranscript":
+        return "partial", data.get("text", ""), data.get("audio_end")
+    if kind in ("Termination", "SessionTerminated"):
+        return "terminated", "", None
+    return None, "", None
+
+def _stable(chunk):
+    """
+    A chunk that stays valid while queued and kept for replay. Bytes and read-only views (e.g.
+    rechunk's zero-copy slices of client messages) are used as-is; writable buffers, like the
+    preprocessor's reused frame, are copied.
+    """
+    if isinstance(chunk, bytes) or (isinstance(chunk, memoryview) and chunk.readonly):
+        return chunk
+    return bytes(chunk)
+
+async def stream_transcripts(audio_generator, sample_rate=SAMPLE_RATE, partials=False, stats=None):
+    """
+    Streams PCM audio to AssemblyAI Universal-Streaming and yields transcript events.
+
+    Audio that has been sent but not yet covered by a final transcript is kept in an AudioRing.
+    If the socket drops, a new connection is opened on a fresh token and that tail is replayed,
+    so the caller only sees a short pause. Gives up after ASSEMBLYAI_MAX_RECONNECTS attempts in
+    a row that make no progress.
+    :param audio_generator: async generator yielding raw PCM audio bytes (mono 16-bit at `sample_rate`)
+    :param sample_rate: sample rate of the audio; utils.audio.preprocess produces 16 kHz
+    :param partials: also yield in-progress transcripts
+    :param stats: optional StreamStats to fill in
+    :yield: {"type": "partial" | "final", "text": str}
+    """
+    stats = stats if stats is not None else StreamStats()
+    bytes_per_ms = sample_rate * SAMPLE_WIDTH / 1000
+    ring = AudioRing(int(ASSEMBLYAI_REPLAY_SECONDS * sample_rate * SAMPLE_WIDTH))
+    # Bounded hand-off from the audio pipeline; the pump outlives individual connections
+    queue: asyncio.Queue = asyncio.Queue(maxsize=ASSEMBLYAI_SEND_QUEUE)
+    # Set once the audio generator is exhausted; stays set across reconnects
+    ended = asyncio.Event()
+
+    async def pump():
+        try:
             async for chunk in audio_generator:
-                await ws.send(chunk)
-            await ws.send(json.dumps({"terminate_session": True}))
-
-        async def receive_transcripts():
-            async for msg in ws:
-                data = json.loads(msg)
-                if data.get("message_type") == "FinalTranscript":
-                    yield data.get("text", "")
-
-        send_task = asyncio.create_task(send_audio())
-        async for transcript in receive_transcripts():
-            yield transcript
-        await send_task 
\ No newline at end of file
+                await queue.put(_stable(chunk))
+        finally:
+            ended.set()
+            # Wake a sender waiting on an empty queue; if the queue is full it will see `ended` once drained
+            try:
+                queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+
+    async def send_audio(ws, replay):
+        for data in replay:
+            await ws.send(data)
+            stats.replayed_bytes += len(data)
+        while True:
+            if ended.is_set() and queue.empty():
+                await ws.send(json.dumps({"type": "Terminate"}))
+                return
+            data = await queue.get()
+            if data is None:
+                continue
+            sent_at = time.monotonic()
+            ring.append(data, sent_at)
+            await ws.send(data)
+            stats.record_send(len(data), (time.monotonic() - sent_at) * 1000)
+
+    pump_task = asyncio.create_task(pump())
+    failures = 0
+    try:
+        while True:
+            finished = False
+            acked = ring.start
+            try:
+                token = await token_pool.get()
+                async with websockets.connect(assemblyai_ws_url(token, sample_rate), compression=None,
+                                              write_limit=ASSEMBLYAI_WRITE_LIMIT) as ws:
+                    stats.connections += 1
+                    # Upstream timestamps restart at zero on every connection, at the first replayed byte
+                    base = ring.start
+                    send_task = asyncio.create_task(send_audio(ws, ring.chunks()))
+                    last_partial = None
+                    try:
+                        async for msg in ws:
+                            kind, text, audio_end = parse_message(json.loads(msg))
+                            if kind == "terminated":
+                                finished = True
+                                break
+                            if kind == "final":
+                                if audio_end is not None:
+                                    position = base + int(audio_end * bytes_per_ms)
+                                    sent_at = ring.sent_at(position - 1)
+                                    if sent_at is not None:
+                                        stats.record_receive_lag((time.monotonic() - sent_at) * 1000)
+                                    ring.ack(position)
+                                last_partial = None
+                                if text:
+                                    stats.finals += 1
+                                    yield {"type": "final", "text": text}
+                            elif kind == "partial" and partials and text and text != last_partial:
+                                last_partial = text
+                                stats.partials += 1
+                                yield {"type": "partial", "text": text}
+                        # Server closed cleanly after we asked it to terminate
+                        if send_task.done() and not send_task.cancelled() and send_task.exception() is None:
+                            finished = True
+                    finally:
+                        if not send_task.done():
+                            send_task.cancel()
+                        try:
+                            await send_task
+                        except (asyncio.CancelledError, websockets.ConnectionClosed):
+                            pass
+            except (websockets.ConnectionClosed, websockets.InvalidStatus, OSError) as e:
+                logger.warning("AssemblyAI stream interrupted: %s", e)
+            if finished:
+                break
+            failures = 0 if ring.start > acked else failures + 1
+            if failures > ASSEMBLYAI_MAX_RECONNECTS:
+                raise RuntimeError("AssemblyAI stream dropped and could not be resumed")
+            stats.reconnects += 1
+            await asyncio.sleep(min(0.25 * 2 ** failures, 5.0))
+        await pump_task
+    finally:
+        stats.dropped_bytes = ring.dropped_bytes
+        if not pump_task.done():
+            pump_task.cancel()
+            try:
+                await pump_task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+async def stream_to_assemblyai(audio_generator, sample_rate=SAMPLE_RATE):
+    """
+    Streams PCM audio chunks to AssemblyAI Universal-Streaming API and yields final transcript text.
+    See stream_transcripts for reconnect behaviour and partial transcripts.
+    :yield: transcript text (str)
+    """
+    async for event in stream_transcripts(audio_generator, sample_rate=sample_rate):
+        yield event["text"]
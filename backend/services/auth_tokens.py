@@ -0,0 +1,152 @@
+import os
+import logging
+import time
+import asyncio
+import hashlib
+import hmac
+import jwt
+from fastapi import HTTPException, Request
+from typing import Any, Dict, Optional
+from services.cache import TTLCache
+from services.clients import get_http, get_supabase
+from services.resilience import guard
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+# Legacy HS256 projects sign access tokens with the project JWT secret; newer ones publish a JWKS
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+SUPABASE_JWKS_URL = os.getenv("SUPABASE_JWKS_URL", f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json")
+JWKS_CACHE_SECONDS = float(os.getenv("JWKS_CACHE_SECONDS", "600"))
+# Refetch the JWKS for an unknown kid at most this often
+JWKS_MIN_REFRESH_SECONDS = 30.0
+CLAIMS_CACHE_SIZE = int(os.getenv("CLAIMS_CACHE_SIZE", "4096"))
+CLAIMS_CACHE_TTL = float(os.getenv("CLAIMS_CACHE_TTL", "300"))
+JWT_LEEWAY_SECONDS = 10
+# Bearer token for operator endpoints (backfill, reconcile); they are disabled while unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+class TokenVerifier:
+    """
+    Verifies Supabase access tokens locally instead of calling supabase.auth.get_user per request.
+
+    HS256 tokens are checked against SUPABASE_JWT_SECRET; RS256/ES256 tokens against the project's
+    JWKS, which is fetched once and cached. Verified claims are kept in a small LRU keyed by a
+    hash of the token, and never served past the token's `exp`. If no local key is available the
+    token is checked remotely once and the result cached the same way.
+    """
+
+    def __init__(self, secret: Optional[str] = SUPABASE_JWT_SECRET, jwks_url: Optional[str] = SUPABASE_JWKS_URL,
+                 audience: str = SUPABASE_JWT_AUDIENCE):
+        self.secret = secret
+        self.jwks_url = jwks_url
+        self.audience = audience
+        self._claims = TTLCache(maxsize=CLAIMS_CACHE_SIZE, ttl=CLAIMS_CACHE_TTL)
+        self._jwks: Dict[str, Any] = {}
+        self._jwks_fetched_at = -JWKS_CACHE_SECONDS
+        self._jwks_lock = asyncio.Lock()
+        self.local_verifications = 0
+        self.remote_verifications = 0
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """
+        Return the verified claims of `token` (at least 'sub' and 'exp'). Raises on invalid tokens.
+        """
+        cache_key = hashlib.sha256(token.encode("utf-8")).digest()
+        claims = self._claims.get(cache_key)
+        if claims is not None and claims["exp"] > time.time():
+            return claims
+        header = jwt.get_unverified_header(token)
+        alg = header.get("alg")
+        key = None
+        if alg == "HS256":
+            key = self.secret
+        elif alg in ("RS256", "ES256", "EdDSA") and self.jwks_url:
+            key = await self._signing_key(header.get("kid"))
+        if key is None:
+            claims = await self._verify_remote(token)
+        else:
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=[alg],
+                audience=self.audience,
+                leeway=JWT_LEEWAY_SECONDS,
+                options={"require": ["exp", "sub"]}
+            )
+            self.local_verifications += 1
+        self._claims.set(cache_key, claims)
+        return claims
+
+    async def _signing_key(self, kid: Optional[str]):
+        age = time.monotonic() - self._jwks_fetched_at
+        if kid in self._jwks and age < JWKS_CACHE_SECONDS:
+            return self._jwks[kid]
+        async with self._jwks_lock:
+            # Another request may have refreshed while we waited; unknown kids refetch at most every JWKS_MIN_REFRESH_SECONDS
+            age = time.monotonic() - self._jwks_fetched_at
+            if age >= JWKS_CACHE_SECONDS or (kid not in self._jwks and age >= JWKS_MIN_REFRESH_SECONDS):
+                await self._refresh_jwks()
+        return self._jwks.get(kid)
+
+    async def _refresh_jwks(self) -> None:
+        async with guard("supabase", "auth.jwks") as t:
+            resp = await get_http().get(self.jwks_url, timeout=5)
+            t.status = resp.status_code
+            resp.raise_for_status()
+        keys = {}
+        for jwk in resp.json().get("keys", []):
+            try:
+                keys[jwk.get("kid")] = jwt.PyJWK(jwk).key
+            except Exception as e:
+                logger.warning("Skipping unusable JWK %s: %s", jwk.get("kid"), e)
+        self._jwks = keys
+        self._jwks_fetched_at = time.monotonic()
+
+    async def _verify_remote(self, token: str) -> Dict[str, Any]:
+        async with guard("supabase", "auth.get_user"):
+            user_response = await get_supabase().auth.get_user(token)
+        if not user_response or not user_response.user:
+            raise jwt.InvalidTokenError("Invalid session")
+        self.remote_verifications += 1
+        # Unverified exp is fine here: Supabase has just vouched for the token
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp") or (time.time() + CLAIMS_CACHE_TTL)
+        return {"sub": user_response.user.id, "email": user_response.user.email, "exp": exp}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "local_verifications": self.local_verifications,
+            "remote_verifications": self.remote_verifications,
+            "claims_cache": self._claims.stats()
+        }
+
+token_verifier = TokenVerifier()
+
+def bearer_token(request: Request) -> str:
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="No valid session")
+    return auth_header.split(" ")[1]
+
+async def require_user(request: Request) -> Dict[str, Any]:
+    """
+    FastAPI dependency for authenticated routes: returns the verified token claims
+    ('sub' is the user id, 'email' the user's email) or raises 401.
+    """
+    token = bearer_token(request)
+    try:
+        return await token_verifier.verify(token)
+    except Exception as e:
+        logger.info("Token verification failed: %s", e)
+        raise HTTPException(status_code=401, detail="Invalid session")
+
+async def require_admin(request: Request) -> None:
+    """
+    FastAPI dependency for operator routes: the bearer token must equal ADMIN_TOKEN. Raises 403
+    if it doesn't, and 503 if no ADMIN_TOKEN is configured.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin endpoints are disabled")
+    if not hmac.compare_digest(bearer_token(request).encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Not allowed")
@@ -0,0 +1,355 @@
+import os
+import logging
+import re
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from services import clients
+from services.clients import get_supabase
+from services.gemini import summarize, invalidate_user_searches
+from services.supabase import invalidate_usage, invalidate_entries
+from services.search_backend import get_search_backend
+from services.resilience import guard, clear_deadline
+from services.insights import insights
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_DIR = os.getenv(
+    "BACKFILL_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "backfill")
+)
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "4"))
+# Gemini summarize calls per second across all workers
+BACKFILL_RATE = float(os.getenv("BACKFILL_RATE", "5"))
+# Rows per Supabase upsert and per search index write
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "100"))
+BACKFILL_WRITE_ATTEMPTS = 3
+# Input lines read from disk per thread hop
+READ_HINT_BYTES = 1 << 20
+
+REQUIRED_FIELDS = ("user_id", "timestamp", "text")
+
+class RateLimiter:
+    """
+    Token bucket: `acquire` waits until a call is allowed, `rate` per second with bursts up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class Backfill:
+    """
+    Bulk summarize-and-index for an NDJSON file of journal entries.
+
+    Each line needs user_id, timestamp and text. Optional fields are session_id, date, title,
+    summary, tags, audio_url and entry_id. Entries without a summary are summarized, and so is
+    every entry when `resummarize` is set. Summaries run on `concurrency` workers behind a rate
+    limiter. Results are upserted to Supabase and written to the search backend in batches.
+
+    Progress goes to a checkpoint file next to the input. It records the last line such that
+    every line up to it has been written, so a crashed run resumes from there. Entries without
+    an entry_id get a deterministic one, so replayed lines overwrite their earlier rows instead
+    of adding duplicates. Lines that can't be processed go to `<input>.failed.ndjson`.
+    """
+
+    def __init__(self, input_path: str, checkpoint_path: Optional[str] = None, concurrency: int = BACKFILL_CONCURRENCY,
+                 rate: float = BACKFILL_RATE, batch_size: int = BACKFILL_BATCH_SIZE, resummarize: bool = False):
+        self.input_path = input_path
+        self.checkpoint_path = checkpoint_path or input_path + ".checkpoint.json"
+        self.failed_path = input_path + ".failed.ndjson"
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.resummarize = resummarize
+        self.limiter = RateLimiter(rate)
+        self._batch: List[Any] = []
+        self._write_lock = asyncio.Lock()
+        # Lines finished (written or failed) past the checkpoint watermark
+        self._done = set()
+        self.watermark = 0
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.read = 0
+        self.skipped = 0
+        self.summarized = 0
+        self.written = 0
+        self.failed = 0
+
+    def _load_checkpoint(self) -> None:
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return
+        self.watermark = checkpoint.get("line", 0)
+        self.written = checkpoint.get("written", 0)
+        self.failed = checkpoint.get("failed", 0)
+
+    def _save_checkpoint(self) -> None:
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"line": self.watermark, "written": self.written, "failed": self.failed,
+                       "state": self.state, "updated_at": time.time()}, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    async def run(self) -> Dict[str, Any]:
+        self.started_at = time.monotonic()
+        self.state = "running"
+        await asyncio.to_thread(self._load_checkpoint)
+        work: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(work)) for _ in range(self.concurrency)]
+
+        async def feed():
+            await self._read_input(work)
+            for _ in workers:
+                await work.put(None)
+
+        tasks = [asyncio.create_task(feed()), *workers]
+        try:
+            # A worker that gives up on a batch write fails the run instead of stalling the reader
+            await asyncio.gather(*tasks)
+            await self._flush()
+            self.state = "done"
+        except BaseException as e:
+            self.state = "failed"
+            self.error = str(e) or type(e).__name__
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            self.finished_at = time.monotonic()
+            await asyncio.to_thread(self._save_checkpoint)
+        return self.stats()
+
+    async def _read_input(self, work: asyncio.Queue) -> None:
+        with open(self.input_path, encoding="utf-8") as f:
+            line_no = 0
+            while True:
+                lines = await asyncio.to_thread(f.readlines, READ_HINT_BYTES)
+                if not lines:
+                    return
+                for line in lines:
+                    line_no += 1
+                    if line_no <= self.watermark:
+                        self.skipped += 1
+                        continue
+                    self.read += 1
+                    await work.put((line_no, line))
+
+    async def _worker(self, work: asyncio.Queue) -> None:
+        while True:
+            item = await work.get()
+            if item is None:
+                return
+            line_no, line = item
+            if not line.strip():
+                self._finish([line_no])
+                continue
+            try:
+                entry = self._prepare(json.loads(line))
+                if self.resummarize or not entry["summary"]:
+                    await self.limiter.acquire()
+                    entry["title"], entry["summary"], entry["tags"] = await summarize(entry["text"])
+                    self.summarized += 1
+            except Exception as e:
+                await self._record_failure(line_no, line, e)
+                continue
+            self._batch.append((line_no, entry))
+            if len(self._batch) >= self.batch_size:
+                await self._flush()
+
+    def _prepare(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        missing = [f for f in REQUIRED_FIELDS if not data.get(f)]
+        if missing:
+            raise ValueError(f"Missing required fields: {', '.join(missing)}")
+        entry_id = data.get("entry_id") or str(
+            uuid.uuid5(uuid.NAMESPACE_URL, f"whispers:{data['user_id']}:{data.get('session_id', '')}:{data['timestamp']}")
+        )
+        return {
+            "user_id": data["user_id"],
+            "session_id": data.get("session_id", ""),
+            "date": data.get("date") or str(data["timestamp"])[:10],
+            "timestamp": data["timestamp"],
+            "title": data.get("title", ""),
+            "summary": data.get("summary", ""),
+            "tags": data.get("tags", []),
+            "text": data["text"],
+            "audio_url": data.get("audio_url", ""),
+            "entry_id": entry_id,
+            "objectID": entry_id,
+            "updated": datetime.now(timezone.utc).isoformat()
+        }
+
+    async def _record_failure(self, line_no: int, line: str, error: Exception) -> None:
+        record = json.dumps({"line": line_no, "error": str(error), "input": line.rstrip("\n")})
+
+        def append():
+            with open(self.failed_path, "a", encoding="utf-8") as f:
+                f.write(record + "\n")
+
+        await asyncio.to_thread(append)
+        self.failed += 1
+        self._finish([line_no])
+
+    async def _flush(self) -> None:
+        async with self._write_lock:
+            batch, self._batch = self._batch, []
+            if not batch:
+                return
+            entries = [entry for _, entry in batch]
+            for attempt in range(BACKFILL_WRITE_ATTEMPTS):
+                try:
+                    async with guard("supabase", "journal_entries.upsert"):
+                        await get_supabase().table("journal_entries").upsert(entries, on_conflict="entry_id").execute()
+                    await get_search_backend().index(entries)
+                    break
+                except Exception as e:
+                    logger.warning("Backfill batch write failed (attempt %d): %s", attempt + 1, e)
+                    if attempt + 1 == BACKFILL_WRITE_ATTEMPTS:
+                        raise
+                    await asyncio.sleep(2 ** attempt)
+            self.written += len(entries)
+            await insights.apply(entries)
+            for user_id in {entry["user_id"] for entry in entries}:
+                invalidate_user_searches(user_id)
+                invalidate_usage(user_id)
+                invalidate_entries(user_id)
+            self._finish([line_no for line_no, _ in batch])
+            await asyncio.to_thread(self._save_checkpoint)
+
+    def _finish(self, line_nos: List[int]) -> None:
+        self._done.update(line_nos)
+        while self.watermark + 1 in self._done:
+            self.watermark += 1
+            self._done.discard(self.watermark)
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = ((self.finished_at or time.monotonic()) - self.started_at) if self.started_at else 0.0
+        return {
+            "state": self.state,
+            "error": self.error,
+            "checkpoint_line": self.watermark,
+            "read": self.read,
+            "skipped": self.skipped,
+            "summarized": self.summarized,
+            "written": self.written,
+            "failed": self.failed,
+            "elapsed_seconds": round(elapsed, 1),
+            "entries_per_second": round(self.read / elapsed, 2) if elapsed else None
+        }
+
+# Backfills started through the API, by job name
+jobs: Dict[str, Backfill] = {}
+_tasks: Dict[str, asyncio.Task] = {}
+
+_JOB_NAME = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+def job_input_path(name: str) -> str:
+    if not _JOB_NAME.match(name):
+        raise ValueError("Job names may only contain letters, digits, '.', '_' and '-'")
+    return os.path.join(BACKFILL_DIR, name, "input.ndjson")
+
+async def start_job(name: str, chunks=None, resummarize: bool = False) -> Backfill:
+    """
+    Spool an uploaded NDJSON body (async iterator of bytes) to disk and backfill it in the background.
+    Without `chunks`, an earlier job of the same name is resumed from its checkpoint.
+    """
+    if name in _tasks and not _tasks[name].done():
+        raise RuntimeError(f"Backfill job '{name}' is already running")
+    path = job_input_path(name)
+    if chunks is not None:
+        await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        size = 0
+        with open(tmp, "wb") as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        if size == 0:
+            # e.g. a chunked request with no body; the existing input and checkpoint are kept
+            os.remove(tmp)
+            raise ValueError("Empty upload; send Content-Length: 0 to resume an earlier job")
+        for stale in (path + ".checkpoint.json", path + ".failed.ndjson"):
+            if os.path.exists(stale):
+                os.remove(stale)
+        os.replace(tmp, path)
+    elif not os.path.exists(path):
+        raise FileNotFoundError(f"No input for backfill job '{name}'")
+    job = Backfill(path, resummarize=resummarize)
+    jobs[name] = job
+
+    async def run():
+        # Started from an API request; the job must not inherit its deadline
+        clear_deadline()
+        try:
+            await job.run()
+        except Exception as e:
+            logger.error("Backfill job %s failed: %s", name, e)
+
+    _tasks[name] = asyncio.create_task(run())
+    return job
+
+async def stop_jobs() -> None:
+    """
+    Cancel running API backfills; their checkpoints let them resume later.
+    """
+    for task in _tasks.values():
+        task.cancel()
+    await asyncio.gather(*_tasks.values(), return_exceptions=True)
+
+async def _main(args) -> None:
+    await clients.startup()
+    backend = get_search_backend()
+    await backend.start()
+    job = Backfill(args.input, checkpoint_path=args.checkpoint, concurrency=args.concurrency, rate=args.rate,
+                   batch_size=args.batch_size, resummarize=args.resummarize)
+
+    async def report():
+        while True:
+            await asyncio.sleep(args.progress)
+            print(json.dumps(job.stats()))
+
+    reporter = asyncio.create_task(report())
+    try:
+        await job.run()
+    finally:
+        reporter.cancel()
+        print(json.dumps(job.stats()))
+        await backend.stop()
+        await clients.shutdown()
+
+if __name__ == "__main__":
+    # Run from backend/: python -m services.backfill entries.ndjson
+    parser = argparse.ArgumentParser(description="Summarize and index an NDJSON file of journal entries.")
+    parser.add_argument("input", help="NDJSON file, one entry per line")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <input>.checkpoint.json)")
+    parser.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=BACKFILL_RATE, help="summarize calls per second")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    parser.add_argument("--resummarize", action="store_true", help="summarize every entry, even ones with a summary")
+    parser.add_argument("--progress", type=float, default=5.0, help="seconds between progress lines")
+    asyncio.run(_main(parser.parse_args()))
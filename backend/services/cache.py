@@ -0,0 +1,86 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set
+
+class TTLCache:
+    """
+    Bounded in-memory LRU cache with a per-entry time-to-live.
+
+    Entries can be tagged with a group (e.g. a user_id) so that every entry in the group
+    can be invalidated at once when the underlying data changes.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._groups: Dict[Hashable, Set[Hashable]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        value, expires_at, _ = item
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, group: Optional[Hashable] = None) -> None:
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (value, time.monotonic() + self.ttl, group)
+        if group is not None:
+            self._groups.setdefault(group, set()).add(key)
+        while len(self._data) > self.maxsize:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        if key in self._data:
+            self._remove(key)
+
+    def invalidate_group(self, group: Hashable) -> int:
+        """
+        Drop every entry tagged with `group`. Returns the number of entries removed.
+        """
+        keys = self._groups.pop(group, set())
+        for key in keys:
+            self._data.pop(key, None)
+        self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._groups.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, group = self._data.pop(key)
+        if group is not None:
+            keys = self._groups.get(group)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._groups[group]
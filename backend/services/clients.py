@@ -0,0 +1,99 @@
+import os
+import asyncio
+import importlib
+import httpx
+from dotenv import load_dotenv
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from algoliasearch.search.client import SearchClient
+    from supabase import AsyncClient
+
+load_dotenv()
+
+ALGOLIA_APP_ID = os.getenv("ALGOLIA_APP_ID")
+ALGOLIA_API_KEY = os.getenv("ALGOLIA_API_KEY")
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Send all Algolia traffic to one host instead of the app's DSN cluster (e.g. the fakes in bench/load.py)
+ALGOLIA_HOST_URL = os.getenv("ALGOLIA_HOST_URL")
+# Import the HTTP transport and Algolia/Supabase SDKs in a worker thread at startup so the first request doesn't pay for it
+CLIENTS_PRELOAD = os.getenv("CLIENTS_PRELOAD", "true").lower() in ("1", "true", "yes")
+PRELOAD_MODULES = ("httpcore", "algoliasearch.search.client", "supabase")
+
+# Shared connection pool for every outbound HTTP call (Gemini, Algolia REST, AssemblyAI)
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30)
+HTTP_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+_http: Optional[httpx.AsyncClient] = None
+_algolia: Optional["SearchClient"] = None
+_supabase: Optional["AsyncClient"] = None
+_preload: Optional[asyncio.Task] = None
+
+def _import_sdks():
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+
+async def startup():
+    """
+    Called from the app lifespan. Clients are built lazily on first use, one of each per worker;
+    nothing here touches the network or fails on missing configuration, so the app starts
+    serving right away. The heavy SDK imports are warmed in the background.
+    """
+    global _preload
+    if CLIENTS_PRELOAD and _preload is None:
+        _preload = asyncio.create_task(asyncio.to_thread(_import_sdks))
+
+async def shutdown():
+    """
+    Close all shared clients and their connection pools.
+    """
+    global _http, _algolia, _supabase, _preload
+    if _preload is not None:
+        try:
+            await _preload
+        except Exception:
+            pass
+        _preload = None
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+    if _algolia is not None:
+        await _algolia.close()
+        _algolia = None
+    if _supabase is not None:
+        await _supabase.postgrest.aclose()
+        _supabase = None
+
+def get_http() -> httpx.AsyncClient:
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    return _http
+
+def get_algolia() -> "SearchClient":
+    global _algolia
+    if _algolia is None:
+        if not ALGOLIA_APP_ID or not ALGOLIA_API_KEY:
+            raise RuntimeError("Algolia credentials not set in environment variables.")
+        from algoliasearch.search.client import SearchClient
+        if ALGOLIA_HOST_URL:
+            from urllib.parse import urlsplit
+            from algoliasearch.search.config import SearchConfig
+            from algoliasearch.http.hosts import Host, HostsCollection
+            host = urlsplit(ALGOLIA_HOST_URL)
+            config = SearchConfig(ALGOLIA_APP_ID, ALGOLIA_API_KEY)
+            config.hosts = HostsCollection([Host(host.hostname, scheme=host.scheme, port=host.port)])
+            _algolia = SearchClient.create_with_config(config)
+        else:
+            _algolia = SearchClient(ALGOLIA_APP_ID, ALGOLIA_API_KEY)
+    return _algolia
+
+def get_supabase() -> "AsyncClient":
+    global _supabase
+    if _supabase is None:
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables.")
+        from supabase import AsyncClient
+        _supabase = AsyncClient(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase
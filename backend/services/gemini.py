@@ -1,23 +1,95 @@
 import os
-import requests
+import logging
+import re
+import json
+import asyncio
 from dotenv import load_dotenv
+from services.clients import get_http
+from services.cache import TTLCache
+from services.singleflight import SingleFlight
+from services.llm_cache import llm_cache
+from services.resilience import guard
+from services.search_backend import get_search_backend
+from services.algolia import algolia_reads
+from utils.json_stream import JSONFieldStream
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 ALGOLIA_APP_ID = os.getenv("ALGOLIA_APP_ID")
 ALGOLIA_API_KEY = os.getenv("ALGOLIA_API_KEY")
 ALGOLIA_SEARCH_KEY = os.getenv("ALGOLIA_SEARCH_KEY")
 ALGOLIA_INDEX_NAME = os.getenv("ALGOLIA_INDEX_NAME", "whispers_logs")
-ALGOLIA_MCP_URL = f"https://{ALGOLIA_APP_ID}-dsn.algolia.net/1/indexes/{ALGOLIA_INDEX_NAME}/query"
+ALGOLIA_SEARCH_URL = os.getenv("ALGOLIA_HOST_URL") or f"https://{ALGOLIA_APP_ID}-dsn.algolia.net"
+ALGOLIA_MCP_URL = f"{ALGOLIA_SEARCH_URL}/1/indexes/{ALGOLIA_INDEX_NAME}/query"
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+GEMINI_MODEL = "gemini-2.0-flash"
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+GEMINI_URL = f"{GEMINI_BASE_URL}/v1beta/models/{GEMINI_MODEL}:generateContent"
+GEMINI_STREAM_URL = f"{GEMINI_BASE_URL}/v1beta/models/{GEMINI_MODEL}:streamGenerateContent"
+# Bump these whenever the corresponding prompt changes so memoized results are not reused
+SUMMARIZE_PROMPT_VERSION = "1"
+EXTRACT_PROMPT_VERSION = "1"
+CHUNK_SUMMARY_PROMPT_VERSION = "1"
+# Inputs estimated above this many tokens are summarized map-reduce style, one chunk per map call
+SUMMARIZE_CHUNK_TOKENS = int(os.getenv("SUMMARIZE_CHUNK_TOKENS", "2000"))
+SUMMARIZE_MAP_CONCURRENCY = int(os.getenv("SUMMARIZE_MAP_CONCURRENCY", "4"))
 
-# --- Gemini summarization ---
-def summarize(text):
+async def _gemini_generate(payload, timeout, operation):
     """
-    Summarize text using Gemini API (model: gemini-2.0-flash). Generate a short title, a concise summary, and 3-5 tags. Return only a JSON object with keys: 'title', 'summary', 'tags'.
+    POST a generateContent request through the shared HTTP pool and return the decoded JSON.
+    `operation` labels the call's latency metric (summarize, extract, ...).
+    """
+    params = {"key": GEMINI_API_KEY}
+    async with guard("gemini", operation) as t:
+        resp = await get_http().post(GEMINI_URL, params=params, json=payload, timeout=timeout)
+        t.status = resp.status_code
+        resp.raise_for_status()
+    return resp.json()
+
+async def _gemini_stream(payload, timeout, operation):
+    """
+    POST a streamGenerateContent request (server-sent events) and yield text pieces as they arrive.
+    The latency metric records the time until response headers arrive.
+    """
+    params = {"key": GEMINI_API_KEY, "alt": "sse"}
+    http = get_http()
+    request = http.build_request("POST", GEMINI_STREAM_URL, params=params, json=payload, timeout=timeout)
+    async with guard("gemini", operation) as t:
+        resp = await http.send(request, stream=True)
+        t.status = resp.status_code
+        if resp.is_error:
+            await resp.aclose()
+            resp.raise_for_status()
+    try:
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = json.loads(line[5:])
+            for part in data.get("candidates", [{}])[0].get("content", {}).get("parts", []):
+                if part.get("text"):
+                    yield part["text"]
+    finally:
+        await resp.aclose()
+
+def _parse_summary(response_text):
+    """
+    Parse a complete summarize response into (title, summary, tags); raises if it isn't the expected JSON.
     """
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
-    headers = {"Content-Type": "application/json"}
+    # Strip code block markers if present
+    cleaned = re.sub(r"^```(?:json)?|```$", "", response_text.strip(), flags=re.MULTILINE).strip()
+    parsed = json.loads(cleaned)
+    # If parsed is a string, parse again
+    if isinstance(parsed, str):
+        parsed = json.loads(parsed)
+    return parsed.get("title", ""), parsed.get("summary", ""), parsed.get("tags", [])
+
+def _summarize_payload(text, condensed=False):
+    if condensed:
+        text = "(The entry was long; below are notes on its consecutive parts, in order.)\n" + text
     prompt = (
         "Given the following journal entry, generate: "
         "1. A short, relevant title (3-7 words, no punctuation). "
@@ -28,35 +100,172 @@ def summarize(text):
         "Example: {\"title\": \"Burnout at work\", \"summary\": \"Felt burnt out after a long week.\", \"tags\": [\"burnout\", \"work\"]} "
         "\n\nJournal Entry:\n" + text
     )
-    payload = {
+    return {
         "contents": [{"parts": [{"text": prompt}]}],
         "generationConfig": {"maxOutputTokens": 256}
     }
-    params = {"key": GEMINI_API_KEY}
-    resp = requests.post(url, headers=headers, params=params, json=payload, timeout=10)
-    resp.raise_for_status()
-    data = resp.json()
-    import json as pyjson
-    import re
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text
+    return len(text) // 4 + 1
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+def chunk_text(text, max_tokens=SUMMARIZE_CHUNK_TOKENS):
+    """
+    Split text on sentence boundaries into chunks of at most about `max_tokens` tokens.
+    A single sentence longer than the budget is split on whitespace, or by length as a last resort.
+    """
+    chunks = []
+    current = []
+    size = 0
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        tokens = estimate_tokens(sentence)
+        if tokens > max_tokens:
+            words = sentence.split()
+            step = max(1, len(words) * max_tokens // tokens)
+            pieces = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+            # Text without whitespace is cut at the character budget
+            width = max_tokens * 4
+            pieces = [piece[j:j + width] for piece in pieces for j in range(0, len(piece), width)]
+        else:
+            pieces = [sentence]
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if current and size + tokens > max_tokens:
+                chunks.append(" ".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+async def _summarize_chunk(chunk, index, total):
+    """
+    Map step: condense one part of a long entry to a few plain sentences (memoized like summarize).
+    """
+    cache_key = llm_cache.make_key("summarize_chunk", CHUNK_SUMMARY_PROMPT_VERSION, GEMINI_MODEL, chunk)
+    cached = await llm_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    prompt = (
+        f"This is part {index + 1} of {total} of a long journal entry. "
+        "Summarize it in 2-4 plain sentences, keeping the main events, people, places and feelings. "
+        "No advice, analysis, markdown or extra text.\n\nPart:\n" + chunk
+    )
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {"maxOutputTokens": 200}
+    }
+    data = await _gemini_generate(payload, timeout=20, operation="summarize_chunk")
+    notes = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "").strip()
+    if notes:
+        await llm_cache.set(cache_key, notes)
+    return notes
+
+async def _condense(text):
+    """
+    Return (input for the final summarize call, whether it was condensed). Long text is split into
+    chunks that are summarized concurrently, at most SUMMARIZE_MAP_CONCURRENCY at a time, so
+    latency stays roughly flat as the text grows.
+    """
+    if estimate_tokens(text) <= SUMMARIZE_CHUNK_TOKENS:
+        return text, False
+    chunks = chunk_text(text)
+    if len(chunks) < 2:
+        return text, False
+    semaphore = asyncio.Semaphore(SUMMARIZE_MAP_CONCURRENCY)
+
+    async def run(index, chunk):
+        async with semaphore:
+            return await _summarize_chunk(chunk, index, len(chunks))
+
+    notes = await asyncio.gather(*(run(i, chunk) for i, chunk in enumerate(chunks)))
+    return "\n\n".join(note for note in notes if note), True
+
+# Identical summarize and search calls in flight at the same time share one upstream round trip
+summarize_flights = SingleFlight("summarize")
+search_flights = SingleFlight("search")
+
+# --- Gemini summarization ---
+async def summarize(text):
+    """
+    Summarize text using Gemini API (model: gemini-2.0-flash). Generate a short title, a concise summary, and 3-5 tags. Return only a JSON object with keys: 'title', 'summary', 'tags'.
+    Results are memoized on disk by prompt version, model and text, so unchanged text never costs a second Gemini call.
+    Text longer than SUMMARIZE_CHUNK_TOKENS is condensed chunk by chunk first (map), then summarized once (reduce).
+    Concurrent calls for the same text share one Gemini call.
+    """
+    cache_key = llm_cache.make_key("summarize", SUMMARIZE_PROMPT_VERSION, GEMINI_MODEL, text)
+    cached = await llm_cache.get(cache_key)
+    if cached is not None:
+        title, summary, tags = cached
+        return title, summary, tags
+    return await summarize_flights.do(cache_key, lambda: _summarize_uncached(text, cache_key))
+
+async def _summarize_uncached(text, cache_key):
+    reduce_input, condensed = await _condense(text)
+    data = await _gemini_generate(_summarize_payload(reduce_input, condensed), timeout=10, operation="summarize")
+    response_text = ""
     try:
         response_text = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-        # Strip code block markers if present
-        cleaned = re.sub(r"^```(?:json)?|```$", "", response_text.strip(), flags=re.MULTILINE).strip()
-        parsed = pyjson.loads(cleaned)
-        # If parsed is a string, parse again
-        if isinstance(parsed, str):
-            parsed = pyjson.loads(parsed)
-        title = parsed.get("title", "")
-        summary = parsed.get("summary", "")
-        tags = parsed.get("tags", [])
+        title, summary, tags = _parse_summary(response_text)
     except Exception:
+        # Unparseable output is returned as-is but not memoized, so the next call retries Gemini
         title = ""
         summary = response_text
         tags = []
+    else:
+        await llm_cache.set(cache_key, [title, summary, tags])
     return title, summary, tags
 
+SUMMARY_FIELDS = ("title", "summary", "tags")
+
+async def summarize_stream(text):
+    """
+    Streaming variant of summarize. Yields (event, data) pairs:
+    ("delta", text piece) for raw model output, ("title" | "summary" | "tags", value) as soon as
+    each field of the JSON object is complete, then ("done", {"title", "summary", "tags", "cached"}).
+    Shares summarize's memo cache, so a cached entry is replayed immediately without calling Gemini.
+    """
+    cache_key = llm_cache.make_key("summarize", SUMMARIZE_PROMPT_VERSION, GEMINI_MODEL, text)
+    cached = await llm_cache.get(cache_key)
+    if cached is not None:
+        result = dict(zip(SUMMARY_FIELDS, cached))
+        for field in SUMMARY_FIELDS:
+            yield field, result[field]
+        yield "done", {**result, "cached": True}
+        return
+    reduce_input, condensed = await _condense(text)
+    parser = JSONFieldStream()
+    result = {}
+    async for piece in _gemini_stream(_summarize_payload(reduce_input, condensed), timeout=30, operation="summarize_stream"):
+        yield "delta", piece
+        for key, value in parser.feed(piece):
+            if key in SUMMARY_FIELDS and key not in result:
+                result[key] = value
+                yield key, value
+    if len(result) < len(SUMMARY_FIELDS):
+        # Fall back to parsing the whole response the way summarize does
+        try:
+            parsed = dict(zip(SUMMARY_FIELDS, _parse_summary(parser.text)))
+        except Exception:
+            # Unparseable output is returned as-is but not memoized, like summarize
+            yield "done", {"title": result.get("title", ""), "summary": result.get("summary", parser.text),
+                           "tags": result.get("tags", []), "cached": False}
+            return
+        for field in SUMMARY_FIELDS:
+            if field not in result:
+                result[field] = parsed[field]
+                yield field, result[field]
+    await llm_cache.set(cache_key, [result[field] for field in SUMMARY_FIELDS])
+    yield "done", {**result, "cached": False}
+
 # --- Algolia MCP search ---
-def search_journals(query):
+async def search_journals(query):
     """
     Search Algolia MCP index and return list of journal dicts.
     """
@@ -66,9 +275,15 @@ def search_journals(query):
         "Content-Type": "application/json"
     }
     payload = {"params": f"query={query}"}
-    resp = requests.post(ALGOLIA_MCP_URL, headers=headers, json=payload, timeout=10)
-    resp.raise_for_status()
-    hits = resp.json().get("hits", [])
+
+    async def query_index():
+        async with guard("algolia", "query") as t:
+            resp = await get_http().post(ALGOLIA_MCP_URL, headers=headers, json=payload, timeout=10)
+            t.status = resp.status_code
+            resp.raise_for_status()
+        return resp.json()
+
+    hits = (await algolia_reads.run(query_index)).get("hits", [])
     # format as required
     results = []
     for hit in hits:
@@ -81,13 +296,11 @@ def search_journals(query):
     return results
 
 # --- Gemini tool-calling for Algolia MCP ---
-def search_with_tool_call(query):
+async def search_with_tool_call(query):
     """
     Use Gemini-2.0-Flash tool-calling to search Algolia MCP via a tool schema.
     Returns Gemini's response (may include tool call results).
     """
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
-    headers = {"Content-Type": "application/json"}
     # Define the tool schema for Algolia search
     tool_schema = [
         {
@@ -116,24 +329,36 @@ User query: {query}
         "tools": tool_schema,
         "generationConfig": {"maxOutputTokens": 512}
     }
-    params = {"key": GEMINI_API_KEY}
-    resp = requests.post(url, headers=headers, params=params, json=payload, timeout=15)
-    resp.raise_for_status()
-    return resp.json()
+    return await _gemini_generate(payload, timeout=15, operation="tool_call")
 
-def mcp_search(query, user_id=None):
+# --- Per-user cache of mcp_search results ---
+# Keyed by (user_id, normalized query); a user's entries are dropped whenever one of their journals is written.
+search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+
+def normalize_query(query):
     """
-    Enhanced MCP tool-calling loop for Gemini:
-    1. Ask Gemini to extract only the most relevant, specific search terms from the user query (not generic words), and let Gemini decide the number of terms dynamically.
-    2. If it's a search, use those terms to query Algolia individually; otherwise, answer directly.
-    3. Always include a simple Gemini response in the output, even for Algolia queries.
-    4. Return a clean, deduplicated, and readable response.
+    Normalize a search query for cache lookups: lowercase, collapse whitespace, drop trailing punctuation.
+    """
+    return re.sub(r"\s+", " ", (query or "").lower()).strip().rstrip("?!.")
+
+def invalidate_user_searches(user_id):
+    """
+    Drop all cached search results for a user. Call after their journal entries change.
+    """
+    return search_cache.invalidate_group(user_id)
+
+async def extract_search_terms(query):
+    """
+    Ask Gemini whether the query is a search and which terms to look up.
+    Returns (is_search, search_terms, gemini_response, response_text). Parsed results are memoized on disk
+    by prompt version, model and normalized query, since common questions repeat across users.
     """
     import json as pyjson
-    import re
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
-    headers = {"Content-Type": "application/json"}
-    # Step 1: Ask Gemini to extract search terms and decide if it's a search
+    cache_key = llm_cache.make_key("extract", EXTRACT_PROMPT_VERSION, GEMINI_MODEL, normalize_query(query))
+    cached = await llm_cache.get(cache_key)
+    if cached is not None:
+        is_search, search_terms, gemini_response, response_text = cached
+        return is_search, search_terms, gemini_response, response_text
     extraction_prompt = (
         "You are an AI assistant for a journaling app. "
         "When the user asks a question about their past journals, "
@@ -148,10 +373,8 @@ def mcp_search(query, user_id=None):
         "contents": [{"parts": [{"text": extraction_prompt}]}],
         "generationConfig": {"maxOutputTokens": 512}
     }
-    params = {"key": GEMINI_API_KEY}
-    resp = requests.post(url, headers=headers, params=params, json=extraction_payload, timeout=15)
-    resp.raise_for_status()
-    data = resp.json()
+    data = await _gemini_generate(extraction_payload, timeout=15, operation="extract")
+    response_text = ""
     try:
         response_text = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
         # Strip code block markers if present
@@ -164,63 +387,60 @@ def mcp_search(query, user_id=None):
         is_search = False
         search_terms = []
         gemini_response = ""
-    # Debug print
-    print("User query:", query)
-    print("Gemini full response_text:", response_text)
-    print("Gemini search_terms:", search_terms)
-    print("is_search:", is_search)
-    # Step 2: If it's a search, use search_terms to query Algolia individually
+    else:
+        await llm_cache.set(cache_key, [is_search, search_terms, gemini_response, response_text])
+    return is_search, search_terms, gemini_response, response_text
+
+# Dropped from queries when searching on the user's own words
+_STOPWORDS = frozenset(
+    "a about all am an and any are as at be been did do does for from had has have how i in is it me my of on or "
+    "so that the their them then there this to was we were what when where which who why will with you your".split()
+)
+
+def keyword_terms(query, max_terms=5):
+    """
+    Search terms taken straight from the query, for when Gemini can't extract them:
+    distinct non-stopwords in order, at most `max_terms`.
+    """
+    terms = []
+    for word in re.findall(r"[\w']+", normalize_query(query)):
+        if len(word) > 1 and word not in _STOPWORDS and word not in terms:
+            terms.append(word)
+    return terms[:max_terms]
+
+async def mcp_search(query, user_id=None, tags=None, date_from=None, date_to=None):
+    """
+    Enhanced MCP tool-calling loop for Gemini:
+    1. Ask Gemini to extract only the most relevant, specific search terms from the user query (not generic words), and let Gemini decide the number of terms dynamically.
+    2. If it's a search, look all terms up in one call to the configured search backend (Algolia multi-query
+       or the local BM25 index), optionally filtered by tags and a date range; otherwise, answer directly.
+    3. Always include a simple Gemini response in the output, even for Algolia queries.
+    4. Return a clean, deduplicated, and readable response.
+    If Gemini is failing, slow or its circuit is open, the query's own keywords are searched instead and
+    the result is marked `degraded`.
+    """
+    # Step 1: Ask Gemini to extract search terms and decide if it's a search
+    degraded = False
+    try:
+        is_search, search_terms, gemini_response, response_text = await extract_search_terms(query)
+    except Exception as e:
+        logger.warning("Search term extraction failed, falling back to keyword search: %s", e)
+        search_terms = keyword_terms(query)
+        is_search, gemini_response, response_text, degraded = bool(search_terms), "", "", True
+    # Step 2: If it's a search, look up all search_terms in the search backend in one round trip
     algolia_results = []
-    seen_ids = set()
     if is_search and search_terms:
-        headers_algolia = {
-            "X-Algolia-API-Key": ALGOLIA_SEARCH_KEY or ALGOLIA_API_KEY,
-            "X-Algolia-Application-Id": ALGOLIA_APP_ID,
-            "Content-Type": "application/json"
-        }
-        for term in search_terms:
-            print(f"Searching Algolia for term: '{term}' ...", end=' ')
-            # Add user_id filter if provided
-            filter_str = f"user_id:{user_id}" if user_id else None
-            request_body = {
-                "indexName": ALGOLIA_INDEX_NAME,
-                "query": term,
-                "hitsPerPage": 10,
-                "filters": filter_str if filter_str else ""
-            }
-            payload_algolia = {
-                "requests": [request_body]
-            }
-            resp_algolia = requests.post(
-                f"https://{ALGOLIA_APP_ID}-dsn.algolia.net/1/indexes/*/queries",
-                headers=headers_algolia,
-                json=payload_algolia,
-                timeout=10
-            )
-            resp_algolia.raise_for_status()
-            results = resp_algolia.json().get("results", [])
-            found = 0
-            for result in results:
-                for hit in result.get("hits", []):
-                    found += 1
-                    obj_id = hit.get("objectID")
-                    if obj_id and obj_id not in seen_ids:
-                        # Only keep relevant fields for the API response
-                        clean_hit = {
-                            "objectID": obj_id,
-                            "title": hit.get("title", ""),
-                            "summary": hit.get("summary", ""),
-                            "tags": hit.get("tags", []),
-                            "timestamp": hit.get("timestamp", "")
-                        }
-                        algolia_results.append(clean_hit)
-                        seen_ids.add(obj_id)
-            print(f"found {found} results.")
-    print("Final Algolia results:", algolia_results)
+        algolia_results = await get_search_backend().search(
+            search_terms, user_id=user_id, tags=tags, date_from=date_from, date_to=date_to
+        )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("mcp_search", extra={"query": query, "response_text": response_text, "search_terms": search_terms,
+                                          "is_search": is_search, "results": len(algolia_results)})
     # Step 3: Return both Gemini's response and Algolia results (if any), formatted
     return {
         "gemini_response": gemini_response,
         "results": algolia_results,
         "search_terms": search_terms,
-        "is_search": is_search
+        "is_search": is_search,
+        "degraded": degraded
     } 
\ No newline at end of file
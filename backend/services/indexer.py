@@ -0,0 +1,156 @@
+import os
+import logging
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from services.search_backend import get_search_backend
+from services.gemini import invalidate_user_searches
+from services.outbox import outbox, SEARCH
+
+logger = logging.getLogger(__name__)
+
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "100"))
+INDEX_LINGER_SECONDS = float(os.getenv("INDEX_LINGER_SECONDS", "0.25"))
+INDEX_QUEUE_SIZE = int(os.getenv("INDEX_QUEUE_SIZE", "10000"))
+INDEX_MAX_ATTEMPTS = int(os.getenv("INDEX_MAX_ATTEMPTS", "5"))
+# How many entry statuses to remember for /index/status
+INDEX_STATUS_SIZE = int(os.getenv("INDEX_STATUS_SIZE", "50000"))
+
+PENDING = "pending"
+INDEXED = "indexed"
+FAILED = "failed"
+
+class IndexQueue:
+    """
+    Write-behind queue for search indexing.
+
+    /index hands entries to `enqueue` and returns immediately. A background worker drains the
+    queue, coalesces repeated writes to the same objectID, and writes them to the configured
+    search backend in batches (for Algolia, `save_objects` via `index_journals`). Per-entry status is kept so clients can poll
+    whether an entry is searchable yet.
+    """
+
+    def __init__(self, batch_size: int = INDEX_BATCH_SIZE, linger: float = INDEX_LINGER_SECONDS,
+                 maxsize: int = INDEX_QUEUE_SIZE, max_attempts: int = INDEX_MAX_ATTEMPTS,
+                 status_size: int = INDEX_STATUS_SIZE):
+        self.batch_size = batch_size
+        self.linger = linger
+        self.maxsize = maxsize
+        self.max_attempts = max_attempts
+        self.status_size = status_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._status: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._version = 0
+        self.batches = 0
+        self.indexed = 0
+        self.failed = 0
+
+    async def start(self) -> None:
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Flush everything still queued, then stop the worker.
+        """
+        if self._worker is None:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def enqueue(self, entry: Dict[str, Any]) -> None:
+        """
+        Queue an entry (must contain 'objectID') for indexing. Waits only if the queue is full.
+        """
+        if self._queue is None:
+            raise RuntimeError("Index queue not started; app startup has not run.")
+        self._version += 1
+        self._set_status(entry["objectID"], PENDING, version=self._version)
+        await self._queue.put((self._version, entry))
+
+    def status(self, entry_id: str) -> Optional[Dict[str, Any]]:
+        return self._status.get(entry_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "indexed": self.indexed,
+            "failed": self.failed
+        }
+
+    def _set_status(self, entry_id: str, state: str, error: Optional[str] = None, version: int = 0) -> None:
+        record = {"status": state, "updated_at": time.time(), "version": version}
+        if error:
+            record["error"] = error
+        self._status.pop(entry_id, None)
+        self._status[entry_id] = record
+        while len(self._status) > self.status_size:
+            self._status.popitem(last=False)
+
+    async def _next_batch(self) -> List[tuple]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                # Later writes to the same entry win; only the latest version is sent
+                latest = {}
+                for version, entry in batch:
+                    latest.pop(entry["objectID"], None)
+                    latest[entry["objectID"]] = (version, entry)
+                await self._flush(list(latest.values()))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, items: List[tuple]) -> None:
+        entries = [entry for _, entry in items]
+        delay = 0.5
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await get_search_backend().index(entries)
+                break
+            except Exception as e:
+                logger.warning("Index batch of %d failed (attempt %d/%d): %s", len(entries), attempt, self.max_attempts, e)
+                if attempt == self.max_attempts:
+                    self.failed += len(entries)
+                    for version, entry in items:
+                        self._mark(entry["objectID"], version, FAILED, str(e))
+                    return
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 10.0)
+        self.batches += 1
+        self.indexed += len(entries)
+        for version, entry in items:
+            self._mark(entry["objectID"], version, INDEXED)
+            outbox.ack(SEARCH, entry["objectID"], entry.get("updated"))
+            if entry.get("user_id"):
+                invalidate_user_searches(entry["user_id"])
+
+    def _mark(self, entry_id: str, version: int, state: str, error: Optional[str] = None) -> None:
+        # A newer write queued in the meantime keeps the entry pending
+        current = self._status.get(entry_id)
+        if current is None or current["version"] == version:
+            self._set_status(entry_id, state, error, version=version)
+
+index_queue = IndexQueue()
@@ -0,0 +1,271 @@
+import os
+import json
+import sqlite3
+import asyncio
+import logging
+import argparse
+import threading
+from datetime import date, timedelta
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from services import clients
+from services.supabase import iter_pages
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+INSIGHTS_PATH = os.getenv(
+    "INSIGHTS_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "insights.sqlite3")
+)
+# Tags counted per entry; co-occurrence pairs grow with the square of this
+INSIGHTS_MAX_TAGS = int(os.getenv("INSIGHTS_MAX_TAGS", "16"))
+# Supabase rows fetched per page by a rebuild
+INSIGHTS_PAGE_SIZE = 500
+
+DAY = "day"
+WEEK = "week"
+PERIODS = (DAY, WEEK)
+
+ENTRY_COLUMNS = "entry_id,user_id,date,timestamp,tags,updated"
+
+def normalize_tags(tags: Any) -> List[str]:
+    """
+    Lowercased, de-duplicated, sorted tags of an entry, at most INSIGHTS_MAX_TAGS of them.
+    """
+    if not isinstance(tags, (list, tuple)):
+        return []
+    unique = {str(tag).strip().lower() for tag in tags}
+    unique.discard("")
+    return sorted(unique)[:INSIGHTS_MAX_TAGS]
+
+def entry_day(entry: Dict[str, Any]) -> str:
+    """
+    The entry's day as YYYY-MM-DD, from `date` or else the start of `timestamp`; raises ValueError if neither parses.
+    """
+    value = entry.get("date") or str(entry.get("timestamp") or "")[:10]
+    return date.fromisoformat(str(value)[:10]).isoformat()
+
+def week_start(day: str) -> str:
+    """
+    The Monday of the ISO week containing `day`, which is how weeks are keyed.
+    """
+    d = date.fromisoformat(day)
+    return (d - timedelta(days=d.weekday())).isoformat()
+
+class InsightsStore:
+    """
+    Per-user tag analytics, maintained incrementally as entries are written.
+
+    For every user and day (and ISO week) the store keeps the number of entries, how often each
+    tag was used and how often each pair of tags appeared on the same entry, as counter rows in
+    SQLite keyed by (user_id, period, bucket). Reading a date range is a range scan over those
+    keys, so it costs the number of days asked for, never the number of entries.
+
+    The tags and day last counted for every entry are kept as well, so an edit moves the entry's
+    contribution instead of counting it twice, and applying the same version again is a no-op.
+    Writes for an older `updated` version than the one already counted are ignored.
+    """
+
+    def __init__(self, path: str = INSIGHTS_PATH):
+        self.path = path
+        self.applied = 0
+        self.skipped = 0
+        self.errors = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS insight_entries ("
+                "entry_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, day TEXT NOT NULL, tags TEXT NOT NULL, updated TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS insight_buckets ("
+                "user_id TEXT NOT NULL, period TEXT NOT NULL, bucket TEXT NOT NULL, entries INTEGER NOT NULL, "
+                "PRIMARY KEY (user_id, period, bucket)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS insight_tags ("
+                "user_id TEXT NOT NULL, period TEXT NOT NULL, bucket TEXT NOT NULL, tag TEXT NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (user_id, period, bucket, tag)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS insight_pairs ("
+                "user_id TEXT NOT NULL, period TEXT NOT NULL, bucket TEXT NOT NULL, tag_a TEXT NOT NULL, tag_b TEXT NOT NULL, "
+                "count INTEGER NOT NULL, PRIMARY KEY (user_id, period, bucket, tag_a, tag_b)) WITHOUT ROWID"
+            )
+            self._conn = conn
+        return self._conn
+
+    # --- writes ---
+    def apply_sync(self, entries: Iterable[Dict[str, Any]]) -> None:
+        with self._lock:
+            conn = self._connect()
+            try:
+                for entry in entries:
+                    if self._apply_entry(conn, entry):
+                        self.applied += 1
+                    else:
+                        self.skipped += 1
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _apply_entry(self, conn: sqlite3.Connection, entry: Dict[str, Any]) -> bool:
+        entry_id = entry.get("objectID") or entry.get("entry_id")
+        if not entry_id or not entry.get("user_id"):
+            return False
+        try:
+            day = entry_day(entry)
+        except ValueError:
+            return False
+        new = (entry["user_id"], day, normalize_tags(entry.get("tags")))
+        updated = entry.get("updated")
+        row = conn.execute("SELECT user_id, day, tags, updated FROM insight_entries WHERE entry_id = ?",
+                           (entry_id,)).fetchone()
+        if row is not None:
+            if updated and row[3] and row[3] > updated:
+                return False
+            old = (row[0], row[1], json.loads(row[2]))
+            if old != new:
+                self._count(conn, *old, -1)
+                self._count(conn, *new, 1)
+        else:
+            self._count(conn, *new, 1)
+        conn.execute(
+            "INSERT OR REPLACE INTO insight_entries (entry_id, user_id, day, tags, updated) VALUES (?, ?, ?, ?, ?)",
+            (entry_id, new[0], new[1], json.dumps(new[2]), updated)
+        )
+        return True
+
+    def _count(self, conn: sqlite3.Connection, user_id: str, day: str, tags: List[str], delta: int) -> None:
+        pairs = list(combinations(tags, 2))
+        for period, bucket in ((DAY, day), (WEEK, week_start(day))):
+            key = (user_id, period, bucket)
+            conn.execute(
+                "INSERT INTO insight_buckets (user_id, period, bucket, entries) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (user_id, period, bucket) DO UPDATE SET entries = entries + excluded.entries",
+                (*key, delta)
+            )
+            conn.executemany(
+                "INSERT INTO insight_tags (user_id, period, bucket, tag, count) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, period, bucket, tag) DO UPDATE SET count = count + excluded.count",
+                [(*key, tag, delta) for tag in tags]
+            )
+            conn.executemany(
+                "INSERT INTO insight_pairs (user_id, period, bucket, tag_a, tag_b, count) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, period, bucket, tag_a, tag_b) DO UPDATE SET count = count + excluded.count",
+                [(*key, a, b, delta) for a, b in pairs]
+            )
+            if delta < 0:
+                # Drop counters that reached zero so the tables only hold what is in use
+                for table, column in (("insight_buckets", "entries"), ("insight_tags", "count"), ("insight_pairs", "count")):
+                    conn.execute(
+                        f"DELETE FROM {table} WHERE user_id = ? AND period = ? AND bucket = ? AND {column} <= 0", key
+                    )
+
+    async def apply(self, entries: List[Dict[str, Any]]) -> None:
+        """
+        Count written or edited entries. Failures are logged rather than raised, so analytics never
+        fails a journal write; `rebuild` recounts anything that was missed.
+        """
+        if not entries:
+            return
+        try:
+            await asyncio.to_thread(self.apply_sync, entries)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Insights update failed for %d entries: %s", len(entries), e)
+
+    # --- reads ---
+    def query_sync(self, user_id: str, period: str, start: str, end: str, top: int) -> Dict[str, Any]:
+        """
+        Counters for buckets from `start` to `end` (inclusive, bucket keys). Each bucket lists its
+        `top` tags; totals and pairs cover the whole range.
+        """
+        key = (user_id, period, start, end)
+        where = "WHERE user_id = ? AND period = ? AND bucket BETWEEN ? AND ?"
+        with self._lock:
+            conn = self._connect()
+            bucket_rows = conn.execute(f"SELECT bucket, entries FROM insight_buckets {where} ORDER BY bucket", key).fetchall()
+            tag_rows = conn.execute(
+                f"SELECT bucket, tag, count FROM insight_tags {where} ORDER BY bucket, count DESC, tag", key
+            ).fetchall()
+            pair_rows = conn.execute(
+                f"SELECT tag_a, tag_b, SUM(count) AS total FROM insight_pairs {where} "
+                "GROUP BY tag_a, tag_b ORDER BY total DESC, tag_a, tag_b LIMIT ?", (*key, top)
+            ).fetchall()
+        buckets: Dict[str, Dict[str, Any]] = {bucket: {"bucket": bucket, "entries": entries, "tags": {}}
+                                              for bucket, entries in bucket_rows}
+        totals: Dict[str, int] = {}
+        for bucket, tag, count in tag_rows:
+            tags = buckets.setdefault(bucket, {"bucket": bucket, "entries": 0, "tags": {}})["tags"]
+            if len(tags) < top:
+                tags[tag] = count
+            totals[tag] = totals.get(tag, 0) + count
+        top_tags = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:top]
+        return {
+            "buckets": list(buckets.values()),
+            "entries": sum(bucket["entries"] for bucket in buckets.values()),
+            "tags": [{"tag": tag, "count": count} for tag, count in top_tags],
+            "pairs": [{"tags": [a, b], "count": count} for a, b, count in pair_rows]
+        }
+
+    async def query(self, user_id: str, period: str, start: str, end: str, top: int) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.query_sync, user_id, period, start, end, top)
+
+    # --- maintenance ---
+    async def rebuild(self, user_id: Optional[str] = None, page_size: int = INSIGHTS_PAGE_SIZE) -> int:
+        """
+        Count every entry in Supabase (or one user's), e.g. history written before this store existed.
+        Already-counted versions are left as they are. Returns the number of rows read.
+        """
+        read = 0
+        async for rows in iter_pages("journal_entries", "entry_id", ENTRY_COLUMNS, page_size, user_id=user_id):
+            await asyncio.to_thread(self.apply_sync, rows)
+            read += len(rows)
+        return read
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "applied": self.applied, "skipped": self.skipped, "errors": self.errors}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+insights = InsightsStore()
+
+def bucket_range(period: str, start: date, end: date) -> Tuple[str, str]:
+    """
+    Bucket keys covering the dates from `start` to `end`.
+    """
+    if period == WEEK:
+        return week_start(start.isoformat()), week_start(end.isoformat())
+    return start.isoformat(), end.isoformat()
+
+async def _main(args) -> None:
+    await clients.startup()
+    try:
+        read = await insights.rebuild(user_id=args.user_id, page_size=args.page_size)
+        print(json.dumps({"read": read, **insights.stats()}))
+    finally:
+        insights.close()
+        await clients.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recount per-user tag insights from Supabase journal_entries.")
+    parser.add_argument("--user-id", help="only recount this user's entries")
+    parser.add_argument("--page-size", type=int, default=INSIGHTS_PAGE_SIZE)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from typing import Any, Optional
+
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "llm_cache.sqlite3")
+)
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+class LLMCache:
+    """
+    Persistent, content-addressed cache for LLM results backed by SQLite.
+
+    Keys are SHA-256 digests of (kind, prompt version, model, input text), so bumping a prompt
+    version or switching models never serves stale output. When the stored values exceed
+    `max_bytes`, the least recently used rows are evicted.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+
+    @staticmethod
+    def make_key(kind: str, prompt_version: str, model: str, text: str) -> str:
+        h = hashlib.sha256()
+        for part in (kind, prompt_version, model, text):
+            h.update(part.encode("utf-8"))
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+            self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def get_sync(self, key: str) -> Optional[Any]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set_sync(self, key: str, value: Any) -> None:
+        encoded = json.dumps(value)
+        size = len(encoded.encode("utf-8"))
+        with self._lock:
+            conn = self._connect()
+            old = conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, encoded, size, time.time())
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        # Evict down to 90% of the budget so we don't evict on every insert near the limit
+        target = int(self.max_bytes * 0.9)
+        rows = conn.execute("SELECT key, size FROM llm_cache ORDER BY last_used").fetchall()
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._total_bytes -= size
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self.get_sync, key)
+
+    async def set(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self.set_sync, key, value)
+
+    def stats(self) -> dict:
+        return {"path": self.path, "bytes": self._total_bytes, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+llm_cache = LLMCache()
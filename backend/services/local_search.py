@@ -0,0 +1,282 @@
+import os
+import re
+import math
+import heapq
+import pickle
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+LOCAL_SEARCH_PATH = os.getenv(
+    "LOCAL_SEARCH_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "local_search.pickle")
+)
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Term frequencies are weighted by the field they occur in
+FIELD_WEIGHTS = {"title": 3, "tags": 2, "summary": 2, "text": 1}
+# Fields kept per document so hits can be rendered without another lookup
+STORED_FIELDS = ("title", "summary", "tags", "timestamp", "date")
+SNAPSHOT_VERSION = 2
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by did do for from had has have i im in is it its me my of on or so "
+    "that the their them then there they this to was we were what when where which who will with you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase, split on non-alphanumerics and drop stopwords.
+    """
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+def day_number(value: Optional[str]) -> int:
+    """
+    Turn an ISO date or timestamp ('2025-07-24' / '2025-07-24T10:22:00Z') into 20250724. Returns 0 if unparseable.
+    """
+    if not value or len(value) < 10:
+        return 0
+    try:
+        return int(value[0:4]) * 10000 + int(value[5:7]) * 100 + int(value[8:10])
+    except ValueError:
+        return 0
+
+def _field_text(value: Any) -> str:
+    if isinstance(value, list):
+        return " ".join(str(v) for v in value)
+    return str(value or "")
+
+class _UserIndex:
+    """
+    Inverted index over one user's entries.
+
+    Documents live in slots; posting lists are parallel `array('I')` slot ids and `array('H')`
+    weighted term frequencies. Updates and deletes tombstone the old slot and the index is
+    compacted once tombstones make up a quarter of it. Document frequencies are counted over
+    live documents only, so tombstones don't skew IDF.
+    """
+
+    def __init__(self):
+        self.doc_ids: List[Optional[str]] = []
+        self.slots: Dict[str, int] = {}
+        self.doc_len = array("I")
+        self.day = array("I")
+        self.stored: List[Optional[Dict[str, Any]]] = []
+        # Distinct terms of each slot, so a removal can take them out of `df`
+        self.doc_terms: List[Optional[tuple]] = []
+        self.df: Dict[str, int] = {}
+        self.postings: Dict[str, tuple] = {}
+        self.tag_postings: Dict[str, array] = {}
+        self.live = 0
+        self.total_len = 0
+
+    def add(self, entry_id: str, entry: Dict[str, Any]) -> None:
+        if entry_id in self.slots:
+            self.remove(entry_id)
+        counts = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(_field_text(entry.get(field))):
+                counts[token] += weight
+        length = sum(counts.values())
+        slot = len(self.doc_ids)
+        self.doc_ids.append(entry_id)
+        self.slots[entry_id] = slot
+        self.doc_len.append(length)
+        self.day.append(day_number(entry.get("date") or entry.get("timestamp")))
+        self.stored.append({field: entry.get(field, [] if field == "tags" else "") for field in STORED_FIELDS})
+        self.doc_terms.append(tuple(counts))
+        for term, tf in counts.items():
+            self.df[term] = self.df.get(term, 0) + 1
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array("I"), array("H"))
+            posting[0].append(slot)
+            posting[1].append(min(tf, 0xFFFF))
+        for tag in {str(t).lower() for t in entry.get("tags") or []}:
+            self.tag_postings.setdefault(tag, array("I")).append(slot)
+        self.live += 1
+        self.total_len += length
+
+    def remove(self, entry_id: str) -> bool:
+        slot = self.slots.pop(entry_id, None)
+        if slot is None:
+            return False
+        self.doc_ids[slot] = None
+        self.stored[slot] = None
+        for term in self.doc_terms[slot]:
+            if self.df[term] <= 1:
+                del self.df[term]
+            else:
+                self.df[term] -= 1
+        self.doc_terms[slot] = None
+        self.live -= 1
+        self.total_len -= self.doc_len[slot]
+        dead = len(self.doc_ids) - self.live
+        if dead > 64 and dead * 4 > len(self.doc_ids):
+            self.compact()
+        return True
+
+    def compact(self) -> None:
+        """
+        Drop tombstoned slots and renumber the remaining documents.
+        """
+        remap = {}
+        doc_ids, doc_len, day, stored, doc_terms = [], array("I"), array("I"), [], []
+        for old, entry_id in enumerate(self.doc_ids):
+            if entry_id is None:
+                continue
+            remap[old] = len(doc_ids)
+            doc_ids.append(entry_id)
+            doc_len.append(self.doc_len[old])
+            day.append(self.day[old])
+            stored.append(self.stored[old])
+            doc_terms.append(self.doc_terms[old])
+        postings = {}
+        for term, (slots, tfs) in self.postings.items():
+            new_slots, new_tfs = array("I"), array("H")
+            for slot, tf in zip(slots, tfs):
+                if slot in remap:
+                    new_slots.append(remap[slot])
+                    new_tfs.append(tf)
+            if new_slots:
+                postings[term] = (new_slots, new_tfs)
+        tag_postings = {}
+        for tag, slots in self.tag_postings.items():
+            new_slots = array("I", (remap[s] for s in slots if s in remap))
+            if new_slots:
+                tag_postings[tag] = new_slots
+        self.doc_ids, self.doc_len, self.day, self.stored, self.doc_terms = doc_ids, doc_len, day, stored, doc_terms
+        self.slots = {entry_id: slot for slot, entry_id in enumerate(doc_ids)}
+        self.postings, self.tag_postings = postings, tag_postings
+
+    def _filtered(self, tags: Optional[List[str]], day_from: int, day_to: int) -> Optional[set]:
+        """
+        Slots passing the tag and date filters, or None when no filter is set.
+        """
+        allowed = None
+        for tag in tags or []:
+            slots = set(self.tag_postings.get(str(tag).lower(), ()))
+            allowed = slots if allowed is None else allowed & slots
+        if day_from or day_to:
+            upper = day_to or 99999999
+            candidates = allowed if allowed is not None else range(len(self.doc_ids))
+            allowed = {s for s in candidates if self.doc_ids[s] is not None and day_from <= self.day[s] <= upper}
+        return allowed
+
+    def search(self, query: str, tags: Optional[List[str]] = None, day_from: int = 0, day_to: int = 0,
+               limit: int = 10) -> List[Dict[str, Any]]:
+        if self.live == 0:
+            return []
+        allowed = self._filtered(tags, day_from, day_to)
+        terms = set(tokenize(query))
+        if not terms:
+            # Filter-only query: newest entries first
+            if allowed is None:
+                return []
+            ranked = heapq.nlargest(limit, (s for s in allowed if self.doc_ids[s] is not None), key=lambda s: (self.day[s], s))
+            return [self._hit(s, 0.0) for s in ranked]
+        n = self.live
+        avgdl = self.total_len / n if n else 1.0
+        scores: Dict[int, float] = {}
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            slots, tfs = posting
+            df = self.df.get(term, 0)
+            if not df:
+                continue
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            for slot, tf in zip(slots, tfs):
+                if self.doc_ids[slot] is None or (allowed is not None and slot not in allowed):
+                    continue
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_len[slot] / avgdl)
+                scores[slot] = scores.get(slot, 0.0) + idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+        # Ties go to the older slot so rankings are stable
+        top = heapq.nlargest(limit, scores.items(), key=lambda kv: (kv[1], -kv[0]))
+        return [self._hit(slot, score) for slot, score in top]
+
+    def _hit(self, slot: int, score: float) -> Dict[str, Any]:
+        hit = {"objectID": self.doc_ids[slot]}
+        hit.update(self.stored[slot])
+        hit["score"] = round(score, 4)
+        return hit
+
+class LocalSearchIndex:
+    """
+    In-process BM25 search engine with one inverted index per user, snapshotted to disk with pickle.
+    """
+
+    def __init__(self, path: str = LOCAL_SEARCH_PATH):
+        self.path = path
+        self.users: Dict[str, _UserIndex] = {}
+        self.dirty = False
+
+    def add(self, entries: Iterable[Dict[str, Any]]) -> int:
+        count = 0
+        for entry in entries:
+            entry_id = entry.get("objectID") or entry.get("entry_id")
+            user_id = entry.get("user_id")
+            if not entry_id or not user_id:
+                continue
+            self.users.setdefault(user_id, _UserIndex()).add(entry_id, entry)
+            count += 1
+        self.dirty = self.dirty or count > 0
+        return count
+
+    def delete(self, user_id: str, entry_ids: Iterable[str]) -> int:
+        index = self.users.get(user_id)
+        if index is None:
+            return 0
+        removed = sum(1 for entry_id in entry_ids if index.remove(entry_id))
+        self.dirty = self.dirty or removed > 0
+        return removed
+
+    def search(self, user_id: str, query: str, tags: Optional[List[str]] = None, date_from: Optional[str] = None,
+               date_to: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        index = self.users.get(user_id)
+        if index is None:
+            return []
+        return index.search(query, tags=tags, day_from=day_number(date_from), day_to=day_number(date_to), limit=limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self.users),
+            "documents": sum(u.live for u in self.users.values()),
+            "terms": sum(len(u.postings) for u in self.users.values())
+        }
+
+    def dumps(self) -> bytes:
+        """
+        Serialize the index. Posting lists pickle as raw array buffers, so snapshots stay compact.
+        """
+        self.dirty = False
+        return pickle.dumps({"version": SNAPSHOT_VERSION, "users": self.users}, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def save(self, data: Optional[bytes] = None) -> None:
+        """
+        Write a snapshot atomically (temp file + rename). Pass `data` from `dumps()` to write
+        a snapshot taken earlier, e.g. from a worker thread.
+        """
+        if data is None:
+            data = self.dumps()
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "rb") as f:
+            snapshot = pickle.load(f)
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            return False
+        self.users = snapshot["users"]
+        self.dirty = False
+        return True
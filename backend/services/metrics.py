@@ -0,0 +1,191 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Latency buckets in seconds, 5 ms .. 30 s
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """
+    Prometheus-style histogram. Each label set keeps per-bucket counts (made cumulative when
+    rendered), a sum and a count, so `observe` is a binary search plus three additions.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            # [bucket counts..., +Inf count, sum]
+            series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class Gauge:
+    """
+    Value read from a callback at scrape time, e.g. a queue depth or cache size. Existing
+    monotonic counters (cache hits, ...) are exposed the same way with kind="counter".
+    """
+
+    def __init__(self, name: str, help: str, read: Callable[[], Optional[float]], kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception:
+            value = None
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", f"{self.name} {float(value)}"]
+
+_registry: List = []
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+def gauge(name: str, help: str, read: Callable[[], Optional[float]], kind: str = "gauge") -> Gauge:
+    return _register(Gauge(name, help, read, kind))
+
+def counter(name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    return _register(Counter(name, help, labelnames))
+
+def render_metrics() -> str:
+    """
+    All registered metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+HTTP_REQUEST_SECONDS = _register(Histogram(
+    "whispers_http_request_duration_seconds", "Time to response headers per route.", ("method", "route", "status")
+))
+UPSTREAM_SECONDS = _register(Histogram(
+    "whispers_upstream_request_duration_seconds", "Latency of calls to upstream services.", ("upstream", "operation", "status")
+))
+
+class track:
+    """
+    Time one upstream call into UPSTREAM_SECONDS. Works as `with` or `async with`.
+    The status label is the HTTP status if one was set (`t.status = resp.status_code`),
+    "ok" on success and the exception class name on failure.
+
+        async with track("gemini", "summarize") as t:
+            resp = await client.post(...)
+            t.status = resp.status_code
+    """
+
+    __slots__ = ("upstream", "operation", "status", "_start")
+
+    def __init__(self, upstream: str, operation: str):
+        self.upstream = upstream
+        self.operation = operation
+        self.status = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        status = self.status
+        if exc_type is not None:
+            status = getattr(getattr(exc, "response", None), "status_code", None) or exc_type.__name__
+        UPSTREAM_SECONDS.observe(time.perf_counter() - self._start, upstream=self.upstream,
+                                 operation=self.operation, status=status or "ok")
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+class TimingMiddleware:
+    """
+    ASGI middleware that times every HTTP request to its response headers. The duration goes to
+    HTTP_REQUEST_SECONDS under the matched route template (not the raw path, to keep label sets
+    bounded) and back to the client in a Server-Timing header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        observed = False
+
+        def observe(status):
+            nonlocal observed
+            observed = True
+            route = scope.get("route")
+            elapsed = time.perf_counter() - start
+            HTTP_REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=getattr(route, "path", "unmatched"),
+                                         status=status)
+            return elapsed
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start" and not observed:
+                elapsed = observe(message["status"])
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", f"app;dur={elapsed * 1000:.1f}".encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            if not observed:
+                observe(500)
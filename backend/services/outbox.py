@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from services.clients import get_supabase
+from services.resilience import guard
+from services.insights import insights
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PATH = os.getenv(
+    "OUTBOX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "outbox.ndjson")
+)
+# fsync every group of intent records before /index answers
+OUTBOX_FSYNC = os.getenv("OUTBOX_FSYNC", "true").lower() in ("1", "true", "yes")
+# Writes not acknowledged by both stores after this long are re-driven
+OUTBOX_RETRY_SECONDS = float(os.getenv("OUTBOX_RETRY_SECONDS", "30"))
+# Rewrite the log with only the pending writes once it has this many more lines than that
+OUTBOX_COMPACT_LINES = int(os.getenv("OUTBOX_COMPACT_LINES", "10000"))
+# Rows per Supabase upsert when re-driving
+OUTBOX_REDRIVE_BATCH = 100
+
+SUPABASE = "supabase"
+SEARCH = "search"
+STORES = (SUPABASE, SEARCH)
+
+class Outbox:
+    """
+    Durable, append-only record of journal writes that haven't reached both Supabase and the
+    search index yet.
+
+    /index records each entry (`record`) before writing it to both stores concurrently; each
+    store's success is acknowledged with `ack(store, entry_id, updated)`. The log is NDJSON:
+    {"put": entry} and {"ack": store, "id": entry_id, "updated": ...} lines, replayed on startup.
+    A background task re-drives writes that stay unacknowledged, so a crash or an upstream
+    failure between the two writes is repaired instead of leaving the stores out of sync.
+
+    Entries are versioned by their `updated` timestamp: a newer write to the same entry replaces
+    the pending one, and acks for older versions are ignored.
+    """
+
+    def __init__(self, path: str = OUTBOX_PATH, fsync: bool = OUTBOX_FSYNC,
+                 retry_seconds: float = OUTBOX_RETRY_SECONDS, compact_lines: int = OUTBOX_COMPACT_LINES):
+        self.path = path
+        self.fsync = fsync
+        self.retry_seconds = retry_seconds
+        self.compact_lines = compact_lines
+        # entry_id -> {"entry", "acked": set of stores, "recorded_at"}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._buffer: List[tuple] = []
+        self._writer: Optional[asyncio.Task] = None
+        self._retry_task: Optional[asyncio.Task] = None
+        self._lines = 0
+        self.recorded = 0
+        self.completed = 0
+        self.redriven = 0
+        self.compactions = 0
+
+    async def load(self) -> None:
+        """
+        Read unfinished writes from the log (done by `start`).
+        """
+        await asyncio.to_thread(self._load)
+
+    async def start(self) -> None:
+        if self._retry_task is None:
+            await self.load()
+            self._retry_task = asyncio.create_task(self._retry_loop())
+
+    async def stop(self) -> None:
+        if self._retry_task is not None:
+            self._retry_task.cancel()
+            try:
+                await self._retry_task
+            except asyncio.CancelledError:
+                pass
+            self._retry_task = None
+        if self._writer is not None:
+            await self._writer
+
+    async def record(self, entry: Dict[str, Any]) -> None:
+        """
+        Durably record an intended write (entry with 'objectID' and 'updated'). Returns once it is on disk.
+        """
+        self._pending[entry["objectID"]] = {"entry": entry, "acked": set(), "recorded_at": time.monotonic()}
+        self.recorded += 1
+        await self._append({"put": entry}, durable=True)
+
+    def ack(self, store: str, entry_id: str, updated: Optional[str]) -> None:
+        """
+        Note that `store` has the given version of an entry. Not awaited: a lost ack only means
+        the write is re-driven, which is idempotent.
+        """
+        item = self._pending.get(entry_id)
+        if item is None or item["entry"].get("updated") != updated:
+            return
+        item["acked"].add(store)
+        if item["acked"].issuperset(STORES):
+            del self._pending[entry_id]
+            self.completed += 1
+        self._append({"ack": store, "id": entry_id, "updated": updated})
+
+    def is_pending(self, entry_id: str) -> bool:
+        return entry_id in self._pending
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "completed": self.completed,
+            "redriven": self.redriven,
+            "log_lines": self._lines,
+            "compactions": self.compactions
+        }
+
+    # --- log file ---
+    def _append(self, record: Dict[str, Any], durable: bool = False) -> Optional[asyncio.Future]:
+        """
+        Queue a line for the writer task; records that arrive while a write is in progress are
+        written (and fsynced) together with one disk flush. Durable records get a future that
+        resolves once their line is on disk.
+        """
+        future = asyncio.get_running_loop().create_future() if durable else None
+        self._buffer.append((json.dumps(record, separators=(",", ":")), future))
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_buffered())
+        return future
+
+    async def _write_buffered(self) -> None:
+        while self._buffer:
+            batch, self._buffer = self._buffer, []
+            try:
+                await asyncio.to_thread(self._write_lines, [line for line, _ in batch])
+            except Exception as e:
+                logger.error("Outbox write failed: %s", e)
+                for _, future in batch:
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+                continue
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_result(None)
+            if self._lines > self.compact_lines + 2 * len(self._pending):
+                snapshot = {key: {"entry": item["entry"], "acked": set(item["acked"])} for key, item in self._pending.items()}
+                await asyncio.to_thread(self._compact, snapshot)
+
+    def _write_lines(self, lines: List[str]) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._lines += len(lines)
+
+    def _compact(self, pending: Dict[str, Dict[str, Any]]) -> None:
+        # Only called from the writer task, so no append can interleave with the rewrite
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry_id, item in pending.items():
+                f.write(json.dumps({"put": item["entry"]}, separators=(",", ":")) + "\n")
+                for store in item["acked"]:
+                    f.write(json.dumps({"ack": store, "id": entry_id, "updated": item["entry"].get("updated")},
+                                       separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._lines = sum(1 + len(item["acked"]) for item in pending.values())
+        self.compactions += 1
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        pending: Dict[str, Dict[str, Any]] = {}
+        lines = 0
+        torn = False
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-append
+                    torn = True
+                    continue
+                if "put" in record:
+                    entry = record["put"]
+                    pending[entry["objectID"]] = {"entry": entry, "acked": set(), "recorded_at": 0.0}
+                elif "ack" in record:
+                    item = pending.get(record["id"])
+                    if item is not None and item["entry"].get("updated") == record.get("updated"):
+                        item["acked"].add(record["ack"])
+                        if item["acked"].issuperset(STORES):
+                            del pending[record["id"]]
+        self._pending = pending
+        self._lines = lines
+        if torn:
+            # Rewrite so new lines aren't appended onto the partial one
+            self._compact(pending)
+        if pending:
+            logger.info("Outbox has %d unfinished writes from a previous run", len(pending))
+
+    # --- re-driving unfinished writes ---
+    async def _retry_loop(self) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, self.retry_seconds / 2))
+            try:
+                await self.redrive()
+            except Exception as e:
+                logger.warning("Outbox re-drive failed: %s", e)
+
+    async def redrive(self, min_age: Optional[float] = None) -> int:
+        """
+        Re-send writes older than `min_age` seconds (default retry_seconds) to the stores that
+        haven't acknowledged them. Returns how many entries were re-sent.
+        """
+        # Imported here: the index queue acknowledges into this module
+        from services.indexer import index_queue
+        min_age = self.retry_seconds if min_age is None else min_age
+        cutoff = time.monotonic() - min_age
+        stale = [item for item in self._pending.values() if item["recorded_at"] <= cutoff]
+        if not stale:
+            return 0
+        missing_supabase = [item["entry"] for item in stale if SUPABASE not in item["acked"]]
+        for item in stale:
+            item["recorded_at"] = time.monotonic()
+            if SEARCH not in item["acked"]:
+                await index_queue.enqueue(item["entry"])
+        for start in range(0, len(missing_supabase), OUTBOX_REDRIVE_BATCH):
+            chunk = missing_supabase[start:start + OUTBOX_REDRIVE_BATCH]
+            rows = [{**entry, "entry_id": entry["objectID"]} for entry in chunk]
+            async with guard("supabase", "journal_entries.upsert"):
+                await get_supabase().table("journal_entries").upsert(rows, on_conflict="entry_id").execute()
+            for entry in chunk:
+                self.ack(SUPABASE, entry["objectID"], entry.get("updated"))
+            await insights.apply(chunk)
+        self.redriven += len(stale)
+        return len(stale)
+
+outbox = Outbox()
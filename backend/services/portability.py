@@ -0,0 +1,186 @@
+import os
+import json
+import uuid
+import zlib
+import logging
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from services.clients import get_supabase
+from services.supabase import iter_pages, invalidate_usage, invalidate_entries
+from services.search_backend import get_search_backend
+from services.gemini import invalidate_user_searches
+from services.resilience import guard
+from services.insights import insights
+
+logger = logging.getLogger(__name__)
+
+# Rows per Supabase page on export and per batch write on import
+PORTABILITY_BATCH_SIZE = int(os.getenv("PORTABILITY_BATCH_SIZE", "200"))
+# Longest accepted import line; anything longer is rejected instead of buffered
+MAX_IMPORT_LINE_BYTES = 16 * 1024 * 1024
+# Decompressed bytes produced per step, so a small upload can't expand all at once
+DECOMPRESS_STEP = 1 << 20
+# At most this many per-line errors are echoed back from an import
+MAX_REPORTED_ERRORS = 20
+
+ENTRY_FIELDS = ("entry_id", "session_id", "date", "timestamp", "title", "summary", "tags", "text", "audio_url", "updated")
+
+async def export_user(user_id: str, page_size: int = PORTABILITY_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """
+    A user's sessions and journal entries as gzip-compressed NDJSON, one {"type": "session" | "entry", ...}
+    object per line. Rows are read a page at a time and compressed as they go, so memory use
+    doesn't depend on the size of the history.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for record_type, table, key in (("session", "sessions", "session_id"), ("entry", "journal_entries", "entry_id")):
+        async for rows in iter_pages(table, key, page_size=page_size, user_id=user_id):
+            lines = "".join(json.dumps({"type": record_type, **row}, default=str) + "\n" for row in rows)
+            chunk = compressor.compress(lines.encode("utf-8"))
+            if chunk:
+                yield chunk
+    yield compressor.flush()
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Split a request body into lines as it arrives, gunzipping it first if it starts with the gzip magic bytes.
+    """
+    decompressor = None
+    first = True
+    buffer = b""
+
+    def split(piece: bytes) -> List[bytes]:
+        nonlocal buffer
+        buffer += piece
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > MAX_IMPORT_LINE_BYTES:
+            raise ValueError("Import line too long")
+        return lines
+
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if first:
+            first = False
+            if chunk[:2] == b"\x1f\x8b":
+                decompressor = zlib.decompressobj(31)
+        if decompressor is None:
+            for line in split(chunk):
+                yield line
+            continue
+        data = chunk
+        while data:
+            # Lines from each step are handed on before the rest of the chunk is inflated
+            piece = decompressor.decompress(data, DECOMPRESS_STEP)
+            data = decompressor.unconsumed_tail
+            for line in split(piece):
+                yield line
+    if buffer:
+        yield buffer
+
+class Importer:
+    """
+    Writes an export stream back for one user: sessions and entries are upserted to Supabase
+    and entries indexed for search in batches of PORTABILITY_BATCH_SIZE. Every record is
+    assigned to the importing user, whatever user_id the file contains. Records whose id is
+    already used by a row that isn't the importing user's are rejected, so an import can only
+    overwrite the user's own rows.
+    """
+
+    def __init__(self, user_id: str, batch_size: int = PORTABILITY_BATCH_SIZE):
+        self.user_id = user_id
+        self.batch_size = batch_size
+        # (line number, record) waiting to be written
+        self._sessions: List[Tuple[int, Dict[str, Any]]] = []
+        self._entries: List[Tuple[int, Dict[str, Any]]] = []
+        self.sessions = 0
+        self.entries = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    async def run(self, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        line_no = 0
+        async for line in iter_lines(chunks):
+            line_no += 1
+            if not line.strip():
+                continue
+            try:
+                self._add(line_no, json.loads(line))
+            except Exception as e:
+                self._fail(line_no, e)
+                continue
+            if len(self._sessions) >= self.batch_size:
+                await self._flush_sessions()
+            if len(self._entries) >= self.batch_size:
+                await self._flush_entries()
+        await self._flush_sessions()
+        await self._flush_entries()
+        invalidate_user_searches(self.user_id)
+        invalidate_usage(self.user_id)
+        invalidate_entries(self.user_id)
+        return self.stats()
+
+    def _add(self, line_no: int, record: Dict[str, Any]) -> None:
+        record_type = record.pop("type", None)
+        if record_type == "session":
+            if not record.get("session_id"):
+                raise ValueError("Session without session_id")
+            self._sessions.append((line_no, {**record, "user_id": self.user_id}))
+        elif record_type == "entry":
+            if not record.get("timestamp"):
+                raise ValueError("Entry without timestamp")
+            entry = {field: record[field] for field in ENTRY_FIELDS if field in record}
+            entry_id = entry.get("entry_id") or str(uuid.uuid4())
+            entry.update(user_id=self.user_id, entry_id=entry_id, objectID=entry_id)
+            entry.setdefault("updated", datetime.now(timezone.utc).isoformat())
+            self._entries.append((line_no, entry))
+        else:
+            raise ValueError(f"Unknown record type: {record_type!r}")
+
+    def _fail(self, line_no: int, error: Exception) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_no, "error": str(error)})
+
+    async def _owned(self, table: str, key: str, batch: List[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        The records of a batch that are new or already belong to the importing user; the rest are
+        reported as failed lines.
+        """
+        ids = list({record[key] for _, record in batch})
+        async with guard("supabase", f"{table}.owners"):
+            result = await get_supabase().table(table).select(f"{key},user_id").in_(key, ids).execute()
+        foreign = {row[key] for row in result.data or [] if row.get("user_id") != self.user_id}
+        owned = []
+        for line_no, record in batch:
+            if record[key] in foreign:
+                self._fail(line_no, ValueError(f"{key} {record[key]} belongs to another account"))
+            else:
+                owned.append(record)
+        return owned
+
+    async def _flush_sessions(self) -> None:
+        batch, self._sessions = self._sessions, []
+        if not batch:
+            return
+        rows = await self._owned("sessions", "session_id", batch)
+        if not rows:
+            return
+        async with guard("supabase", "sessions.upsert"):
+            await get_supabase().table("sessions").upsert(rows, on_conflict="session_id").execute()
+        self.sessions += len(rows)
+
+    async def _flush_entries(self) -> None:
+        batch, self._entries = self._entries, []
+        if not batch:
+            return
+        entries = await self._owned("journal_entries", "entry_id", batch)
+        if not entries:
+            return
+        async with guard("supabase", "journal_entries.upsert"):
+            await get_supabase().table("journal_entries").upsert(entries, on_conflict="entry_id").execute()
+        await get_search_backend().index(entries)
+        await insights.apply(entries)
+        self.entries += len(entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sessions": self.sessions, "entries": self.entries, "failed": self.failed, "errors": self.errors}
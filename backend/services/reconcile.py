@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from services import clients
+from services.supabase import iter_pages
+from services.algolia import browse_records, index_journals, delete_journals
+from services.gemini import invalidate_user_searches
+from services.outbox import outbox
+from services.resilience import clear_deadline
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Supabase rows fetched per page
+RECONCILE_PAGE_SIZE = int(os.getenv("RECONCILE_PAGE_SIZE", "500"))
+# Records per Algolia save/delete batch
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "500"))
+
+# The columns that make up an index record
+ENTRY_COLUMNS = "entry_id,user_id,session_id,date,timestamp,title,summary,tags,text,audio_url,updated"
+
+class Reconciler:
+    """
+    Repairs drift between Supabase (the source of truth) and the Algolia index.
+
+    Browses the index for every record's objectID and `updated` version, then streams
+    journal_entries from Supabase page by page. Rows missing from the index or with a different
+    `updated` are re-saved in chunked batches. Index records without a Supabase row are counted
+    as orphans; since they can be entries whose Supabase write was lost, they are only deleted
+    with `delete_orphans`. Entries still pending in the outbox are left to it.
+    """
+
+    def __init__(self, page_size: int = RECONCILE_PAGE_SIZE, batch_size: int = RECONCILE_BATCH_SIZE,
+                 dry_run: bool = False, delete_orphans: bool = False):
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.delete_orphans = delete_orphans
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.indexed = 0
+        self.scanned = 0
+        self.missing = 0
+        self.stale = 0
+        self.orphaned = 0
+        self.pending = 0
+        self.saved = 0
+        self.deleted = 0
+
+    async def run(self) -> None:
+        self.state = "running"
+        self.started_at = time.monotonic()
+        try:
+            await self._run()
+            self.state = "done"
+        except asyncio.CancelledError:
+            self.state = "stopped"
+            raise
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            raise
+        finally:
+            self.finished_at = time.monotonic()
+
+    async def _run(self) -> None:
+        # objectID -> updated for the whole index; only two short strings per record
+        versions: Dict[str, Any] = {}
+        async for hit in browse_records(["updated"]):
+            versions[hit["objectID"]] = hit.get("updated")
+        self.indexed = len(versions)
+        to_save: List[Dict[str, Any]] = []
+        async for rows in iter_pages("journal_entries", "entry_id", ENTRY_COLUMNS, self.page_size):
+            for row in rows:
+                self.scanned += 1
+                entry_id = row.get("entry_id")
+                if not entry_id:
+                    continue
+                if outbox.is_pending(entry_id):
+                    # A newer version is on its way to both stores; this row may be the older one
+                    versions.pop(entry_id, None)
+                    self.pending += 1
+                    continue
+                if entry_id not in versions:
+                    self.missing += 1
+                elif versions.pop(entry_id) != row.get("updated"):
+                    self.stale += 1
+                else:
+                    continue
+                to_save.append({**row, "objectID": entry_id})
+                if len(to_save) >= self.batch_size:
+                    await self._save(to_save)
+                    to_save = []
+        if to_save:
+            await self._save(to_save)
+        # Whatever is left has no Supabase row, unless its write is still on its way through the outbox
+        orphans = [object_id for object_id in versions if not outbox.is_pending(object_id)]
+        self.orphaned = len(orphans)
+        if not self.delete_orphans:
+            return
+        for start in range(0, len(orphans), self.batch_size):
+            await self._delete(orphans[start:start + self.batch_size])
+
+    async def _save(self, entries: List[Dict[str, Any]]) -> None:
+        if self.dry_run:
+            return
+        await index_journals(entries)
+        self.saved += len(entries)
+        for user_id in {entry["user_id"] for entry in entries if entry.get("user_id")}:
+            invalidate_user_searches(user_id)
+
+    async def _delete(self, object_ids: List[str]) -> None:
+        if self.dry_run:
+            return
+        await delete_journals(object_ids)
+        self.deleted += len(object_ids)
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = ((self.finished_at or time.monotonic()) - self.started_at) if self.started_at else 0.0
+        return {
+            "state": self.state,
+            "error": self.error,
+            "dry_run": self.dry_run,
+            "delete_orphans": self.delete_orphans,
+            "indexed": self.indexed,
+            "scanned": self.scanned,
+            "missing": self.missing,
+            "stale": self.stale,
+            "orphaned": self.orphaned,
+            "pending": self.pending,
+            "saved": self.saved,
+            "deleted": self.deleted,
+            "elapsed_seconds": round(elapsed, 1)
+        }
+
+# The reconcile run started through the API, if any
+current: Optional[Reconciler] = None
+_task: Optional[asyncio.Task] = None
+
+def start_reconcile(dry_run: bool = True, delete_orphans: bool = False) -> Reconciler:
+    """
+    Start a reconcile run in the background; only one runs at a time.
+    """
+    global current, _task
+    if _task is not None and not _task.done():
+        raise RuntimeError("A reconcile run is already in progress")
+    current = Reconciler(dry_run=dry_run, delete_orphans=delete_orphans)
+    job = current
+
+    async def run():
+        # Started from an API request; the job must not inherit its deadline
+        clear_deadline()
+        try:
+            await job.run()
+        except Exception as e:
+            logger.error("Reconcile failed: %s", e)
+
+    _task = asyncio.create_task(run())
+    return current
+
+async def stop_reconcile() -> None:
+    if _task is not None and not _task.done():
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+
+async def _main(args) -> None:
+    await clients.startup()
+    # Writes still pending in this host's outbox are not treated as orphans
+    await outbox.load()
+    try:
+        job = Reconciler(page_size=args.page_size, batch_size=args.batch_size, dry_run=not args.apply,
+                         delete_orphans=args.delete_orphans)
+        try:
+            await job.run()
+        finally:
+            print(json.dumps(job.stats()))
+    finally:
+        await clients.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Repair drift between Supabase journal_entries and the Algolia index.")
+    parser.add_argument("--page-size", type=int, default=RECONCILE_PAGE_SIZE)
+    parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE)
+    parser.add_argument("--apply", action="store_true", help="repair drift (by default it is only counted)")
+    parser.add_argument("--delete-orphans", action="store_true",
+                        help="with --apply, also delete index records that have no Supabase row")
+    asyncio.run(_main(parser.parse_args()))
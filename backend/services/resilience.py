@@ -0,0 +1,267 @@
+import os
+import time
+import asyncio
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from services.metrics import counter, track
+
+# Time budget shared by every upstream call made while serving one HTTP request
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "30"))
+# Consecutive failures that open an upstream's circuit, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+# Hedged reads go out after this quantile of recent latency (HEDGE_INITIAL_DELAY until enough samples)
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_INITIAL_DELAY = float(os.getenv("HEDGE_INITIAL_DELAY", "0.3"))
+
+UPSTREAMS = ("gemini", "algolia", "supabase", "assemblyai")
+
+CIRCUIT_REJECTED = counter("whispers_circuit_rejected_total", "Upstream calls failed fast by an open circuit.", ("upstream",))
+HEDGED = counter("whispers_hedged_requests_total", "Reads that sent a hedge request, by which attempt answered.",
+                 ("upstream", "winner"))
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+# --- Per-request deadline ---
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+def remaining() -> Optional[float]:
+    """
+    Seconds left in the current request's budget, or None outside a request (background jobs).
+    """
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+def clear_deadline() -> None:
+    """
+    Drop the request deadline in the current context. Tasks copy the context of the request that
+    created them, so long-running jobs started from a request call this first.
+    """
+    _deadline.set(None)
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware that gives each HTTP request a REQUEST_DEADLINE_SECONDS budget. Upstream calls
+    made through `guard` while serving it are cut off when the budget runs out, so one slow
+    upstream can't hold a worker for the sum of every call's own timeout. Bulk endpoints listed
+    in `exempt` (path prefixes) run without a deadline.
+    """
+
+    def __init__(self, app, seconds: float = REQUEST_DEADLINE_SECONDS, exempt: Tuple[str, ...] = ()):
+        self.app = app
+        self.seconds = seconds
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.seconds <= 0 or scope["path"].startswith(self.exempt):
+            await self.app(scope, receive, send)
+            return
+        token = _deadline.set(time.monotonic() + self.seconds)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+
+# --- Circuit breakers ---
+def _is_failure(exc: BaseException) -> bool:
+    """
+    Whether an exception says something about the upstream's health. Client errors (4xx other
+    than 429), our own deadline and cancellation don't.
+    """
+    if isinstance(exc, (DeadlineExceeded, CircuitOpenError, asyncio.CancelledError)):
+        return False
+    status = getattr(getattr(exc, "response", None), "status_code", None) or getattr(exc, "status", None)
+    if isinstance(status, int) and 400 <= status < 500 and status != 429:
+        return False
+    return True
+
+class CircuitBreaker:
+    """
+    Fails calls to an upstream immediately once it is clearly down.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls raise
+    CircuitOpenError for `reset_seconds`. Then a single trial call is let through (half-open):
+    success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.opens = 0
+        self.rejected = 0
+
+    def _reject(self):
+        self.rejected += 1
+        CIRCUIT_REJECTED.inc(upstream=self.name)
+        raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def before(self) -> bool:
+        """
+        Admit a call or raise CircuitOpenError. Returns True if the call is the half-open trial.
+        """
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                self._reject()
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                self._reject()
+            self._probing = True
+            return True
+        return False
+
+    def after(self, exc: Optional[BaseException], probe: bool) -> None:
+        """
+        Record the outcome of a call admitted by `before`.
+        """
+        if exc is not None and not _is_failure(exc):
+            if probe:
+                self._probing = False
+            return
+        if exc is None:
+            self.failures = 0
+            if probe:
+                self.state = "closed"
+                self._probing = False
+            return
+        self.failures += 1
+        if probe or (self.state == "closed" and self.failures >= self.failure_threshold):
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._probing = False
+            self.opens += 1
+
+    def is_open(self) -> bool:
+        return self.state == "open" and time.monotonic() - self.opened_at < self.reset_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures, "opens": self.opens, "rejected": self.rejected}
+
+breakers: Dict[str, CircuitBreaker] = {name: CircuitBreaker(name) for name in UPSTREAMS}
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    breaker = breakers.get(upstream)
+    if breaker is None:
+        breaker = breakers[upstream] = CircuitBreaker(upstream)
+    return breaker
+
+class guard(track):
+    """
+    `track` plus fail-fast: raises CircuitOpenError without calling the upstream while its circuit
+    is open, raises DeadlineExceeded once the request's budget is spent (also mid-call), and feeds
+    the outcome to the upstream's circuit breaker. Use it around every call to an upstream.
+
+        async with guard("gemini", "summarize") as g:
+            resp = await client.post(...)
+            g.status = resp.status_code
+    """
+
+    __slots__ = ("_probe", "_scope")
+
+    async def __aenter__(self):
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded(f"Request deadline exceeded before {self.upstream} {self.operation}")
+        self._probe = get_breaker(self.upstream).before()
+        self._scope = None
+        if left is not None:
+            self._scope = asyncio.timeout(left)
+            await self._scope.__aenter__()
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._scope is not None:
+            try:
+                await self._scope.__aexit__(exc_type, exc, tb)
+            except TimeoutError as e:
+                exc_type, exc = DeadlineExceeded, DeadlineExceeded(f"Request deadline exceeded during {self.upstream} {self.operation}")
+                get_breaker(self.upstream).after(exc, self._probe)
+                self.__exit__(exc_type, exc, None)
+                raise exc from e
+        get_breaker(self.upstream).after(exc, self._probe)
+        return self.__exit__(exc_type, exc, tb)
+
+# --- Hedged reads ---
+class Hedge:
+    """
+    Hedged requests for idempotent reads. If a call hasn't answered after the recent `quantile`
+    latency, an identical second call is sent and whichever answers first is used; the other is
+    cancelled. At the p95 this costs about 5% extra requests and cuts off most of the slow tail.
+    """
+
+    def __init__(self, upstream: str, quantile: float = HEDGE_QUANTILE, initial_delay: float = HEDGE_INITIAL_DELAY,
+                 min_delay: float = 0.01, window: int = 512, min_samples: int = 50):
+        self.upstream = upstream
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.delay = initial_delay
+        self._samples = deque(maxlen=window)
+        self._since_update = 0
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def _record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._since_update += 1
+        # Re-sorting the window on every sample isn't worth it; refresh the quantile every 16
+        if len(self._samples) >= self.min_samples and self._since_update >= 16:
+            ordered = sorted(self._samples)
+            self.delay = max(self.min_delay, ordered[int(self.quantile * (len(ordered) - 1))])
+            self._since_update = 0
+
+    async def _attempt(self, call: Callable[[], Awaitable[Any]]):
+        start = time.perf_counter()
+        try:
+            return await call()
+        finally:
+            # Abandoned attempts are recorded at the time they were cancelled, a lower bound
+            self._record(time.perf_counter() - start)
+
+    async def run(self, call: Callable[[], Awaitable[Any]]):
+        """
+        Run `call()` (a fresh coroutine per attempt) with at most one hedge.
+        """
+        self.calls += 1
+        primary = asyncio.ensure_future(self._attempt(call))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.delay)
+            if done or get_breaker(self.upstream).is_open():
+                return await primary
+            hedge = asyncio.ensure_future(self._attempt(call))
+            self.hedged += 1
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = "hedge" if task is hedge else "primary"
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        HEDGED.inc(upstream=self.upstream, winner=winner)
+                        return task.result()
+                    if task is primary or error is None:
+                        error = task.exception()
+            HEDGED.inc(upstream=self.upstream, winner="none")
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"delay_ms": round(self.delay * 1000, 1), "calls": self.calls, "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins}
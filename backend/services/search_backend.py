@@ -0,0 +1,409 @@
+import os
+import logging
+import asyncio
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from services.algolia import algolia_multi_search, algolia_reads, index_journals, delete_journals
+from services.local_search import LocalSearchIndex, day_number
+from services.supabase import iter_pages
+
+if TYPE_CHECKING:
+    from services.vectors import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Which engine serves /search and receives /index writes: "algolia", "local" or "both"
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "algolia").lower()
+LOCAL_SEARCH_SNAPSHOT_SECONDS = float(os.getenv("LOCAL_SEARCH_SNAPSHOT_SECONDS", "60"))
+# Fuse local embedding search into keyword results (reciprocal rank fusion)
+SEARCH_SEMANTIC = os.getenv("SEARCH_SEMANTIC", "false").lower() in ("1", "true", "yes")
+# Seconds between attempts to seed an empty local index from Supabase
+SEARCH_SEED_RETRY_SECONDS = float(os.getenv("SEARCH_SEED_RETRY_SECONDS", "30"))
+# Supabase rows per page while seeding
+SEARCH_SEED_PAGE_SIZE = 500
+SEED_COLUMNS = "entry_id,user_id,session_id,date,timestamp,title,summary,tags,text,audio_url"
+# Hits per Algolia page, and the most pages read, when a search filters by tags or dates
+ALGOLIA_FILTER_PAGE_SIZE = int(os.getenv("ALGOLIA_FILTER_PAGE_SIZE", "100"))
+ALGOLIA_FILTER_MAX_PAGES = int(os.getenv("ALGOLIA_FILTER_MAX_PAGES", "5"))
+
+class SearchBackend:
+    """
+    Interface for journal search engines used by /search and the /index queue.
+
+    `search` takes a list of terms and returns hits shaped like the /search results
+    (objectID, title, summary, tags, timestamp), best first.
+    """
+
+    name = "base"
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def index(self, entries: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    async def delete(self, user_id: str, entry_ids: List[str]) -> None:
+        raise NotImplementedError
+
+    async def search(self, terms: List[str], user_id: Optional[str] = None, tags: Optional[List[str]] = None,
+                     date_from: Optional[str] = None, date_to: Optional[str] = None,
+                     limit: int = 10) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+class AlgoliaBackend(SearchBackend):
+    """
+    Remote search through Algolia. Tag and date filters are applied to the returned hits,
+    so the index does not need facet settings for them; filtered searches page through the
+    results until `limit` hits match or ALGOLIA_FILTER_MAX_PAGES pages have been read.
+    """
+
+    name = "algolia"
+
+    async def index(self, entries):
+        await index_journals(entries)
+
+    async def delete(self, user_id, entry_ids):
+        await delete_journals(entry_ids)
+
+    async def search(self, terms, user_id=None, tags=None, date_from=None, date_to=None, limit=10):
+        if not tags and not (date_from or date_to):
+            hits = await algolia_multi_search(terms, user_id=user_id, hits_per_page=limit)
+            return hits[:limit]
+        wanted = {str(t).lower() for t in tags or ()}
+        lower, upper = day_number(date_from), day_number(date_to) or 99999999
+        page_size = max(limit, ALGOLIA_FILTER_PAGE_SIZE)
+        matches: List[Dict[str, Any]] = []
+        seen = set()
+        for page in range(ALGOLIA_FILTER_MAX_PAGES):
+            hits = await algolia_multi_search(terms, user_id=user_id, hits_per_page=page_size, page=page)
+            for hit in hits:
+                if hit["objectID"] in seen:
+                    continue
+                seen.add(hit["objectID"])
+                if wanted <= {str(t).lower() for t in hit.get("tags", [])} and lower <= day_number(hit.get("timestamp")) <= upper:
+                    matches.append(hit)
+            # Fewer merged hits than a page means every term has run out of results
+            if len(matches) >= limit or len(hits) < page_size:
+                break
+        return matches[:limit]
+
+    def stats(self):
+        return {"backend": self.name, "hedged_reads": algolia_reads.stats()}
+
+class SeededBackend(SearchBackend):
+    """
+    Base for in-process indexes that start out empty: `start_seeding` pages every journal entry
+    from Supabase into the index in the background, retrying until it gets through, so entries
+    written before the index existed are searchable too. Entries written or deleted while seeding
+    runs are left out of it, so an older Supabase row can't replace a newer write.
+    """
+
+    def __init__(self):
+        self._seed_task: Optional[asyncio.Task] = None
+        # Entry ids written through index/delete while seeding runs
+        self._touched: set = set()
+        self.seeded = 0
+        # False from the start of seeding until it has gone through every page
+        self.complete = True
+
+    @property
+    def seeding(self) -> bool:
+        return self._seed_task is not None and not self._seed_task.done()
+
+    def start_seeding(self) -> None:
+        if not self.seeding:
+            self._touched = set()
+            self.complete = False
+            self._seed_task = asyncio.create_task(self._seed_loop())
+
+    async def stop_seeding(self) -> None:
+        if self.seeding:
+            self._seed_task.cancel()
+            await asyncio.gather(self._seed_task, return_exceptions=True)
+
+    def _touch(self, entry_ids) -> None:
+        if self.seeding:
+            self._touched.update(entry_ids)
+
+    async def _seed_loop(self) -> None:
+        while True:
+            try:
+                await self.seed()
+                return
+            except Exception as e:
+                logger.warning("Seeding %s search from Supabase failed: %s", self.name, e)
+            await asyncio.sleep(SEARCH_SEED_RETRY_SECONDS)
+
+    async def seed(self, page_size: int = SEARCH_SEED_PAGE_SIZE) -> int:
+        count = 0
+        async for rows in iter_pages("journal_entries", "entry_id", SEED_COLUMNS, page_size):
+            entries = [{**row, "objectID": row["entry_id"]} for row in rows
+                       if row.get("entry_id") and row["entry_id"] not in self._touched]
+            self._add_seed(entries)
+            count += len(entries)
+            self.seeded = count
+        self.complete = True
+        self._seed_done()
+        logger.info("Seeded %s search with %d entries from Supabase", self.name, count)
+        return count
+
+    def _add_seed(self, entries: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def _seed_done(self) -> None:
+        pass
+
+class LocalBackend(SeededBackend):
+    """
+    In-process BM25 search over a per-user inverted index (services/local_search.py).
+    The index is loaded from its snapshot at startup and re-snapshotted periodically and on shutdown.
+    Without a snapshot it is seeded from Supabase; no snapshot is written until seeding finishes,
+    so an interrupted seed starts over on the next run.
+    """
+
+    name = "local"
+
+    def __init__(self, engine: Optional[LocalSearchIndex] = None, snapshot_interval: float = LOCAL_SEARCH_SNAPSHOT_SECONDS):
+        super().__init__()
+        self.engine = engine or LocalSearchIndex()
+        self.snapshot_interval = snapshot_interval
+        self._snapshot_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        loaded = False
+        try:
+            loaded = await asyncio.to_thread(self.engine.load)
+        except Exception as e:
+            logger.warning("Could not load local search snapshot: %s", e)
+        if not loaded:
+            self.start_seeding()
+        if self._snapshot_task is None and self.snapshot_interval > 0:
+            self._snapshot_task = asyncio.create_task(self._snapshot_loop())
+
+    async def stop(self):
+        await self.stop_seeding()
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            try:
+                await self._snapshot_task
+            except asyncio.CancelledError:
+                pass
+            self._snapshot_task = None
+        await self.snapshot()
+
+    def _add_seed(self, entries):
+        self.engine.add(entries)
+
+    async def snapshot(self):
+        if self.engine.dirty and self.complete:
+            # Serialize on the event loop so no write lands mid-pickle; only the file I/O is off-loaded
+            data = self.engine.dumps()
+            await asyncio.to_thread(self.engine.save, data)
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                await self.snapshot()
+            except Exception as e:
+                logger.error("Local search snapshot failed: %s", e)
+
+    async def index(self, entries):
+        self._touch(entry.get("objectID") or entry.get("entry_id") for entry in entries)
+        self.engine.add(entries)
+
+    async def delete(self, user_id, entry_ids):
+        entry_ids = list(entry_ids)
+        self._touch(entry_ids)
+        self.engine.delete(user_id, entry_ids)
+
+    async def search(self, terms, user_id=None, tags=None, date_from=None, date_to=None, limit=10):
+        if not user_id:
+            return []
+        return self.engine.search(user_id, " ".join(terms), tags=tags, date_from=date_from, date_to=date_to, limit=limit)
+
+    def stats(self):
+        return {"backend": self.name, **self.engine.stats(), "seeding": self.seeding, "seeded": self.seeded}
+
+class CombinedBackend(SearchBackend):
+    """
+    Runs several backends alongside each other: writes go to all of them, reads are served by
+    the first backend that returns hits (falling through on errors or empty results).
+    """
+
+    name = "both"
+
+    def __init__(self, backends: List[SearchBackend]):
+        self.backends = backends
+
+    async def start(self):
+        for backend in self.backends:
+            await backend.start()
+
+    async def stop(self):
+        for backend in self.backends:
+            await backend.stop()
+
+    async def index(self, entries):
+        results = await asyncio.gather(*(b.index(entries) for b in self.backends), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    async def delete(self, user_id, entry_ids):
+        results = await asyncio.gather(*(b.delete(user_id, entry_ids) for b in self.backends), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    async def search(self, terms, user_id=None, tags=None, date_from=None, date_to=None, limit=10):
+        error = None
+        for backend in self.backends:
+            try:
+                hits = await backend.search(terms, user_id=user_id, tags=tags, date_from=date_from, date_to=date_to, limit=limit)
+            except Exception as e:
+                error = e
+                continue
+            if hits:
+                return hits
+        if error is not None:
+            raise error
+        return []
+
+    def stats(self):
+        return {"backend": self.name, "backends": [b.stats() for b in self.backends]}
+
+class SemanticBackend(SeededBackend):
+    """
+    Local embedding search (services/vectors.py): hashed subword vectors in per-user memory-mapped
+    matrices, queried with a single matrix-vector product. A store that hasn't been marked as
+    seeded is filled from Supabase at startup.
+    """
+
+    name = "semantic"
+
+    def __init__(self, store: Optional["VectorStore"] = None, flush_interval: float = LOCAL_SEARCH_SNAPSHOT_SECONDS):
+        super().__init__()
+        # Imported here so NumPy is only loaded when semantic search is enabled
+        from services.vectors import VectorStore
+        self.store = store or VectorStore()
+        self.flush_interval = flush_interval
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if not self.store.is_seeded():
+            self.start_seeding()
+        if self._flush_task is None and self.flush_interval > 0:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def _add_seed(self, entries):
+        self.store.upsert(entries)
+
+    def _seed_done(self):
+        self.store.mark_seeded()
+
+    async def stop(self):
+        await self.stop_seeding()
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        self.store.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.store.flush()
+            except Exception as e:
+                logger.error("Vector store flush failed: %s", e)
+
+    async def index(self, entries):
+        self._touch(entry.get("objectID") or entry.get("entry_id") for entry in entries)
+        self.store.upsert(entries)
+
+    async def delete(self, user_id, entry_ids):
+        entry_ids = list(entry_ids)
+        self._touch(entry_ids)
+        self.store.delete(user_id, entry_ids)
+
+    async def search(self, terms, user_id=None, tags=None, date_from=None, date_to=None, limit=10):
+        if not user_id:
+            return []
+        return self.store.search(user_id, " ".join(terms), tags=tags, date_from=date_from, date_to=date_to, limit=limit)
+
+    def stats(self):
+        return {"backend": self.name, **self.store.stats(), "seeding": self.seeding, "seeded": self.seeded}
+
+class HybridBackend(SearchBackend):
+    """
+    Keyword and semantic search side by side: writes go to both, and search results are merged
+    with reciprocal rank fusion so entries found by either path are ranked together.
+    """
+
+    name = "hybrid"
+
+    def __init__(self, keyword: SearchBackend, semantic: SemanticBackend):
+        self.keyword = keyword
+        self.semantic = semantic
+
+    async def start(self):
+        await self.keyword.start()
+        await self.semantic.start()
+
+    async def stop(self):
+        await self.keyword.stop()
+        await self.semantic.stop()
+
+    async def index(self, entries):
+        await self.semantic.index(entries)
+        await self.keyword.index(entries)
+
+    async def delete(self, user_id, entry_ids):
+        await self.semantic.delete(user_id, entry_ids)
+        await self.keyword.delete(user_id, entry_ids)
+
+    async def search(self, terms, user_id=None, tags=None, date_from=None, date_to=None, limit=10):
+        keyword_hits, semantic_hits = await asyncio.gather(
+            self.keyword.search(terms, user_id=user_id, tags=tags, date_from=date_from, date_to=date_to, limit=limit),
+            self.semantic.search(terms, user_id=user_id, tags=tags, date_from=date_from, date_to=date_to, limit=limit),
+            return_exceptions=True
+        )
+        # Either path on its own still gives usable results
+        if isinstance(keyword_hits, Exception) and isinstance(semantic_hits, Exception):
+            raise keyword_hits
+        lists = [hits for hits in (keyword_hits, semantic_hits) if not isinstance(hits, Exception)]
+        from services.vectors import rrf_fuse
+        return rrf_fuse(lists, limit=limit)
+
+    def stats(self):
+        return {"backend": self.name, "keyword": self.keyword.stats(), "semantic": self.semantic.stats()}
+
+_backend: Optional[SearchBackend] = None
+
+def get_search_backend() -> SearchBackend:
+    """
+    Get the configured search backend singleton (SEARCH_BACKEND=algolia|local|both),
+    wrapped in a HybridBackend when SEARCH_SEMANTIC is enabled.
+    """
+    global _backend
+    if _backend is None:
+        if SEARCH_BACKEND == "local":
+            _backend = LocalBackend()
+        elif SEARCH_BACKEND == "both":
+            _backend = CombinedBackend([LocalBackend(), AlgoliaBackend()])
+        elif SEARCH_BACKEND == "algolia":
+            _backend = AlgoliaBackend()
+        else:
+            raise RuntimeError(f"Unknown SEARCH_BACKEND: {SEARCH_BACKEND}")
+        if SEARCH_SEMANTIC:
+            _backend = HybridBackend(_backend, SemanticBackend())
+    return _backend
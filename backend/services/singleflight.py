@@ -0,0 +1,42 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from services.metrics import counter
+
+COALESCED = counter("whispers_coalesced_calls_total", "Calls that joined an identical call already in flight.", ("group",))
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls. The first caller for a key starts the call; callers
+    arriving with the same key while it is in flight wait for it and share its result or
+    exception. Nothing is kept once the call finishes; caching results is left to the caller.
+
+    The call runs in its own task, so a caller that is cancelled (e.g. its client disconnected)
+    doesn't fail the others waiting on it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            COALESCED.inc(group=self.name)
+        else:
+            self.calls += 1
+            task = self._inflight[key] = asyncio.ensure_future(call())
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception retrieved in case every caller was cancelled before it arrived
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._inflight), "calls": self.calls, "coalesced": self.coalesced}
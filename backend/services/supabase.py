@@ -1,30 +1,83 @@
 import os
-from supabase import create_client, Client
+import logging
+from services.clients import get_supabase
+from services.cache import TTLCache
+from services.resilience import guard
 
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+logger = logging.getLogger(__name__)
 
-# Validate environment variables
-if not SUPABASE_URL:
-    raise ValueError("SUPABASE_URL environment variable is not set")
-if not SUPABASE_KEY:
-    raise ValueError("SUPABASE_KEY environment variable is not set")
+USAGE_CACHE_TTL = float(os.environ.get("USAGE_CACHE_TTL", "30"))
+ENTRIES_CACHE_TTL = float(os.environ.get("ENTRIES_CACHE_TTL", "30"))
 
-print(f"Initializing Supabase client with URL: {SUPABASE_URL}")
-print(f"Supabase key type: {'Service Role' if SUPABASE_KEY.startswith('eyJ') and len(SUPABASE_KEY) > 100 else 'Anon Key'}")
+# Columns returned when listing entries; the full text only on request
+ENTRY_LIST_COLUMNS = "entry_id,session_id,date,timestamp,title,summary,tags,audio_url,updated"
 
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    print("Supabase client initialized successfully")
-except Exception as e:
-    print(f"Error initializing Supabase client: {e}")
-    raise
-
-def insert_session(session_id, date, created_at):
+async def insert_session(session_id, date, created_at):
     try:
         data = {"session_id": session_id, "date": date, "created_at": created_at}
-        result = supabase.table("sessions").insert(data).execute()
+        async with guard("supabase", "sessions.insert"):
+            result = await get_supabase().table("sessions").insert(data).execute()
         return result
     except Exception as e:
-        print(f"Error inserting session: {e}")
-        raise 
\ No newline at end of file
+        logger.error("Error inserting session: %s", e)
+        raise
+
+async def count_user_rows(table, user_id):
+    """
+    Count a user's rows server-side with an exact-count HEAD request; no rows are transferred.
+    """
+    async with guard("supabase", f"{table}.count"):
+        result = await get_supabase().table(table).select("*", count="exact", head=True).eq("user_id", user_id).execute()
+    return result.count or 0
+
+async def iter_pages(table, key, columns="*", page_size=500, user_id=None):
+    """
+    Yield all rows of a table (or one user's rows) in pages, keyset-paginated on the unique
+    column `key`, so only one page is held in memory at a time.
+    """
+    last = None
+    while True:
+        query = get_supabase().table(table).select(columns)
+        if user_id is not None:
+            query = query.eq("user_id", user_id)
+        if last is not None:
+            query = query.gt(key, last)
+        async with guard("supabase", f"{table}.page"):
+            result = await query.order(key).limit(page_size).execute()
+        rows = result.data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1][key]
+
+def _filter_value(value):
+    # Double-quoted so commas, dots and parentheses inside or=(...) filters are taken literally
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+async def list_user_entries(user_id, limit, before=None, include_text=False):
+    """
+    One page of a user's journal entries, newest first, keyset-paginated on (timestamp, entry_id).
+    `before` is the (timestamp, entry_id) of the last entry on the previous page.
+    """
+    columns = ENTRY_LIST_COLUMNS + (",text" if include_text else "")
+    query = get_supabase().table("journal_entries").select(columns).eq("user_id", user_id)
+    if before is not None:
+        timestamp, entry_id = (_filter_value(v) for v in before)
+        query = query.or_(f"timestamp.lt.{timestamp},and(timestamp.eq.{timestamp},entry_id.lt.{entry_id})")
+    query = query.order("timestamp", desc=True).order("entry_id", desc=True).limit(limit)
+    async with guard("supabase", "journal_entries.list"):
+        result = await query.execute()
+    return result.data or []
+
+# Short-lived per-user cache for /auth/usage; dropped when the user writes an entry
+usage_cache = TTLCache(maxsize=10000, ttl=USAGE_CACHE_TTL)
+
+def invalidate_usage(user_id):
+    usage_cache.delete(user_id)
+
+# Rendered /entries pages with their ETags, grouped by user and dropped when the user writes an entry
+entries_cache = TTLCache(maxsize=10000, ttl=ENTRIES_CACHE_TTL)
+
+def invalidate_entries(user_id):
+    entries_cache.invalidate_group(user_id)
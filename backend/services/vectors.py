@@ -0,0 +1,287 @@
+import os
+import re
+import json
+import zlib
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from services.local_search import day_number
+
+VECTOR_STORE_DIR = os.getenv(
+    "VECTOR_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "vectors")
+)
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "512"))
+# Users whose matrices are kept open (one memmap and file descriptor each); least recently used are closed
+VECTOR_STORE_MAX_OPEN = int(os.getenv("VECTOR_STORE_MAX_OPEN", "256"))
+# Fields embedded per entry, with their weights
+EMBED_FIELDS = {"title": 2.0, "summary": 1.5, "tags": 1.5, "text": 1.0}
+STORED_FIELDS = ("title", "summary", "tags", "timestamp", "date")
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+class HashingVectorizer:
+    """
+    CPU-only text embedding with no model download: word unigrams plus character 3- and 4-grams
+    of each word are hashed (CRC32, signed) into a fixed-size vector, which is L2-normalized.
+    The subword n-grams make morphological variants ("burnt", "burnout", "burning") land close together.
+    """
+
+    def __init__(self, dim: int = VECTOR_DIM, ngrams: Sequence[int] = (3, 4)):
+        self.dim = dim
+        self.ngrams = ngrams
+
+    def _features(self, text: str) -> List[str]:
+        features = []
+        for word in WORD_RE.findall(text.lower()):
+            features.append("w:" + word)
+            padded = f"<{word}>"
+            for n in self.ngrams:
+                for i in range(len(padded) - n + 1):
+                    features.append(padded[i:i + n])
+        return features
+
+    def transform(self, text: str, out: Optional[np.ndarray] = None, weight: float = 1.0) -> np.ndarray:
+        """
+        Add the hashed features of `text` into `out` (allocated if omitted) and return it, unnormalized.
+        """
+        if out is None:
+            out = np.zeros(self.dim, dtype=np.float32)
+        features = self._features(text)
+        if not features:
+            return out
+        hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+        index = (hashes % self.dim).astype(np.intp)
+        # The top hash bit picks the sign so collisions cancel out instead of piling up
+        signs = np.where(hashes & 0x80000000, -weight, weight).astype(np.float32)
+        np.add.at(out, index, signs)
+        return out
+
+    def embed(self, text: str) -> np.ndarray:
+        return _normalize(self.transform(text))
+
+    def embed_entry(self, entry: Dict[str, Any]) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for field, weight in EMBED_FIELDS.items():
+            value = entry.get(field)
+            if isinstance(value, list):
+                value = " ".join(str(v) for v in value)
+            if value:
+                self.transform(str(value), out=vec, weight=weight)
+        return _normalize(vec)
+
+def _normalize(vec: np.ndarray) -> np.ndarray:
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec /= norm
+    return vec
+
+class _UserVectors:
+    """
+    One user's vectors in a memory-mapped float32 matrix (<dir>/<hash>.npy) with a JSON sidecar
+    holding slot ids and display fields. Deleted slots are zeroed and reused.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.meta_path = path[:-len(".npy")] + ".json"
+        self.dim = dim
+        self.ids: List[Optional[str]] = []
+        self.meta: List[Optional[Dict[str, Any]]] = []
+        self.slots: Dict[str, int] = {}
+        self.free: List[int] = []
+        self.matrix: Optional[np.ndarray] = None
+        if os.path.exists(self.path) and os.path.exists(self.meta_path):
+            self.matrix = np.load(self.path, mmap_mode="r+")
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            self.ids, self.meta = saved["ids"], saved["meta"]
+            for slot, entry_id in enumerate(self.ids):
+                if entry_id is None:
+                    self.free.append(slot)
+                else:
+                    self.slots[entry_id] = slot
+
+    def _ensure_capacity(self, size: int) -> None:
+        capacity = 0 if self.matrix is None else self.matrix.shape[0]
+        if size <= capacity:
+            return
+        new_capacity = max(64, capacity * 2, size)
+        tmp = self.path + ".tmp"
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(new_capacity, self.dim))
+        if self.matrix is not None:
+            grown[:capacity] = self.matrix
+            del self.matrix
+        grown.flush()
+        del grown
+        os.replace(tmp, self.path)
+        self.matrix = np.load(self.path, mmap_mode="r+")
+
+    def upsert(self, entry_id: str, vec: np.ndarray, meta: Dict[str, Any]) -> None:
+        slot = self.slots.get(entry_id)
+        if slot is None:
+            slot = self.free.pop() if self.free else len(self.ids)
+            if slot == len(self.ids):
+                self.ids.append(None)
+                self.meta.append(None)
+            self._ensure_capacity(len(self.ids))
+            self.slots[entry_id] = slot
+        self.matrix[slot] = vec
+        self.ids[slot] = entry_id
+        self.meta[slot] = meta
+
+    def remove(self, entry_id: str) -> bool:
+        slot = self.slots.pop(entry_id, None)
+        if slot is None:
+            return False
+        self.matrix[slot] = 0.0
+        self.ids[slot] = None
+        self.meta[slot] = None
+        self.free.append(slot)
+        return True
+
+    def query(self, vec: np.ndarray, k: int) -> List[tuple]:
+        n = len(self.ids)
+        if n == 0 or self.matrix is None:
+            return []
+        # One matrix-vector product scores every entry; rows are unit length so this is cosine similarity
+        scores = self.matrix[:n] @ vec
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(slot), float(scores[slot])) for slot in top if self.ids[slot] is not None and scores[slot] > 0]
+
+    def flush(self) -> None:
+        if self.matrix is not None:
+            self.matrix.flush()
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "meta": self.meta}, f)
+        os.replace(tmp, self.meta_path)
+
+    def close(self) -> None:
+        # Dropping the last reference unmaps the file; query() returns no views into it
+        self.matrix = None
+
+class VectorStore:
+    """
+    Per-user semantic index answering top-k cosine queries over memory-mapped NumPy matrices.
+    At most `max_open` users' matrices are open at once; the least recently used are flushed and
+    closed, and reopened from disk when next needed.
+    """
+
+    def __init__(self, directory: str = VECTOR_STORE_DIR, vectorizer: Optional[HashingVectorizer] = None,
+                 max_open: int = VECTOR_STORE_MAX_OPEN):
+        self.directory = directory
+        self.vectorizer = vectorizer or HashingVectorizer()
+        self.max_open = max_open
+        self.users: "OrderedDict[str, _UserVectors]" = OrderedDict()
+        self.dirty = set()
+        self.evictions = 0
+
+    @property
+    def _seeded_path(self) -> str:
+        return os.path.join(self.directory, "seeded")
+
+    def is_seeded(self) -> bool:
+        """
+        Whether every existing entry has been loaded into the store (see SemanticBackend).
+        """
+        return os.path.exists(self._seeded_path)
+
+    def mark_seeded(self) -> None:
+        self.flush()
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._seeded_path, "w", encoding="utf-8") as f:
+            f.write("1\n")
+
+    def _user(self, user_id: str) -> _UserVectors:
+        store = self.users.get(user_id)
+        if store is not None:
+            self.users.move_to_end(user_id)
+            return store
+        while self.users and len(self.users) >= self.max_open:
+            self._evict()
+        os.makedirs(self.directory, exist_ok=True)
+        name = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+        store = self.users[user_id] = _UserVectors(os.path.join(self.directory, name + ".npy"), self.vectorizer.dim)
+        return store
+
+    def _evict(self) -> None:
+        user_id, store = self.users.popitem(last=False)
+        if user_id in self.dirty:
+            store.flush()
+            self.dirty.discard(user_id)
+        store.close()
+        self.evictions += 1
+
+    def upsert(self, entries: Iterable[Dict[str, Any]]) -> int:
+        count = 0
+        for entry in entries:
+            entry_id = entry.get("objectID") or entry.get("entry_id")
+            user_id = entry.get("user_id")
+            if not entry_id or not user_id:
+                continue
+            meta = {field: entry.get(field, [] if field == "tags" else "") for field in STORED_FIELDS}
+            self._user(user_id).upsert(entry_id, self.vectorizer.embed_entry(entry), meta)
+            self.dirty.add(user_id)
+            count += 1
+        return count
+
+    def delete(self, user_id: str, entry_ids: Iterable[str]) -> int:
+        store = self._user(user_id)
+        removed = sum(1 for entry_id in entry_ids if store.remove(entry_id))
+        if removed:
+            self.dirty.add(user_id)
+        return removed
+
+    def search(self, user_id: str, query: str, tags: Optional[List[str]] = None, date_from: Optional[str] = None,
+               date_to: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        store = self._user(user_id)
+        vec = self.vectorizer.embed(query)
+        if not vec.any():
+            return []
+        filtered = bool(tags or date_from or date_to)
+        # Over-fetch when filtering so filtered-out hits don't starve the result list
+        candidates = store.query(vec, limit * 5 if filtered else limit)
+        wanted = {str(t).lower() for t in tags or []}
+        lower, upper = day_number(date_from), day_number(date_to) or 99999999
+        hits = []
+        for slot, score in candidates:
+            meta = store.meta[slot]
+            if wanted and not wanted <= {str(t).lower() for t in meta.get("tags", [])}:
+                continue
+            if (date_from or date_to) and not lower <= day_number(meta.get("date") or meta.get("timestamp")) <= upper:
+                continue
+            hits.append({"objectID": store.ids[slot], **meta, "score": round(score, 4)})
+            if len(hits) >= limit:
+                break
+        return hits
+
+    def flush(self) -> None:
+        for user_id in list(self.dirty):
+            self.users[user_id].flush()
+        self.dirty.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"users": len(self.users), "vectors": sum(len(u.slots) for u in self.users.values()), "dim": self.vectorizer.dim,
+                "evictions": self.evictions}
+
+def rrf_fuse(result_lists: Iterable[List[Dict[str, Any]]], k: int = 60, limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Reciprocal rank fusion: each hit scores sum(1 / (k + rank)) over the lists it appears in.
+    Ties keep the order in which hits were first seen.
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results, start=1):
+            obj_id = hit.get("objectID")
+            if not obj_id:
+                continue
+            item = fused.get(obj_id)
+            if item is None:
+                item = fused[obj_id] = {"hit": hit, "score": 0.0, "order": len(fused)}
+            item["score"] += 1.0 / (k + rank)
+    ranked = sorted(fused.values(), key=lambda item: (-item["score"], item["order"]))
+    return [dict(item["hit"], score=round(item["score"], 6)) for item in ranked[:limit]]
@@ -0,0 +1,86 @@
+import numpy as np
+from utils.audio import AudioPreprocessor, SAMPLE_RATE, FRAME_MS
+
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+
+def _pcm(signal):
+    return np.clip(np.round(signal), -32768, 32767).astype("<i2").tobytes()
+
+def _tone(seconds, rms, rate=SAMPLE_RATE, freq=220.0):
+    t = np.arange(int(seconds * rate)) / rate
+    return np.sqrt(2) * rms * np.sin(2 * np.pi * freq * t)
+
+def _run(pre, pcm, chunk_bytes=4096):
+    frames = 0
+    for start in range(0, len(pcm), chunk_bytes):
+        frames += sum(1 for _ in pre.process(pcm[start:start + chunk_bytes]))
+    return frames
+
+def test_quiet_speech_from_the_start_is_kept():
+    # A quiet mic: speech level varies between RMS 400 and 740, well under the old initial threshold
+    levels = np.linspace(400, 740, 100)
+    signal = np.concatenate([_tone(FRAME_MS / 1000, level) for level in levels])
+    pre = AudioPreprocessor()
+    _run(pre, _pcm(signal))
+    assert pre.frames_in == 100
+    assert pre.frames_out == 100
+    assert pre.frames_dropped == 0
+
+def test_quiet_speech_after_background_noise_is_kept():
+    rng = np.random.default_rng(0)
+    noise = rng.normal(0, 60, SAMPLE_RATE * 3)
+    speech = _tone(3, 450) + rng.normal(0, 60, SAMPLE_RATE * 3)
+    pre = AudioPreprocessor()
+    _run(pre, _pcm(noise))
+    dropped_in_noise = pre.frames_dropped
+    _run(pre, _pcm(speech))
+    assert dropped_in_noise > 0
+    assert pre.frames_dropped == dropped_in_noise
+
+def test_long_silence_is_dropped_after_keep_window():
+    pre = AudioPreprocessor(keep_silence_ms=200)
+    _run(pre, _pcm(np.zeros(SAMPLE_RATE * 2)))
+    assert pre.frames_in == 40
+    assert pre.frames_out == 200 // FRAME_MS
+    assert pre.frames_dropped == 40 - 200 // FRAME_MS
+
+def _resampled(pre, pcm, chunk_bytes):
+    frames = []
+    for start in range(0, len(pcm), chunk_bytes):
+        frames.extend(bytes(frame) for frame in pre.process(pcm[start:start + chunk_bytes]))
+    frames.extend(bytes(frame) for frame in pre.flush())
+    return np.frombuffer(b"".join(frames), dtype="<i2").astype(np.float64)
+
+def _check_resample(rate, channels=1):
+    seconds, freq, rms = 2, 440.0, 8000
+    signal = _tone(seconds, rms, rate=rate, freq=freq)
+    pcm = _pcm(np.repeat(signal, channels))
+    out = _resampled(AudioPreprocessor(input_rate=rate, channels=channels, vad=False), pcm, 4096)
+    # Output length is the input duration at 16 kHz, rounded up to whole frames by the flush
+    expected = seconds * SAMPLE_RATE
+    assert expected <= len(out) < expected + FRAME_SAMPLES
+    # Block averaging centres each output sample on its block; interpolation samples exactly n * step
+    factor = rate // SAMPLE_RATE if rate % SAMPLE_RATE == 0 else 1
+    t = (np.arange(expected) * rate / SAMPLE_RATE + (factor - 1) / 2) / rate
+    ideal = np.sqrt(2) * rms * np.sin(2 * np.pi * freq * t)
+    error = np.sqrt(np.mean((out[:expected - FRAME_SAMPLES] - ideal[:expected - FRAME_SAMPLES]) ** 2))
+    assert error < 0.01 * rms
+    # Odd chunk sizes split samples and frames at arbitrary points without changing the output
+    for chunk_bytes in (7, 333, 1001, 48001):
+        other = AudioPreprocessor(input_rate=rate, channels=channels, vad=False)
+        assert np.array_equal(_resampled(other, pcm, chunk_bytes), out)
+
+def test_resample_48k():
+    _check_resample(48000)
+
+def test_resample_48k_stereo():
+    _check_resample(48000, channels=2)
+
+def test_resample_44k1():
+    _check_resample(44100)
+
+def test_resample_32k():
+    _check_resample(32000)
+
+def test_passthrough_16k():
+    _check_resample(16000)
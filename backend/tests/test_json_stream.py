@@ -0,0 +1,50 @@
+import json
+from utils.json_stream import JSONFieldStream
+
+DOC = {
+    "title": "A \"quoted\" {title}, with \\ backslash",
+    "tags": ["work", "sleep, \"late\"", ["nested", {"a": "]"}]],
+    "summary": "Line one\nLine two é漢 😀",
+    "meta": {"mood": "ok", "scores": [1, 2.5, -3e2], "empty": {}},
+    "count": 12,
+    "done": True,
+    "extra": None
+}
+TEXT = "```json\n" + json.dumps(DOC, indent=1, ensure_ascii=False) + "\n```"
+# Compact and with \uXXXX escapes (including a surrogate pair) that splits can cut through
+COMPACT = json.dumps(DOC, separators=(",", ":"))
+
+def _fields(pieces):
+    parser = JSONFieldStream()
+    fields = []
+    for piece in pieces:
+        fields.extend(parser.feed(piece))
+    return parser, fields
+
+def test_every_two_way_split_yields_all_fields():
+    for text in (TEXT, COMPACT):
+        for cut in range(len(text) + 1):
+            parser, fields = _fields([text[:cut], text[cut:]])
+            assert fields == list(DOC.items()), cut
+            assert parser.done
+            assert parser.text == text
+
+def test_one_character_at_a_time():
+    parser, fields = _fields(TEXT)
+    assert fields == list(DOC.items())
+
+def test_field_is_emitted_as_soon_as_its_value_completes():
+    parser = JSONFieldStream()
+    tags = COMPACT.index(',"tags"')
+    assert list(parser.feed(COMPACT[:tags])) == [("title", DOC["title"])]
+    # A bare number has no closing delimiter of its own; it completes at the following comma
+    done = COMPACT.index(',"done"')
+    assert [key for key, _ in parser.feed(COMPACT[tags:done])] == ["tags", "summary", "meta"]
+    assert list(parser.feed(COMPACT[done:done + 1])) == [("count", 12)]
+    assert not parser.done
+    assert list(parser.feed(COMPACT[done + 1:])) == [("done", True), ("extra", None)]
+    assert parser.done
+
+def test_text_after_the_object_is_ignored():
+    parser, fields = _fields([COMPACT + ' {"title": "again"}'])
+    assert fields == list(DOC.items())
@@ -0,0 +1,49 @@
+from services.local_search import LocalSearchIndex
+
+WORDS = "river morning coffee anxiety running garden mother work deadline sleep dream walk".split()
+
+def _entry(i):
+    words = [WORDS[(i * k) % len(WORDS)] for k in (1, 3, 7)]
+    return {
+        "objectID": f"e{i}",
+        "user_id": "u1",
+        "title": words[0],
+        "text": " ".join(words * (1 + i % 4)),
+        "tags": [words[2]],
+        "date": f"2025-07-{1 + i % 28:02d}"
+    }
+
+def _ranking(index, query, **kwargs):
+    return [(hit["objectID"], hit["score"]) for hit in index.search("u1", query, limit=50, **kwargs)]
+
+def test_ranking_after_delete_and_compaction_matches_fresh_index():
+    entries = [_entry(i) for i in range(200)]
+    index = LocalSearchIndex(path="")
+    index.add(entries)
+    deleted = [e["objectID"] for e in entries if int(e["objectID"][1:]) % 2]
+    assert index.delete("u1", deleted) == 100
+    user = index.users["u1"]
+    # Compaction ran part way through the deletes; the rest are still tombstones
+    assert len(user.doc_ids) < 200
+    assert user.live == 100
+
+    live = [e for e in entries if e["objectID"] not in deleted]
+    fresh = LocalSearchIndex(path="")
+    fresh.add(live)
+    assert user.df == fresh.users["u1"].df
+    for query in ("river", "coffee morning", "deadline sleep dream", "mother running"):
+        ranking = _ranking(index, query)
+        assert ranking
+        assert ranking == _ranking(fresh, query)
+        assert not {entry_id for entry_id, _ in ranking} & set(deleted)
+    assert _ranking(index, "", tags=["dream"]) == _ranking(fresh, "", tags=["dream"])
+    assert _ranking(index, "river", date_from="2025-07-10", date_to="2025-07-20") == \
+        _ranking(fresh, "river", date_from="2025-07-10", date_to="2025-07-20")
+
+def test_reindexed_entry_replaces_old_version():
+    index = LocalSearchIndex(path="")
+    index.add([{"objectID": "e1", "user_id": "u1", "title": "river walk"}])
+    index.add([{"objectID": "e1", "user_id": "u1", "title": "garden"}])
+    assert index.search("u1", "river") == []
+    assert [hit["objectID"] for hit in index.search("u1", "garden")] == ["e1"]
+    assert index.stats()["documents"] == 1
@@ -0,0 +1,58 @@
+import json
+import asyncio
+from services.outbox import Outbox, SUPABASE, SEARCH
+
+def _line(record):
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+def _entry(entry_id, updated):
+    return {"objectID": entry_id, "user_id": "u1", "title": entry_id, "updated": updated}
+
+LOG = "".join([
+    _line({"put": _entry("e1", "v1")}),
+    _line({"put": _entry("e2", "v1")}),
+    _line({"ack": SUPABASE, "id": "e1", "updated": "v1"}),
+    _line({"ack": SEARCH, "id": "e1", "updated": "v1"}),
+    _line({"put": _entry("e3", "v1")}),
+    _line({"put": _entry("e3", "v2")}),
+    # Ack for the version that was replaced: ignored
+    _line({"ack": SUPABASE, "id": "e3", "updated": "v1"}),
+    _line({"ack": SEARCH, "id": "e2", "updated": "v1"}),
+])
+
+def _pending(outbox):
+    return {entry_id: (item["entry"]["updated"], item["acked"]) for entry_id, item in outbox._pending.items()}
+
+def test_replay_after_truncated_last_line(tmp_path):
+    path = tmp_path / "outbox.ndjson"
+    path.write_text(LOG + '{"put":{"objectID":"e4","user_id":"u1","ti', encoding="utf-8")
+    outbox = Outbox(path=str(path), fsync=False)
+    asyncio.run(outbox.load())
+    assert _pending(outbox) == {"e2": ("v1", {SEARCH}), "e3": ("v2", set())}
+    # The log was rewritten without the partial line, so every line parses again
+    assert outbox.stats()["compactions"] == 1
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == outbox.stats()["log_lines"] == 3
+    for line in lines:
+        json.loads(line)
+
+    async def write():
+        await outbox.record(_entry("e5", "v1"))
+        outbox.ack(SEARCH, "e3", "v2")
+        await outbox.stop()
+
+    asyncio.run(write())
+    replayed = Outbox(path=str(path), fsync=False)
+    replayed._load()
+    assert _pending(replayed) == {"e2": ("v1", {SEARCH}), "e3": ("v2", {SEARCH}), "e5": ("v1", set())}
+    assert replayed.stats()["compactions"] == 0
+
+def test_replay_of_complete_log_leaves_file_alone(tmp_path):
+    path = tmp_path / "outbox.ndjson"
+    path.write_text(LOG, encoding="utf-8")
+    outbox = Outbox(path=str(path), fsync=False)
+    outbox._load()
+    assert _pending(outbox) == {"e2": ("v1", {SEARCH}), "e3": ("v2", set())}
+    assert outbox.stats()["compactions"] == 0
+    assert outbox.stats()["log_lines"] == 8
+    assert path.read_text(encoding="utf-8") == LOG
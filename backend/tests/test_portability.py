@@ -0,0 +1,43 @@
+import gzip
+import asyncio
+import tracemalloc
+from services.portability import iter_lines
+
+async def _collect(chunks):
+    async def source():
+        for chunk in chunks:
+            yield chunk
+    return [line async for line in iter_lines(source())]
+
+def test_plain_lines_split_across_chunks():
+    lines = asyncio.run(_collect([b'{"a": 1}\n{"b"', b': 2}\n', b'{"c": 3}']))
+    assert lines == [b'{"a": 1}', b'{"b": 2}', b'{"c": 3}']
+
+def test_gzip_lines_split_across_chunks():
+    body = gzip.compress(b"".join(b'{"n": %d}\n' % i for i in range(1000)))
+    chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+    lines = asyncio.run(_collect(chunks))
+    assert lines == [b'{"n": %d}' % i for i in range(1000)]
+
+def test_high_ratio_gzip_chunk_is_inflated_a_step_at_a_time():
+    # ~64 MB of short lines compresses to a single chunk of well under a megabyte
+    line = b"x" * 1023 + b"\n"
+    body = gzip.compress(line * (64 * 1024), compresslevel=9)
+    assert len(body) < 1024 * 1024
+
+    async def consume():
+        async def source():
+            yield body
+        count = 0
+        async for _ in iter_lines(source()):
+            count += 1
+        return count
+
+    tracemalloc.start()
+    try:
+        count = asyncio.run(consume())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert count == 64 * 1024
+    assert peak < 16 * 1024 * 1024
@@ -0,0 +1,109 @@
+import asyncio
+import pytest
+from services import resilience
+from services.resilience import CircuitBreaker, CircuitOpenError, guard
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class _HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+def _fail(breaker, exc=None):
+    probe = breaker.before()
+    breaker.after(exc or ConnectionError("down"), probe)
+
+def test_opens_after_threshold_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=10)
+    _fail(breaker)
+    _fail(breaker)
+    # A success in between resets the count
+    breaker.after(None, breaker.before())
+    _fail(breaker)
+    _fail(breaker)
+    assert breaker.state == "closed"
+    _fail(breaker)
+    assert breaker.state == "open"
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.before()
+    clock.now += 9.9
+    with pytest.raises(CircuitOpenError):
+        breaker.before()
+    assert breaker.stats() == {"state": "open", "consecutive_failures": 3, "opens": 1, "rejected": 2}
+
+def test_half_open_probe_success_closes(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=10)
+    _fail(breaker)
+    clock.now += 10
+    assert not breaker.is_open()
+    assert breaker.before() is True
+    assert breaker.state == "half_open"
+    # Only one trial call at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before()
+    breaker.after(None, True)
+    assert breaker.state == "closed"
+    assert breaker.before() is False
+    assert breaker.stats()["consecutive_failures"] == 0
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=10)
+    _fail(breaker)
+    _fail(breaker)
+    clock.now += 10
+    probe = breaker.before()
+    breaker.after(ConnectionError("still down"), probe)
+    assert breaker.state == "open"
+    assert breaker.opens == 2
+    # The reset period starts over from the failed trial
+    clock.now += 5
+    with pytest.raises(CircuitOpenError):
+        breaker.before()
+    clock.now += 5
+    assert breaker.before() is True
+
+def test_client_errors_are_not_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=10)
+    _fail(breaker, _HTTPError(404))
+    _fail(breaker, resilience.DeadlineExceeded("budget spent"))
+    assert breaker.state == "closed"
+    _fail(breaker, _HTTPError(429))
+    assert breaker.state == "open"
+    # A probe ending in a client error is inconclusive: the circuit stays half-open for the next trial
+    clock.now += 10
+    _fail(breaker, _HTTPError(400))
+    assert breaker.state == "half_open"
+    assert breaker.before() is True
+
+def test_guard_fails_fast_while_open(clock, monkeypatch):
+    monkeypatch.setitem(resilience.breakers, "test", CircuitBreaker("test", failure_threshold=1, reset_seconds=10))
+    calls = []
+
+    async def call(exc=None):
+        async with guard("test", "op"):
+            calls.append(1)
+            if exc:
+                raise exc
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(call(ConnectionError("down")))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(call())
+    assert len(calls) == 1
+    clock.now += 10
+    asyncio.run(call())
+    assert len(calls) == 2
+    assert resilience.breakers["test"].state == "closed"
@@ -0,0 +1,86 @@
+import asyncio
+import services.search_backend as search_backend
+from services.local_search import LocalSearchIndex
+from services.search_backend import LocalBackend
+
+ROWS = [
+    {"entry_id": f"e{i}", "user_id": "u1", "date": "2026-01-0%d" % (i + 1), "timestamp": "2026-01-0%dT10:00:00Z" % (i + 1),
+     "title": f"old title {i}", "summary": "", "tags": ["work"], "text": "deadline at work", "audio_url": ""}
+    for i in range(3)
+]
+
+def _fake_pages(rows, gate=None):
+    async def iter_pages(table, key, columns="*", page_size=500, user_id=None):
+        for row in rows:
+            if gate is not None:
+                await gate.wait()
+            yield [dict(row)]
+    return iter_pages
+
+def test_missing_snapshot_is_seeded_from_supabase(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_backend, "iter_pages", _fake_pages(ROWS))
+
+    async def run():
+        backend = LocalBackend(LocalSearchIndex(str(tmp_path / "index.pickle")), snapshot_interval=0)
+        await backend.start()
+        await backend._seed_task
+        hits = await backend.search(["deadline"], user_id="u1")
+        await backend.stop()
+        return backend, hits
+
+    backend, hits = asyncio.run(run())
+    assert {hit["objectID"] for hit in hits} == {"e0", "e1", "e2"}
+    assert backend.seeded == 3
+    assert (tmp_path / "index.pickle").exists()
+
+def test_writes_during_seeding_win_and_partial_seed_is_not_snapshotted(tmp_path, monkeypatch):
+    async def run():
+        release = asyncio.Event()
+        monkeypatch.setattr(search_backend, "iter_pages", _fake_pages(ROWS, release))
+        backend = LocalBackend(LocalSearchIndex(str(tmp_path / "index.pickle")), snapshot_interval=0)
+        await backend.start()
+        # A newer write for e1 arrives while the seed is still paging
+        await backend.index([{**ROWS[1], "objectID": "e1", "title": "rewritten entry"}])
+        release.set()
+        await backend._seed_task
+        hits = await backend.search(["rewritten"], user_id="u1")
+        stale = await backend.search(["old"], user_id="u1")
+        await backend.stop()
+        return hits, stale
+
+    hits, stale = asyncio.run(run())
+    assert [hit["objectID"] for hit in hits] == ["e1"]
+    assert "e1" not in {hit["objectID"] for hit in stale}
+
+    async def interrupted():
+        monkeypatch.setattr(search_backend, "iter_pages", _fake_pages(ROWS, asyncio.Event()))
+        backend = LocalBackend(LocalSearchIndex(str(tmp_path / "other.pickle")), snapshot_interval=0)
+        await backend.start()
+        await backend.index([{**ROWS[0], "objectID": "e0"}])
+        await backend.stop()
+
+    asyncio.run(interrupted())
+    assert not (tmp_path / "other.pickle").exists()
+
+def test_unseeded_vector_store_is_seeded_once(tmp_path, monkeypatch):
+    from services.search_backend import SemanticBackend
+    from services.vectors import VectorStore
+    monkeypatch.setattr(search_backend, "iter_pages", _fake_pages(ROWS))
+
+    async def run():
+        backend = SemanticBackend(VectorStore(str(tmp_path / "vectors")), flush_interval=0)
+        await backend.start()
+        await backend._seed_task
+        hits = await backend.search(["deadline", "work"], user_id="u1")
+        await backend.stop()
+        restarted = SemanticBackend(VectorStore(str(tmp_path / "vectors")), flush_interval=0)
+        await restarted.start()
+        seeding_again = restarted.seeding
+        reloaded = await restarted.search(["deadline"], user_id="u1")
+        await restarted.stop()
+        return hits, seeding_again, reloaded
+
+    hits, seeding_again, reloaded = asyncio.run(run())
+    assert {hit["objectID"] for hit in hits} == {"e0", "e1", "e2"}
+    assert not seeding_again
+    assert {hit["objectID"] for hit in reloaded} == {"e0", "e1", "e2"}
@@ -0,0 +1,239 @@
+from typing import AsyncIterator, Union
+
+# AssemblyAI streaming input: 16 kHz, mono, 16-bit little-endian PCM
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+# Upstream accepts 50-1000 ms per message; 50 ms keeps latency low
+FRAME_MS = 50
+FRAME_BYTES = SAMPLE_RATE * SAMPLE_WIDTH * FRAME_MS // 1000
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+def frame_bytes_for(ms: int = FRAME_MS, sample_rate: int = SAMPLE_RATE, sample_width: int = SAMPLE_WIDTH) -> int:
+    return sample_rate * sample_width * ms // 1000
+
+async def rechunk(chunks: AsyncIterator[BytesLike], frame_bytes: int = FRAME_BYTES) -> AsyncIterator[BytesLike]:
+    """
+    Re-slice an async stream of arbitrarily sized PCM chunks into fixed-size frames.
+
+    Whole frames inside a chunk are yielded as zero-copy `memoryview` slices of that chunk; only
+    the few bytes that straddle a chunk boundary are copied into a carry buffer. A short final
+    frame is flushed when the input ends.
+    """
+    carry = bytearray()
+    async for chunk in chunks:
+        view = memoryview(chunk)
+        if carry:
+            need = frame_bytes - len(carry)
+            carry += view[:need]
+            view = view[need:]
+            if len(carry) < frame_bytes:
+                continue
+            yield bytes(carry)
+            carry.clear()
+        while len(view) >= frame_bytes:
+            yield view[:frame_bytes]
+            view = view[frame_bytes:]
+        if len(view):
+            carry += view
+    if carry:
+        yield bytes(carry)
+
+# Longest chunk (in input samples per channel) processed in one pass; bigger chunks are sliced
+MAX_CHUNK_SAMPLES = 48000
+# Energy VAD: frames whose RMS is below max(VAD_MIN_RMS, noise floor * VAD_NOISE_RATIO) count as silence
+VAD_MIN_RMS = 300.0
+VAD_NOISE_RATIO = 2.5
+# Keep this much of every silent stretch so upstream end-of-turn detection still sees the pause
+VAD_KEEP_SILENCE_MS = 800
+
+class AudioPreprocessor:
+    """
+    Streaming preprocessing stage: int16 PCM at any common mic rate/channel count in,
+    fixed-size 16 kHz mono int16 frames out, with long silences dropped.
+
+    - Downmixing and resampling are vectorized with NumPy. Integer ratios (48 kHz, 32 kHz) use
+      block averaging, a cheap anti-aliasing filter. Other ratios (44.1 kHz) use linear
+      interpolation. Phase is carried across chunks so there are no seams.
+    - Energy VAD tracks an adaptive noise floor, capped at min_rms. Speech frames always pass. Silence passes for
+      the first VAD_KEEP_SILENCE_MS of a pause and is dropped after that.
+    - All work buffers are allocated once in __init__. `process` yields memoryviews of one
+      reused frame buffer, so each frame is only valid until the next one is produced.
+    """
+
+    def __init__(self, input_rate: int = SAMPLE_RATE, channels: int = 1, frame_ms: int = FRAME_MS, vad: bool = True,
+                 keep_silence_ms: int = VAD_KEEP_SILENCE_MS, min_rms: float = VAD_MIN_RMS):
+        import numpy as np
+        self.np = np
+        self.input_rate = input_rate
+        self.channels = channels
+        self.vad = vad
+        self.min_rms = min_rms
+        self.frame_samples = SAMPLE_RATE * frame_ms // 1000
+        self.keep_silence_frames = max(0, keep_silence_ms // frame_ms)
+        self.step = input_rate / SAMPLE_RATE
+        self.factor = int(round(self.step)) if abs(self.step - round(self.step)) < 1e-9 else 0
+        cap = MAX_CHUNK_SAMPLES
+        out_cap = int(cap / self.step) + 2
+        # Preallocated work buffers
+        self._mono = np.zeros(cap + self.factor + 2, dtype=np.float32)
+        self._resampled = np.zeros(out_cap + 1, dtype=np.float32)
+        self._pos = np.zeros(out_cap + 1, dtype=np.float64)
+        self._idx = np.zeros(out_cap + 1, dtype=np.intp)
+        self._frac = np.zeros(out_cap + 1, dtype=np.float32)
+        self._tmp = np.zeros(out_cap + 1, dtype=np.float32)
+        self._ramp = np.arange(out_cap + 1, dtype=np.float64)
+        self._frame = np.zeros(self.frame_samples, dtype=np.int16)
+        self._frame_f = np.zeros(self.frame_samples, dtype=np.float32)
+        self._filled = 0
+        self._byte_carry = b""
+        # Resampler state: leftover input samples (block averaging) or output phase (interpolation)
+        self._pending = 0
+        self._phase = 1.0
+        # Start below the minimum threshold so quiet speech at the start isn't learned as noise
+        self._noise_rms = min_rms / VAD_NOISE_RATIO
+        self._silent_run = 0
+        self.frames_in = 0
+        self.frames_out = 0
+        self.frames_dropped = 0
+
+    def process(self, chunk: BytesLike):
+        """
+        Feed one chunk of interleaved little-endian int16 PCM; yields ready 16 kHz frames.
+        """
+        np = self.np
+        align = 2 * self.channels
+        if self._byte_carry:
+            chunk = self._byte_carry + bytes(chunk)
+            self._byte_carry = b""
+        usable = len(chunk) - len(chunk) % align
+        if usable < len(chunk):
+            self._byte_carry = bytes(memoryview(chunk)[usable:])
+        samples = np.frombuffer(chunk, dtype="<i2", count=usable // 2)
+        per_pass = MAX_CHUNK_SAMPLES * self.channels
+        for start in range(0, len(samples), per_pass):
+            part = samples[start:start + per_pass]
+            n = len(part) // self.channels
+            mono = self._downmix(part, n)
+            out = self._resample(mono)
+            yield from self._emit(out)
+
+    def flush(self):
+        """
+        Emit the final partial frame, zero-padded, when the stream ends.
+        """
+        if self._filled:
+            self._frame[self._filled:] = 0
+            self._filled = 0
+            self.frames_out += 1
+            yield memoryview(self._frame).cast("B")
+
+    def _downmix(self, part, n):
+        np = self.np
+        # Integer ratios prepend leftover samples; interpolation keeps the previous sample at index 0
+        offset = self._pending if self.factor else 1
+        dest = self._mono[offset:offset + n]
+        if self.channels == 1:
+            np.copyto(dest, part, casting="unsafe")
+        else:
+            np.mean(part.reshape(n, self.channels), axis=1, out=dest)
+        return self._mono[:offset + n]
+
+    def _resample(self, x):
+        np = self.np
+        if self.step == 1.0:
+            return x
+        if self.factor:
+            # Integer ratio: average each block of `factor` samples, keep the remainder for next time
+            n = len(x)
+            m = n // self.factor
+            out = self._resampled[:m]
+            np.mean(x[:m * self.factor].reshape(m, self.factor), axis=1, out=out)
+            rest = n - m * self.factor
+            if rest:
+                self._mono[:rest] = x[m * self.factor:n]
+            self._pending = rest
+            return out
+        # Fractional ratio: linear interpolation. x[0] is the last sample of the previous chunk and
+        # self._phase is the next output position in input samples, measured from x[0].
+        last = len(x) - 1
+        buf = self._mono
+        buf[last + 1] = buf[last]
+        if self._phase > last:
+            self._phase -= last
+            buf[0] = buf[last]
+            return self._resampled[:0]
+        m = int((last - self._phase) // self.step) + 1
+        pos = self._pos[:m]
+        np.multiply(self._ramp[:m], self.step, out=pos)
+        pos += self._phase
+        idx = self._idx[:m]
+        np.copyto(idx, pos, casting="unsafe")
+        frac = self._frac[:m]
+        np.subtract(pos, idx, out=frac, casting="unsafe")
+        left = self._tmp[:m]
+        np.take(buf, idx, out=left)
+        idx += 1
+        out = self._resampled[:m]
+        np.take(buf, idx, out=out)
+        out -= left
+        out *= frac
+        out += left
+        self._phase += m * self.step - last
+        buf[0] = buf[last]
+        return out
+
+    def _emit(self, out):
+        np = self.np
+        i = 0
+        total = len(out)
+        while i < total:
+            take = min(self.frame_samples - self._filled, total - i)
+            dest = self._frame_f[self._filled:self._filled + take]
+            dest[:] = out[i:i + take]
+            self._filled += take
+            i += take
+            if self._filled < self.frame_samples:
+                break
+            self._filled = 0
+            self.frames_in += 1
+            frame_f = self._frame_f
+            np.clip(frame_f, -32768, 32767, out=frame_f)
+            if self.vad and not self._is_speech(frame_f):
+                self._silent_run += 1
+                if self._silent_run > self.keep_silence_frames:
+                    self.frames_dropped += 1
+                    continue
+            else:
+                self._silent_run = 0
+            np.copyto(self._frame, frame_f, casting="unsafe")
+            self.frames_out += 1
+            yield memoryview(self._frame).cast("B")
+
+    def _is_speech(self, frame_f) -> bool:
+        rms = float(self.np.sqrt(self.np.dot(frame_f, frame_f) / len(frame_f)))
+        threshold = max(self.min_rms, self._noise_rms * VAD_NOISE_RATIO)
+        if rms < threshold:
+            # Track the background level only on frames well below the threshold, so speech just
+            # under it can't pull the floor up, and never past min_rms
+            if rms < threshold / 2:
+                self._noise_rms = min(0.95 * self._noise_rms + 0.05 * rms, self.min_rms)
+            return False
+        return True
+
+    def stats(self):
+        return {"frames_in": self.frames_in, "frames_out": self.frames_out, "frames_dropped": self.frames_dropped}
+
+async def preprocess(chunks: AsyncIterator[BytesLike], input_rate: int = SAMPLE_RATE, channels: int = 1,
+                     frame_ms: int = FRAME_MS, vad: bool = True,
+                     preprocessor: "AudioPreprocessor" = None) -> AsyncIterator[memoryview]:
+    """
+    Async pipeline stage around AudioPreprocessor: raw mic PCM chunks in, 16 kHz mono frames out.
+    Yielded frames share one buffer and must be consumed (e.g. sent) before the next iteration.
+    """
+    pre = preprocessor or AudioPreprocessor(input_rate=input_rate, channels=channels, frame_ms=frame_ms, vad=vad)
+    async for chunk in chunks:
+        for frame in pre.process(chunk):
+            yield frame
+    for frame in pre.flush():
+        yield frame
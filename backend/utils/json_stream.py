@@ -0,0 +1,94 @@
+import json
+from typing import Any, Iterator, Tuple
+
+class JSONFieldStream:
+    """
+    Incremental parser for a single JSON object arriving in pieces (e.g. LLM output tokens).
+
+    `feed` takes the next piece of text and yields (key, value) for every top-level field whose
+    value has just been completed, so callers can act on "title" before "summary" has finished
+    generating. Text before the opening brace (such as a ```json fence) is ignored. Each
+    character is scanned once; only completed values are handed to json.loads.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.done = False
+        self._i = 0
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._str_start = 0
+        # What the top-level object expects next: key, colon, value, in_value or comma
+        self._expect = None
+        self._key = None
+        self._value_start = None
+
+    def feed(self, piece: str) -> Iterator[Tuple[str, Any]]:
+        self.text += piece
+        text = self.text
+        while self._i < len(text) and not self.done:
+            i = self._i
+            c = text[i]
+            self._i += 1
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    if self._depth == 1:
+                        if self._expect == "key":
+                            self._key = json.loads(text[self._str_start:i + 1])
+                            self._expect = "colon"
+                        elif self._expect == "in_value" and self._value_start == self._str_start:
+                            yield from self._emit(i + 1, "comma")
+                continue
+            if self._depth == 0:
+                if c == "{":
+                    self._depth = 1
+                    self._expect = "key"
+                continue
+            if c == '"':
+                self._in_str = True
+                self._str_start = i
+                self._start_value(i)
+            elif c in "{[":
+                self._start_value(i)
+                self._depth += 1
+            elif c in "}]":
+                if self._depth == 1:
+                    if self._expect == "in_value":
+                        yield from self._emit(i, None)
+                    self._depth = 0
+                    self.done = True
+                else:
+                    self._depth -= 1
+                    if self._depth == 1 and self._expect == "in_value":
+                        yield from self._emit(i + 1, "comma")
+            elif self._depth == 1:
+                if c == ":" and self._expect == "colon":
+                    self._expect = "value"
+                elif c == ",":
+                    if self._expect == "in_value":
+                        yield from self._emit(i, None)
+                    self._expect = "key"
+                elif not c.isspace():
+                    # Bare number / true / false / null
+                    self._start_value(i)
+
+    def _start_value(self, i):
+        if self._depth == 1 and self._expect == "value":
+            self._value_start = i
+            self._expect = "in_value"
+
+    def _emit(self, end, expect_next):
+        raw = self.text[self._value_start:end].strip()
+        self._expect = expect_next
+        self._value_start = None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        yield self._key, value
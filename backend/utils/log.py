@@ -0,0 +1,50 @@
+import os
+import json
+import logging
+
+# DEBUG shows per-request detail (e.g. search terms); OFF silences app logging entirely
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for humans, "json" for one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+# Attributes every LogRecord has; anything else came from `extra=` and is logged as a field
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+def _fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RESERVED}
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Log lines with the `extra=` fields attached: `key=value` pairs after the message in text
+    mode, or a single JSON object per record in json mode.
+    """
+
+    def __init__(self, json_output: bool = False):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        self.json_output = json_output
+
+    def format(self, record):
+        fields = _fields(record)
+        if self.json_output:
+            data = {"ts": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                    "msg": record.getMessage(), **fields}
+            if record.exc_info:
+                data["exc"] = self.formatException(record.exc_info)
+            return json.dumps(data, default=str)
+        line = super().format(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value!r}" for key, value in fields.items())
+        return line
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> None:
+    """
+    Set up app logging once at startup. Modules log through logging.getLogger(__name__).
+    """
+    if level == "OFF":
+        logging.disable(logging.CRITICAL)
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter(json_output=fmt == "json"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)